@@ -1,5 +1,10 @@
 import gradio as gr
-from modules import loans, tables, comparison, pdf_viewer, data
+from modules import loans, tables, comparison, pdf_viewer, data, scheduling, api, clausediff
+from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
+import contextlib
+import anyio
+import uvicorn
 import os
 import logging
 
@@ -45,10 +50,11 @@ def main():
                     tables.get_truncated_data(""),
                 )
 
-            # Save PDF
+            # Save PDF (blob store + one-time mmap page store)
             saved_path = loans.save_pdf_handler(file_obj)
 
-            # Register metadata
+            # Register metadata (filename gets a hash suffix if another
+            # agreement is already registered under the same name)
             filename = os.path.basename(file_obj.name)
             if json_data:
                 data.add_loan(filename, saved_path, json_data)
@@ -66,16 +72,17 @@ def main():
             )
 
         # Chain: Extract -> Success -> Save
-        # 1. User clicks Process Button -> Calls Extract
+        # 1. User clicks Process Button -> Calls Extract (streams partial results)
         extract_event = loans_components["process_btn"].click(
-            fn=loans.extract_metadata_handler,
+            **scheduling.LLM.bind(loans.extract_metadata_stream),
             inputs=[loans_components["pdf_uploader"]],
-            outputs=[loans_components["status_output"], loans_components["json_output"]]
+            outputs=[loans_components["status_output"], loans_components["json_output"]],
+            api_name="extract",
         )
         
         # 2. On Success of Extract -> Calls Save & Register
         extract_event.success(
-            fn=handle_save_and_register,
+            **scheduling.CPU.bind(handle_save_and_register),
             inputs=[
                 loans_components["pdf_uploader"],
                 loans_components["json_output"],
@@ -86,6 +93,7 @@ def main():
                 pdf_viewer_components["page_slider"],
                 tables_components["loan_table"],
             ],
+            api_name="save_and_register",
         )
 
 
@@ -134,7 +142,7 @@ def main():
             return [gr.skip()] * 5
 
         tables_components["loan_table"].select(
-            fn=handle_table_select_real,
+            **scheduling.RENDER.bind(handle_table_select_real),
             inputs=[tables_components["loan_table"]],
             outputs=[
                 pdf_viewer_components["pdf_viewer"],
@@ -145,16 +153,78 @@ def main():
             ],
         )
 
+        # ======================================================
+        # CLAUSE SEARCH HIT → PDF VIEWER (page + highlighted match)
+        # ======================================================
+        def handle_clause_hit(evt: gr.SelectData, hits):
+            if evt is None or not hits:
+                return [gr.skip()] * 5
+
+            row_idx = evt.index[0]
+            if row_idx >= len(hits):
+                return [gr.skip()] * 5
+
+            hit = hits[row_idx]
+            iframe, path, slider, highlight_map = pdf_viewer_components["open_fn"](
+                hit["pdf_path"], hit["page"], hit["span_ids"]
+            )
+            return iframe, path, slider, highlight_map, gr.Tabs(selected="tab_pdf")
+
+        tables_components["clause_results"].select(
+            **scheduling.RENDER.bind(handle_clause_hit),
+            inputs=[tables_components["clause_hits"]],
+            outputs=[
+                pdf_viewer_components["pdf_viewer"],
+                pdf_viewer_components["current_pdf_path"],
+                pdf_viewer_components["page_slider"],
+                pdf_viewer_components["highlights_by_page"],
+                tabs_container,
+            ],
+        )
+
+        # ======================================================
+        # SCHEDULER METRICS (queue depth / wait times per lane)
+        # ======================================================
+        with gr.Accordion("⚙️ Scheduler Metrics", open=False):
+            metrics_view = gr.JSON(label="Lanes")
+            metrics_btn = gr.Button("🔄 Refresh Metrics", size="sm")
+
+        metrics_btn.click(
+            **scheduling.INTERACTIVE.bind(scheduling.get_metrics),
+            inputs=[],
+            outputs=[metrics_view],
+        )
+
+    # Each event declares its own lane (concurrency_id / concurrency_limit)
+    demo.queue(default_concurrency_limit=None)
     return demo
 
 
+@contextlib.asynccontextmanager
+async def _server_lifespan(_):
+    # Same worker thread pool size app.launch(max_threads=...) would set
+    anyio.to_thread.current_default_thread_limiter().total_tokens = scheduling.max_threads()
+    # Worker processes for "Compare Source Text", owned by the server so they exit with it
+    clausediff.start_pool()
+    try:
+        yield
+    finally:
+        clausediff.shutdown_pool()
+
+
 if __name__ == "__main__":
     app = main()
 
     # Cloud Run requires listening on the PORT environment variable (default 8080)
     port = int(os.environ.get("PORT", 8080))
 
-    app.launch(
-        server_name="0.0.0.0",
-        server_port=port
-    )
\ No newline at end of file
+    # REST API (/api/...) and the Gradio UI (/) share one server
+    server = FastAPI(title="LoanIQ API", lifespan=_server_lifespan)
+    server.include_router(api.router)
+
+    # Cached page images for the viewer (/page-images/<cache key>)
+    os.makedirs(pdf_viewer.PAGE_CACHE_DIR, exist_ok=True)
+    server.mount(pdf_viewer.PAGE_ROUTE, StaticFiles(directory=pdf_viewer.PAGE_CACHE_DIR), name="page_images")
+    server = gr.mount_gradio_app(server, app, path="/")
+
+    uvicorn.run(server, host="0.0.0.0", port=port)
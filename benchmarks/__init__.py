@@ -0,0 +1,6 @@
+# Benchmark suite for LoanIQ (run with: python -m benchmarks.run)
+import os
+
+# Plain-JSON seed loans for benchmarks and tests. The live loan_database.json
+# is rewritten by the app (packed full_json, blob paths), so it is not a fixture.
+SEED_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "seed_loans.json")
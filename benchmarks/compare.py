@@ -0,0 +1,51 @@
+"""
+Compares two benchmark runs produced by `python -m benchmarks.run`.
+
+Usage:
+    python -m benchmarks.compare base.json head.json [--threshold 0.1]
+
+Prints one line per benchmark present in both runs with the median time
+ratio (head / base); ratios beyond the threshold are flagged.
+"""
+import argparse
+import json
+
+
+def _key(result):
+    return result["name"] + " " + json.dumps(result["params"], sort_keys=True)
+
+
+def load_results(path):
+    with open(path, "r") as f:
+        return {_key(r): r for r in json.load(f)["results"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON files.")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change to flag (default 10%%)")
+    args = parser.parse_args(argv)
+
+    base = load_results(args.base)
+    head = load_results(args.head)
+
+    for key in sorted(base.keys() & head.keys()):
+        b = base[key]["median_s"]
+        h = head[key]["median_s"]
+        ratio = h / b if b else float("inf")
+        flag = ""
+        if ratio < 1 - args.threshold:
+            flag = "  faster"
+        elif ratio > 1 + args.threshold:
+            flag = "  SLOWER"
+        print(f"{key:<90} {b * 1000:10.2f}ms -> {h * 1000:10.2f}ms  x{ratio:5.2f}{flag}")
+
+    for key in sorted(base.keys() - head.keys()):
+        print(f"{key:<90} only in base")
+    for key in sorted(head.keys() - base.keys()):
+        print(f"{key:<90} only in head")
+
+
+if __name__ == "__main__":
+    main()
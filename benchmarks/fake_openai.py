@@ -0,0 +1,223 @@
+"""
+Local stand-in for the OpenAI HTTP API (chat completions + TTS) for load tests.
+
+Unlike `benchmarks/stubs.py`, which patches the client in-process, this is a
+real HTTP server: the app talks to it through the stock `openai` client, so
+connection handling and streaming are exercised end to end.
+
+Usage (from the repository root):
+    python -m benchmarks.fake_openai --port 8901 --latency 1.5 --tokens-per-second 80
+    OPENAI_BASE_URL=http://127.0.0.1:8901/v1 OPENAI_API_KEY=sk-fake python app.py
+
+Endpoints:
+    POST /v1/chat/completions     JSON or SSE stream (stream=true)
+    POST /v1/audio/speech         a small MP3 payload
+    GET  /stats                   request counters
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks import SEED_DB
+from benchmarks.stubs import PAGE_ANALYSIS_REPLY
+
+CHARS_PER_TOKEN = 4
+STREAM_CHUNK_TOKENS = 8
+
+# MPEG-1 Layer III frame header + silence, enough for a player to accept it
+MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+
+def _default_extraction_reply():
+    try:
+        with open(SEED_DB, "r") as f:
+            return json.load(f)[0]["full_json"]
+    except (OSError, ValueError, IndexError, KeyError):
+        return {"core_loan_terms": {}}
+
+
+class FakeOpenAI:
+    """
+    Settings and counters shared by all request handlers.
+    latency: seconds before the first byte of every chat reply.
+    tokens_per_second: generation speed (0 = instant).
+    tts_latency: seconds per speech request.
+    """
+
+    def __init__(self, latency=1.0, tokens_per_second=50.0, tts_latency=0.5, extraction_reply=None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.tts_latency = tts_latency
+        self.extraction_reply = extraction_reply or _default_extraction_reply()
+        self.lock = threading.Lock()
+        self.counts = {"chat": 0, "chat_stream": 0, "speech": 0, "errors": 0}
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def reply_for(self, messages):
+        prompt = messages[-1].get("content", "") if messages else ""
+        if isinstance(prompt, list):  # content parts
+            prompt = " ".join(p.get("text", "") for p in prompt if isinstance(p, dict))
+        if "core_loan_terms" in prompt:
+            return json.dumps(self.extraction_reply)
+        return json.dumps(PAGE_ANALYSIS_REPLY)
+
+    def generation_time(self, n_chars):
+        if not self.tokens_per_second:
+            return 0.0
+        return n_chars / CHARS_PER_TOKEN / self.tokens_per_second
+
+
+def _make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass  # one line per request would drown the load test output
+
+        def _json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                with fake.lock:
+                    self._json(200, dict(fake.counts))
+            elif self.path.rstrip("/").endswith("/models"):
+                self._json(200, {"object": "list", "data": [{"id": "gpt-4-turbo", "object": "model"}]})
+            else:
+                self._json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        def do_POST(self):
+            try:
+                request = self._read_body()
+                if self.path.endswith("/chat/completions"):
+                    self._chat(request)
+                elif self.path.endswith("/audio/speech"):
+                    self._speech(request)
+                else:
+                    self._json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            except (BrokenPipeError, ConnectionResetError):
+                fake.count("errors")
+            except Exception as e:
+                fake.count("errors")
+                self._json(500, {"error": {"message": str(e)}})
+
+        def _chat(self, request):
+            content = fake.reply_for(request.get("messages", []))
+            model = request.get("model", "gpt-4-turbo")
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            created = int(time.time())
+            time.sleep(fake.latency)
+
+            if not request.get("stream"):
+                fake.count("chat")
+                time.sleep(fake.generation_time(len(content)))
+                self._json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(content) // CHARS_PER_TOKEN, "total_tokens": 0},
+                })
+                return
+
+            fake.count("chat_stream")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+
+            chunk_chars = STREAM_CHUNK_TOKENS * CHARS_PER_TOKEN
+            pause = fake.generation_time(chunk_chars)
+            for i in range(0, len(content), chunk_chars):
+                self._event({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + chunk_chars]}, "finish_reason": None}],
+                })
+                time.sleep(pause)
+            self._event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _event(self, payload):
+            self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        def _speech(self, request):
+            fake.count("speech")
+            time.sleep(fake.tts_latency)
+            body = MP3_FRAME * 40
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def start(port=8901, host="127.0.0.1", **settings):
+    """Starts the server on a daemon thread. Returns (server, FakeOpenAI)."""
+    fake = FakeOpenAI(**settings)
+    server = ThreadingHTTPServer((host, port), _make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server, fake
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds before the first byte of a chat reply")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Generation speed, 0 for instant")
+    parser.add_argument("--tts-latency", type=float, default=0.5, help="Seconds per speech request")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server, _ = start(
+        port=args.port,
+        host=args.host,
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        tts_latency=args.tts_latency,
+    )
+    print(f"Fake OpenAI listening on http://{args.host}:{args.port}/v1", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
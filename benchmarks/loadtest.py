@@ -0,0 +1,322 @@
+"""
+Concurrent-session load test for the running dashboard.
+
+Each simulated analyst is its own Gradio session (gradio_client.Client)
+looping over a realistic workflow:
+    extract -> save_and_register -> table_search -> go_to_page (x N)
+    -> analyze_page -> compare
+OpenAI is replaced by `benchmarks/fake_openai.py`, so LLM latency is
+controlled and free.
+
+Usage (from the repository root):
+    # Everything in one go: fake OpenAI + app.py in a scratch directory
+    python -m benchmarks.loadtest --spawn --sessions 20 --duration 120 -o load.json
+
+    # Against an app you started yourself (with OPENAI_BASE_URL pointing
+    # at a running `python -m benchmarks.fake_openai`)
+    python -m benchmarks.loadtest --url http://127.0.0.1:8080 --sessions 10
+
+Reports throughput plus p50 / p95 / p99 latency and errors per endpoint.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import urllib.request
+from datetime import datetime, timezone
+
+from benchmarks import SEED_DB, fake_openai
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF_DIR = os.path.join(REPO_ROOT, "saved_pdfs")
+
+SEARCH_TERMS = ["facility", "sofr", "bank", "plc", "term", "revolving", "usd", "gbp", ""]
+PAGE_TURNS = 3
+
+# -------------------------------------------------
+# Measurement
+# -------------------------------------------------
+
+def _percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+class Recorder:
+    """Latencies and errors per endpoint, shared by every session thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.last_error = {}
+
+    def call(self, endpoint, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            with self.lock:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+                self.last_error[endpoint] = f"{type(e).__name__}: {e}"
+            raise
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+        return result
+
+    def summary(self, wall_s):
+        endpoints = sorted(set(self.latencies) | set(self.errors))
+        rows = {}
+        for endpoint in endpoints:
+            samples = self.latencies.get(endpoint, [])
+            rows[endpoint] = {
+                "ok": len(samples),
+                "errors": self.errors.get(endpoint, 0),
+                "throughput_per_s": round(len(samples) / wall_s, 3) if wall_s else None,
+                "mean_s": round(statistics.fmean(samples), 4) if samples else None,
+                "p50_s": _round(_percentile(samples, 50)),
+                "p95_s": _round(_percentile(samples, 95)),
+                "p99_s": _round(_percentile(samples, 99)),
+                "max_s": _round(max(samples) if samples else None),
+                "last_error": self.last_error.get(endpoint),
+            }
+        return rows
+
+
+def _round(value):
+    return round(value, 4) if value is not None else None
+
+# -------------------------------------------------
+# Sessions
+# -------------------------------------------------
+
+def _get_json(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.load(response)
+
+
+def run_session(url, pdfs, recorder, deadline, iterations, seed):
+    """One simulated analyst: its own Gradio session, looping the workflow."""
+    from gradio_client import Client, handle_file
+
+    rng = random.Random(seed)
+    client = Client(url, verbose=False)
+    done = 0
+
+    while time.monotonic() < deadline and (not iterations or done < iterations):
+        pdf = rng.choice(pdfs)
+        try:
+            _, extracted = recorder.call("extract", client.predict, handle_file(pdf), api_name="/extract")
+            recorder.call(
+                "save_and_register", client.predict, handle_file(pdf), extracted, api_name="/save_and_register"
+            )
+            recorder.call("table_search", client.predict, rng.choice(SEARCH_TERMS), api_name="/table_search")
+
+            for _ in range(PAGE_TURNS):
+                recorder.call("go_to_page", client.predict, rng.randint(1, 5), True, api_name="/go_to_page")
+
+            recorder.call("analyze_page", client.predict, 1, True, api_name="/analyze_page")
+
+            recorder.call("refresh_documents", client.predict, api_name="/refresh_documents")
+            loans = recorder.call("api_loans", _get_json, f"{url}/api/loans?limit=50")["items"]
+            if len(loans) >= 2:
+                a, b = rng.sample([l["filename"] for l in loans], 2)
+                recorder.call("compare", client.predict, a, b, api_name="/compare")
+        except Exception:
+            # Already counted per endpoint; keep the session going
+            if os.getenv("LOADTEST_DEBUG"):
+                traceback.print_exc()
+        done += 1
+    return done
+
+# -------------------------------------------------
+# Spawned environment
+# -------------------------------------------------
+
+def _log_tail(log_path, lines=30):
+    try:
+        with open(log_path, "r", errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+    except OSError:
+        return ""
+
+
+def _wait_until_up(url, proc, timeout, log_path):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"app.py exited with code {proc.returncode}:\n{_log_tail(log_path)}")
+        try:
+            urllib.request.urlopen(f"{url}/api/metrics", timeout=2)
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise SystemExit(f"app.py did not come up within {timeout}s:\n{_log_tail(log_path)}")
+
+
+def spawn_app(workdir, port, openai_url, log_file):
+    """
+    Runs app.py from a scratch copy of the PDFs and database, so uploads
+    and registrations never touch the repository.
+    """
+    shutil.copytree(PDF_DIR, os.path.join(workdir, "saved_pdfs"))
+    shutil.copy(SEED_DB, os.path.join(workdir, "loan_database.json"))
+
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "OPENAI_BASE_URL": openai_url,
+        "OPENAI_API_KEY": "sk-loadtest",
+    })
+    return subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, "app.py")],
+        cwd=workdir,
+        env=env,
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+    )
+
+# -------------------------------------------------
+# Main
+# -------------------------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="Running app (ignored with --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="Start fake OpenAI + app.py in a scratch directory")
+    parser.add_argument("--port", type=int, default=8090, help="App port with --spawn")
+    parser.add_argument("--openai-port", type=int, default=8901, help="Fake OpenAI port with --spawn")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent simulated analysts")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to run")
+    parser.add_argument("--iterations", type=int, default=0, help="Stop each session after N workflows (0 = until --duration)")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Seconds over which sessions are started")
+    parser.add_argument("--pdfs", default=os.path.join(PDF_DIR, "*.pdf"), help="Glob of PDFs to upload")
+    parser.add_argument("--latency", type=float, default=1.0, help="Fake OpenAI time to first byte (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Fake OpenAI generation speed")
+    parser.add_argument("--tts-latency", type=float, default=0.5, help="Fake OpenAI TTS time (s)")
+    parser.add_argument("-o", "--output", help="Write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def _print_table(rows, wall_s, total):
+    print(f"\n{total} workflows in {wall_s:.1f}s", file=sys.stderr)
+    print(f"{'endpoint':<20}{'ok':>7}{'err':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}", file=sys.stderr)
+    for endpoint, r in rows.items():
+        cells = [f"{r[k] * 1000:.0f}ms" if r[k] is not None else "-" for k in ("p50_s", "p95_s", "p99_s")]
+        print(
+            f"{endpoint:<20}{r['ok']:>7}{r['errors']:>6}{r['throughput_per_s'] or 0:>9.2f}"
+            + "".join(f"{c:>9}" for c in cells),
+            file=sys.stderr,
+        )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pdfs = sorted(glob.glob(args.pdfs))
+    if not pdfs:
+        raise SystemExit(f"No PDFs match {args.pdfs}")
+
+    url = args.url.rstrip("/")
+    proc = None
+    fake_server = None
+    fake = None
+    workdir = None
+    log_file = None
+
+    try:
+        if args.spawn:
+            fake_server, fake = fake_openai.start(
+                port=args.openai_port,
+                latency=args.latency,
+                tokens_per_second=args.tokens_per_second,
+                tts_latency=args.tts_latency,
+            )
+            workdir = tempfile.mkdtemp(prefix="loaniq-load-")
+            log_path = os.path.join(workdir, "app.log")
+            log_file = open(log_path, "wb")
+            url = f"http://127.0.0.1:{args.port}"
+            proc = spawn_app(workdir, args.port, f"http://127.0.0.1:{args.openai_port}/v1", log_file)
+            print(f"Started app.py in {workdir} (log: app.log)", file=sys.stderr)
+            _wait_until_up(url, proc, timeout=180, log_path=log_path)
+
+        recorder = Recorder()
+        results = [0] * args.sessions
+        started = time.monotonic()
+        deadline = started + args.duration
+
+        def session(i):
+            results[i] = run_session(url, pdfs, recorder, deadline, args.iterations, seed=i)
+
+        threads = []
+        for i in range(args.sessions):
+            t = threading.Thread(target=session, args=(i,), name=f"session-{i}", daemon=True)
+            t.start()
+            threads.append(t)
+            if args.sessions > 1:
+                time.sleep(args.ramp_up / args.sessions)
+        for t in threads:
+            t.join()
+        wall_s = time.monotonic() - started
+
+        rows = recorder.summary(wall_s)
+        try:
+            server_metrics = _get_json(f"{url}/api/metrics")
+        except OSError:
+            server_metrics = None
+
+        report = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "url": url,
+                "sessions": args.sessions,
+                "duration_s": args.duration,
+                "wall_s": round(wall_s, 3),
+                "workflows": sum(results),
+                "fake_openai": {
+                    "latency_s": args.latency,
+                    "tokens_per_second": args.tokens_per_second,
+                    "tts_latency_s": args.tts_latency,
+                    "calls": dict(fake.counts) if fake else None,
+                },
+            },
+            "endpoints": rows,
+            "server_metrics": server_metrics,
+        }
+        _print_table(rows, wall_s, sum(results))
+
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(text)
+        else:
+            print(text)
+    finally:
+        if proc:
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if log_file:
+            log_file.close()
+        if fake_server:
+            fake_server.shutdown()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,580 @@
+"""
+Reproducible benchmark suite for the hot paths of the dashboard.
+
+Uses the PDFs bundled in `saved_pdfs/` and synthetic portfolios generated
+from `benchmarks/seed_loans.json`. OpenAI chat / TTS calls are stubbed (see
+`benchmarks/stubs.py`) so runs are offline and deterministic.
+
+Usage (from the repository root):
+    python -m benchmarks.run                       # everything, JSON to stdout
+    python -m benchmarks.run --only render,db -o bench.json
+    python -m benchmarks.run --profile --sizes 1000
+
+Compare two runs with:
+    python -m benchmarks.compare base.json head.json
+"""
+import argparse
+import cProfile
+import glob
+import itertools
+import json
+import os
+import platform
+import pstats
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks import SEED_DB
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF_DIR = os.path.join(REPO_ROOT, "saved_pdfs")
+
+GROUPS = ["text", "structure", "render", "highlight", "db", "storage", "compare", "relevance", "extract"]
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_DPIS = [72, 150, 200, 300]
+HIGHLIGHT_SPANS = [0, 2, 4, 8, 16]
+
+# -------------------------------------------------
+# Environment
+# -------------------------------------------------
+
+def load_app_modules(workdir):
+    """
+    Imports the app modules from inside a scratch directory so nothing the
+    benchmarks write (DB saves, TTS mp3s) lands in the real repository.
+    """
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+    # pdf_viewer builds its OpenAI client at import time
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-stub")
+
+    os.chdir(workdir)
+    from modules import clausediff, comparison, compression, data, loans, pagestore, pdf_viewer, relevance
+    from benchmarks import stubs
+
+    with open(SEED_DB, "r") as f:
+        seeds = json.load(f)
+
+    data.open_database(os.path.join(workdir, "loan_database.json"))
+    data.set_entries(seeds)
+    stubs.install(loans, pdf_viewer, extraction_reply=seeds[0]["full_json"])
+
+    return {
+        "data": data,
+        "loans": loans,
+        "pdf_viewer": pdf_viewer,
+        "pagestore": pagestore,
+        "comparison": comparison,
+        "clausediff": clausediff,
+        "compression": compression,
+        "relevance": relevance,
+    }, seeds
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except Exception:
+        return None
+
+
+def synthetic_portfolio(seeds, n):
+    """
+    Builds `n` loan entries by cycling over the seed records. `full_json` is
+    shared between copies: it is never mutated and serializes identically.
+    """
+    entries = []
+    for i, seed in zip(range(n), itertools.cycle(seeds)):
+        entry = dict(seed)
+        entry["filename"] = f"synthetic-{i:06d}-{seed['filename']}"
+        entry["borrower"] = f"{seed['borrower']} #{i}"
+        entries.append(entry)
+    return entries
+
+# -------------------------------------------------
+# Measurement
+# -------------------------------------------------
+
+class Runner:
+    def __init__(self, repeat=5, profile=False, profile_top=15):
+        self.repeat = repeat
+        self.profile = profile
+        self.profile_top = profile_top
+        self.results = []
+
+    def bench(self, name, fn, repeat=None, **params):
+        repeat = repeat or self.repeat
+        profiler = cProfile.Profile() if self.profile else None
+
+        fn()  # warm-up (fills OS page cache, imports lazily loaded code)
+
+        timings = []
+        for _ in range(repeat):
+            if profiler:
+                profiler.enable()
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+            if profiler:
+                profiler.disable()
+
+        result = {
+            "name": name,
+            "params": params,
+            "repeat": repeat,
+            "min_s": min(timings),
+            "median_s": statistics.median(timings),
+            "mean_s": statistics.fmean(timings),
+            "max_s": max(timings),
+        }
+        if profiler:
+            result["profile"] = self._top_functions(profiler)
+
+        print(f"{name} {params} median={result['median_s'] * 1000:.2f}ms", file=sys.stderr)
+        self.results.append(result)
+        return result
+
+    def _top_functions(self, profiler):
+        stats = pstats.Stats(profiler)
+        rows = []
+        for (path, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({
+                "function": f"{os.path.basename(path)}:{line}({func})",
+                "ncalls": nc,
+                "tottime_s": tt,
+                "cumtime_s": ct,
+            })
+        rows.sort(key=lambda r: r["cumtime_s"], reverse=True)
+        return rows[: self.profile_top]
+
+# -------------------------------------------------
+# Benchmarks
+# -------------------------------------------------
+
+def bench_text(runner, mods, pdfs, args):
+    for pdf in pdfs:
+        runner.bench(
+            "text_extraction",
+            lambda: mods["loans"].extract_text_from_pdf(pdf),
+            repeat=args.heavy_repeat,
+            pdf=os.path.basename(pdf),
+        )
+
+
+def bench_structure(runner, mods, pdfs, args):
+    import fitz
+
+    for pdf in pdfs:
+        doc = fitz.open(pdf)
+        pages = range(min(args.pages, doc.page_count))
+
+        def run():
+            for p in pages:
+                mods["pdf_viewer"].extract_text_structure(doc.load_page(p))
+
+        runner.bench("structure_extraction", run, pdf=os.path.basename(pdf), pages=len(pages))
+
+        runner.bench(
+            "page_store_build",
+            lambda: mods["pagestore"].write_page_store(
+                os.path.join("page_store_bench", os.path.basename(pdf) + ".pages"),
+                ((pg.rect.width, pg.rect.height, *mods["pdf_viewer"].extract_text_structure(pg)) for pg in doc),
+            ),
+            repeat=args.heavy_repeat,
+            pdf=os.path.basename(pdf),
+            pages=doc.page_count,
+        )
+        store = mods["pagestore"].PageStore(os.path.join("page_store_bench", os.path.basename(pdf) + ".pages"))
+
+        def run_store():
+            for p in pages:
+                store.page_structure(p + 1)
+
+        runner.bench("structure_from_page_store", run_store, pdf=os.path.basename(pdf), pages=len(pages))
+
+
+def bench_render(runner, mods, pdfs, args):
+    for pdf in pdfs:
+        for dpi in args.dpis:
+            runner.bench(
+                "page_render",
+                lambda: mods["pdf_viewer"].render_pdf_page_as_image(pdf, 1, dpi=dpi),
+                pdf=os.path.basename(pdf),
+                dpi=dpi,
+            )
+        for fmt in ("webp", "jpeg"):
+            for height in (mods["pdf_viewer"].PREVIEW_HEIGHT, mods["pdf_viewer"].VIEWPORT_HEIGHT):
+                path = mods["pdf_viewer"].render_page_file(pdf, 1, target_height=height, fmt=fmt)
+                runner.bench(
+                    "page_render_encoded",
+                    lambda: mods["pdf_viewer"].render_page_file(
+                        pdf, 1, target_height=height, fmt=fmt, use_cache=False
+                    ),
+                    pdf=os.path.basename(pdf),
+                    fmt=fmt,
+                    height=height,
+                    bytes=os.path.getsize(path),
+                )
+        runner.bench(
+            "page_render_highlighted",
+            lambda: mods["pdf_viewer"].render_pdf_page_as_image(pdf, 1, HIGHLIGHT_SPANS),
+            pdf=os.path.basename(pdf),
+            dpi=150,
+        )
+
+
+def bench_highlight(runner, mods, pdfs, args):
+    import fitz
+
+    for pdf in pdfs:
+        doc = fitz.open(pdf)
+        page = doc.load_page(0)
+        runner.bench(
+            "highlight_resolution",
+            lambda: mods["pdf_viewer"].resolve_highlight_rects(page, HIGHLIGHT_SPANS),
+            pdf=os.path.basename(pdf),
+            spans=len(HIGHLIGHT_SPANS),
+        )
+        runner.bench(
+            "highlight_overlay_view",
+            lambda: mods["pdf_viewer"].render_page_view(pdf, 1, HIGHLIGHT_SPANS),
+            pdf=os.path.basename(pdf),
+            spans=len(HIGHLIGHT_SPANS),
+        )
+
+
+def bench_db(runner, mods, seeds, args):
+    data = mods["data"]
+    seed = seeds[0]
+
+    for n in args.sizes:
+        data.set_entries(synthetic_portfolio(seeds, n))
+        data.save_database()
+        last = data.LOAN_DATABASE[-1]["filename"]
+        middle = data.LOAN_DATABASE[n // 2]["filename"]
+
+        runner.bench("db_load", data.load_database, repeat=args.heavy_repeat, loans=n)
+        runner.bench("db_lookup_middle", lambda: data.get_entry_by_filename(middle), loans=n)
+        runner.bench("db_lookup_last", lambda: data.get_entry_by_filename(last), loans=n)
+        runner.bench("db_lookup_missing", lambda: data.get_entry_by_filename("missing.pdf"), loans=n)
+        runner.bench("db_search_hit", lambda: data.get_dataframe_data("facility"), loans=n)
+        runner.bench("db_search_miss", lambda: data.get_dataframe_data("zzz-no-match"), loans=n)
+        runner.bench("db_search_all", lambda: data.get_dataframe_data(""), loans=n)
+        runner.bench("db_file_options", data.get_file_options, loans=n)
+
+        counter = itertools.count()
+        runner.bench(
+            "db_add",
+            lambda: data.add_loan(f"bench-new-{next(counter)}.pdf", seed["filepath"], seed["full_json"]),
+            repeat=args.heavy_repeat,
+            loans=n,
+        )
+
+    data.set_entries(seeds)
+    data.save_database()
+
+
+def bench_storage(runner, mods, seeds, args):
+    """Dictionary-compressed store vs the legacy indent=2 JSON file."""
+    data, compression = mods["data"], mods["compression"]
+    if not compression.available():
+        print("storage: zstandard not installed, skipping", file=sys.stderr)
+        return
+
+    for n in args.sizes:
+        # Per-loan variation so the dictionary cannot just memorize one payload
+        entries = []
+        for entry in synthetic_portfolio(seeds, n):
+            full_json = dict(entry["full_json"])
+            full_json["core_loan_terms"] = {**full_json.get("core_loan_terms", {}), "borrower": entry["borrower"]}
+            entries.append({**entry, "full_json": full_json})
+
+        with open("legacy.json", "w") as f:
+            json.dump(entries, f, indent=2)
+        legacy_bytes = os.path.getsize("legacy.json")
+
+        data.set_entries(entries)
+        compression.train([e["full_json"] for e in entries])
+        data.recompress()
+        packed_bytes = os.path.getsize(data.DB_FILE)
+
+        def load_legacy():
+            with open("legacy.json", "r") as f:
+                return json.load(f)
+
+        def load_packed():
+            data.set_entries(data.load_database())
+
+        runner.bench("storage_load_legacy", load_legacy, repeat=args.heavy_repeat, loans=n, bytes=legacy_bytes)
+        runner.bench("storage_load_compressed", load_packed, repeat=args.heavy_repeat, loans=n, bytes=packed_bytes)
+
+        plain = entries[n // 2]
+        packed = data.LOAN_DATABASE[n // 2]
+        runner.bench("storage_record_legacy", lambda: plain["full_json"], loans=n)
+        runner.bench("storage_record_decode", lambda: packed["full_json"], loans=n)
+
+    data.set_entries(seeds)
+    data.save_database()
+
+
+def _amended_copy(sections, every=40):
+    """Sections with every `every`-th word changed (an edited amendment)."""
+    amended = []
+    for section in sections:
+        words = section["text"].split()
+        for i in range(every // 2, len(words), every):
+            words[i] = words[i] + "-amended"
+        amended.append({**section, "text": " ".join(words)})
+    return amended
+
+
+def bench_compare(runner, mods, seeds, pdfs, args):
+    mods["data"].set_entries(seeds)
+    for a, b in itertools.combinations([s["filename"] for s in seeds], 2):
+        runner.bench(
+            "json_comparison",
+            lambda: mods["comparison"].compare_loans(a, b),
+            file_a=a,
+            file_b=b,
+        )
+
+    clausediff = mods["clausediff"]
+    # Same worker processes the server starts in its lifespan
+    clausediff.start_pool()
+    try:
+        _bench_clausediff(runner, args, clausediff, pdfs)
+    finally:
+        clausediff.shutdown_pool()
+
+
+def _bench_clausediff(runner, args, clausediff, pdfs):
+    for pdf in pdfs:
+        def sections_cold():
+            clausediff.document_sections.cache_clear()
+            return clausediff.document_sections(pdf)
+
+        runner.bench("clause_sectioning", sections_cold, repeat=args.heavy_repeat, pdf=os.path.basename(pdf))
+        sections = clausediff.document_sections(pdf)
+        amended = _amended_copy(sections)
+        runner.bench(
+            "clause_diff_amended_copy",
+            lambda: clausediff.diff_sections(sections, amended),
+            repeat=args.heavy_repeat,
+            pdf=os.path.basename(pdf),
+            sections=len(sections),
+            words=sum(len(s["text"].split()) for s in sections),
+        )
+
+    for a, b in itertools.combinations(pdfs, 2):
+        runner.bench(
+            "clause_diff_documents",
+            lambda: clausediff.diff_documents(a, b),
+            repeat=args.heavy_repeat,
+            file_a=os.path.basename(a),
+            file_b=os.path.basename(b),
+        )
+
+
+# Stored core_loan_terms fields whose values can be located verbatim in the PDF
+RECALL_FIELDS = [
+    "borrower", "administrative_agent", "lenders", "facility_type", "loan_amount", "currency",
+    "benchmark_rate", "maturity_or_termination_date", "governing_law", "jurisdiction",
+]
+CURRENCY_ALIASES = {"USD": ["usd", "$", "dollar"], "EUR": ["eur", "€", "euro"], "GBP": ["gbp", "£", "sterling"]}
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+
+
+def _recall_values(core):
+    """(field, value) pairs worth looking for in the document text."""
+    values = []
+    for field in RECALL_FIELDS:
+        value = core.get(field)
+        for item in value if isinstance(value, list) else [value]:
+            is_number = isinstance(item, (int, float)) and not isinstance(item, bool)
+            if is_number or (isinstance(item, str) and 0 < len(item) <= 80):
+                values.append((field, item))
+    return values
+
+
+def _normalize(text):
+    text = " ".join(text.lower().split())
+    return re.sub(r"(?<=\d)[,. ](?=\d{3}\b)", "", text)  # 50,000,000 -> 50000000
+
+
+def _value_found(field, value, norm_text):
+    if isinstance(value, (int, float)):
+        return str(int(value)) in norm_text
+    if field == "currency" and value.upper() in CURRENCY_ALIASES:
+        return any(alias in norm_text for alias in CURRENCY_ALIASES[value.upper()])
+    date = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", value)
+    if date:
+        year, month, day = int(date.group(1)), MONTHS[int(date.group(2)) - 1].lower(), int(date.group(3))
+        pattern = rf"\b0?{day}(?:st|nd|rd|th)?\s+{month},?\s+{year}\b|\b{month}\s+0?{day}(?:st|nd|rd|th)?,?\s+{year}\b"
+        return re.search(pattern, norm_text) is not None
+    return _normalize(value) in norm_text
+
+
+def bench_relevance(runner, mods, seeds, pdfs, args):
+    """
+    Page pre-filter vs the old blind prefix: field recall against the
+    stored extractions, characters sent, and selection time. Recall counts
+    only values that occur somewhere in the document.
+    """
+    loans, relevance = mods["loans"], mods["relevance"]
+    by_name = {os.path.basename(p): p for p in pdfs}
+    limit = loans.PROMPT_CHAR_LIMIT
+
+    for seed in seeds:
+        pdf = by_name.get(os.path.basename(seed["filepath"]))
+        core = (seed.get("full_json") or {}).get("core_loan_terms") or {}
+        if not pdf or not core:
+            continue
+
+        pages = loans.read_document_pages(pdf)
+        full_text = _normalize("\n".join(text for _, text in pages))
+        prefix = _normalize("\n".join(text for _, text in pages)[:limit])
+        excerpt, selected = loans.build_document_excerpt(pages)
+        excerpt_text = _normalize(excerpt)
+
+        present = [(f, v) for f, v in _recall_values(core) if _value_found(f, v, full_text)]
+        hits_prefix = sum(_value_found(f, v, prefix) for f, v in present)
+        hits_relevance = sum(_value_found(f, v, excerpt_text) for f, v in present)
+
+        runner.bench(
+            "relevance_page_selection",
+            lambda: relevance.select_pages(pages, limit),
+            repeat=args.heavy_repeat,
+            pdf=os.path.basename(pdf),
+            pages=len(pages),
+            selected_pages=len(selected),
+            chars_prefix=len(prefix),
+            chars_relevance=len(excerpt),
+            values=len(present),
+            recall_prefix=round(hits_prefix / len(present), 3) if present else None,
+            recall_relevance=round(hits_relevance / len(present), 3) if present else None,
+        )
+
+
+def bench_extract(runner, mods, pdfs, args):
+    """End-to-end handlers with the LLM / TTS stubbed out."""
+
+    class _Upload:
+        def __init__(self, name):
+            self.name = name
+
+    for pdf in pdfs:
+        upload = _Upload(pdf)
+        runner.bench(
+            "metadata_extraction_stubbed_llm",
+            lambda: mods["loans"].extract_metadata_handler(upload),
+            repeat=args.heavy_repeat,
+            pdf=os.path.basename(pdf),
+        )
+        runner.bench(
+            "metadata_extraction_stream_first_update",
+            lambda: next(mods["loans"].extract_metadata_stream(upload)),
+            repeat=args.heavy_repeat,
+            pdf=os.path.basename(pdf),
+        )
+        runner.bench(
+            "metadata_extraction_stream_stubbed_llm",
+            lambda: list(mods["loans"].extract_metadata_stream(upload)),
+            repeat=args.heavy_repeat,
+            pdf=os.path.basename(pdf),
+        )
+        runner.bench(
+            "page_analysis_stubbed_llm",
+            lambda: mods["pdf_viewer"].analyze_specific_page(pdf, 1),
+            pdf=os.path.basename(pdf),
+        )
+
+# -------------------------------------------------
+# CLI
+# -------------------------------------------------
+
+def parse_args(argv=None):
+    def int_list(s):
+        return [int(x) for x in s.split(",") if x]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(GROUPS), help=f"Comma list of groups: {','.join(GROUPS)}")
+    parser.add_argument("--pdfs", default=os.path.join(PDF_DIR, "*.pdf"), help="Glob of PDFs to use")
+    parser.add_argument("--sizes", type=int_list, default=DEFAULT_SIZES, help="Portfolio sizes for DB benchmarks")
+    parser.add_argument("--dpis", type=int_list, default=DEFAULT_DPIS, help="DPIs for page rendering")
+    parser.add_argument("--pages", type=int, default=5, help="Pages per PDF for structure extraction")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions for cheap benchmarks")
+    parser.add_argument("--heavy-repeat", type=int, default=2, help="Timed repetitions for expensive benchmarks")
+    parser.add_argument("--profile", action="store_true", help="Attach cProfile top functions to each result")
+    parser.add_argument("-o", "--output", help="Write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        raise SystemExit(f"Unknown benchmark groups: {', '.join(sorted(unknown))}")
+
+    pdfs = sorted(glob.glob(args.pdfs))
+    output = os.path.abspath(args.output) if args.output else None
+    original_cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory(prefix="loaniq-bench-") as workdir:
+        mods, seeds = load_app_modules(workdir)
+        runner = Runner(repeat=args.repeat, profile=args.profile)
+
+        for group in groups:
+            if group == "text":
+                bench_text(runner, mods, pdfs, args)
+            elif group == "structure":
+                bench_structure(runner, mods, pdfs, args)
+            elif group == "render":
+                bench_render(runner, mods, pdfs, args)
+            elif group == "highlight":
+                bench_highlight(runner, mods, pdfs, args)
+            elif group == "db":
+                bench_db(runner, mods, seeds, args)
+            elif group == "storage":
+                bench_storage(runner, mods, seeds, args)
+            elif group == "compare":
+                bench_compare(runner, mods, seeds, pdfs, args)
+            elif group == "relevance":
+                bench_relevance(runner, mods, seeds, pdfs, args)
+            elif group == "extract":
+                bench_extract(runner, mods, pdfs, args)
+
+        os.chdir(original_cwd)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "groups": groups,
+            "pdfs": [os.path.basename(p) for p in pdfs],
+        },
+        "results": runner.results,
+    }
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
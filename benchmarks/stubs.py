@@ -0,0 +1,124 @@
+"""
+Offline stand-ins for the OpenAI chat and TTS clients.
+
+The benchmarks must be reproducible and free, so every LLM / TTS call is
+answered locally with a canned payload instead of hitting the network.
+"""
+import json
+import time
+
+# Canned page analysis, shaped like the reply `analyze_specific_page` expects
+PAGE_ANALYSIS_REPLY = {
+    "summary_paragraph": "This page sets out the key commercial terms of the facility.",
+    "highlight_span_ids": [0, 2, 4],
+    "risk_types": ["Legal", "Financial"],
+    "clauses": ["Material Adverse Effect"],
+}
+
+
+class _Message:
+    def __init__(self, content):
+        self.content = content
+
+
+class _Choice:
+    def __init__(self, content):
+        self.message = _Message(content)
+
+
+class _ChatResponse:
+    def __init__(self, content):
+        self.choices = [_Choice(content)]
+
+
+class _Delta:
+    def __init__(self, content):
+        self.content = content
+
+
+class _StreamChoice:
+    def __init__(self, content):
+        self.delta = _Delta(content)
+
+
+class _StreamChunk:
+    def __init__(self, content):
+        self.choices = [_StreamChoice(content)]
+
+
+def _stream_chunks(content, size=64):
+    for i in range(0, len(content), size):
+        yield _StreamChunk(content[i:i + size])
+
+
+class _Completions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model=None, messages=None, **kwargs):
+        self._owner.calls += 1
+        if self._owner.latency:
+            time.sleep(self._owner.latency)
+
+        prompt = messages[-1]["content"] if messages else ""
+        if "core_loan_terms" in prompt:
+            content = json.dumps(self._owner.extraction_reply)
+        else:
+            content = json.dumps(PAGE_ANALYSIS_REPLY)
+
+        if kwargs.get("stream"):
+            return _stream_chunks(content)
+        return _ChatResponse(content)
+
+
+class _Chat:
+    def __init__(self, owner):
+        self.completions = _Completions(owner)
+
+
+class _SpeechResponse:
+    def stream_to_file(self, path):
+        with open(path, "wb") as f:
+            f.write(b"ID3stub")
+
+
+class _Speech:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model=None, voice=None, input=None, **kwargs):
+        self._owner.calls += 1
+        return _SpeechResponse()
+
+
+class _Audio:
+    def __init__(self, owner):
+        self.speech = _Speech(owner)
+
+
+class StubOpenAI:
+    """
+    Drop-in replacement for `openai.OpenAI` (chat completions + TTS only).
+    `latency` adds a fixed sleep per chat call to mimic a remote model.
+    """
+
+    extraction_reply = {"core_loan_terms": {}}
+    latency = 0.0
+
+    def __init__(self, api_key=None, **kwargs):
+        self.calls = 0
+        self.chat = _Chat(self)
+        self.audio = _Audio(self)
+
+
+def install(loans_module, pdf_viewer_module, extraction_reply=None, latency=0.0):
+    """
+    Patches the app modules so no request leaves the machine.
+    """
+    if extraction_reply is not None:
+        StubOpenAI.extraction_reply = extraction_reply
+    StubOpenAI.latency = latency
+
+    loans_module.OpenAI = StubOpenAI
+    loans_module.OPENAI_API_KEY = "sk-benchmark-stub"
+    pdf_viewer_module.client = StubOpenAI()
@@ -0,0 +1,196 @@
+import io
+import json
+import hashlib
+import logging
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from modules import data, scheduling
+
+# -------------------------------------------------
+# Headless HTTP API (mounted next to the Gradio UI)
+# -------------------------------------------------
+#   GET /api/loans                  paginated listing + filters (no full_json)
+#   GET /api/loans/{filename}       one loan with full_json, ETag / 304
+#   GET /api/export.ndjson          streaming bulk export, one loan per line
+#   GET /api/export.parquet         streaming Parquet export (needs pyarrow)
+#   GET /api/metrics                scheduler lane metrics
+#
+# Exports walk the store one entry at a time and flush every
+# EXPORT_BATCH_ROWS rows, so memory stays flat however large the book is.
+
+SUMMARY_FIELDS = ["filename", "sha256", "borrower", "lender", "amount", "interest", "maturity"]
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_ROWS = 1000
+
+router = APIRouter(prefix="/api", tags=["loans"])
+
+
+def _summary(entry):
+    return {field: entry.get(field) for field in SUMMARY_FIELDS}
+
+
+def _etag(version, entry):
+    """
+    Store version + the PDF's content hash: changes whenever the entry can
+    have, without decoding or serializing full_json.
+    """
+    key = f"{version}:{entry.get('sha256')}:{entry['filename']}"
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _column_value(value):
+    """Parquet string cell: lists / dicts as JSON, like the NDJSON export."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+# -------------------------------------------------
+# Listing / single loan
+# -------------------------------------------------
+
+@router.get("/loans")
+def list_loans(
+    q: str = Query(None, description="Matches any visible field"),
+    borrower: str = None,
+    lender: str = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+):
+    total, entries = data.query_loans(q, borrower, lender, offset, limit)
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "version": data.DB_VERSION,
+        "items": [_summary(e) for e in entries],
+    }
+
+
+@router.get("/loans/{filename:path}")
+def get_loan(filename: str, request: Request):
+    version, entry = data.get_versioned_entry(filename)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Loan not found: {filename}")
+
+    etag = _etag(version, entry)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    body = json.dumps({**_summary(entry), "full_json": entry["full_json"]}).encode("utf-8")
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# -------------------------------------------------
+# Bulk export
+# -------------------------------------------------
+
+def iter_ndjson(include_json=True):
+    """Yields the portfolio as NDJSON, EXPORT_BATCH_ROWS lines per chunk."""
+    lines = []
+    for entry in data.iter_loans():
+        record = _summary(entry)
+        if include_json:
+            record["full_json"] = entry["full_json"]
+        lines.append(json.dumps(record))
+        if len(lines) >= EXPORT_BATCH_ROWS:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        chunk = b"".join(self._chunks)
+        self._chunks = []
+        return chunk
+
+
+def iter_parquet(include_json=True):
+    """
+    Yields the portfolio as a Parquet file, one row group per
+    EXPORT_BATCH_ROWS loans. full_json is stored as a JSON string column.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = SUMMARY_FIELDS + (["full_json"] if include_json else [])
+    schema = pa.schema([(name, pa.string()) for name in columns])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    def flush(batch):
+        writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+        return sink.drain()
+
+    batch = {name: [] for name in columns}
+    rows = 0
+    try:
+        for entry in data.iter_loans():
+            for field in SUMMARY_FIELDS:
+                batch[field].append(_column_value(entry.get(field)))
+            if include_json:
+                batch["full_json"].append(json.dumps(entry["full_json"]))
+            rows += 1
+            if rows >= EXPORT_BATCH_ROWS:
+                yield flush(batch)
+                batch = {name: [] for name in columns}
+                rows = 0
+        if rows:
+            yield flush(batch)
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+@router.get("/export.ndjson")
+def export_ndjson(include_json: bool = True):
+    return StreamingResponse(
+        iter_ndjson(include_json),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="loans.ndjson"'},
+    )
+
+
+@router.get("/export.parquet")
+def export_parquet(include_json: bool = True):
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow (pip install pyarrow)")
+    logging.info("Streaming Parquet export")
+    return StreamingResponse(
+        iter_parquet(include_json),
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": 'attachment; filename="loans.parquet"'},
+    )
+
+# -------------------------------------------------
+# Ops
+# -------------------------------------------------
+
+@router.get("/metrics")
+def metrics():
+    return {"db_version": data.DB_VERSION, "lanes": scheduling.get_metrics()}
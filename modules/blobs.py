@@ -0,0 +1,117 @@
+import os
+import shutil
+import hashlib
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# -------------------------------------------------
+# Content-addressed PDF store
+# -------------------------------------------------
+# Uploaded PDFs are stored once per distinct content, at
+#     saved_pdfs/blobs/<h[0:2]>/<h[2:4]>/<sha256>.pdf
+# Identical files uploaded under different names share one blob, and two
+# different agreements with the same filename can no longer overwrite
+# each other. Paths always use "/" separators.
+
+BLOB_DIR = "saved_pdfs/blobs"
+HASH_CHUNK = 1024 * 1024
+
+# Linux ioctl to clone file extents (btrfs, XFS, ...): copy-on-write, no bytes copied
+FICLONE = 0x40049409
+
+
+def hash_file(path):
+    """Streaming SHA-256 of a file (constant memory)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_path(digest, ext=".pdf"):
+    return f"{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def digest_from_path(path):
+    """The SHA-256 encoded in a blob path, or None for other paths."""
+    path = normalize_path(path)
+    if not path or not path.startswith(BLOB_DIR + "/"):
+        return None
+    digest = os.path.splitext(os.path.basename(path))[0]
+    return digest if len(digest) == 64 else None
+
+
+def digest_for(path):
+    """SHA-256 of any stored file (free for blob paths)."""
+    digest = digest_from_path(path)
+    if digest:
+        return digest
+    path = normalize_path(path)
+    if path and os.path.exists(path):
+        return hash_file(path)
+    return None
+
+
+def normalize_path(path):
+    """Stored paths use forward slashes, whatever OS wrote them."""
+    return path.replace("\\", "/") if path else path
+
+
+def _reflink(src, dest):
+    if not fcntl:
+        return False
+    try:
+        with open(src, "rb") as s, open(dest, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dest):
+            os.remove(dest)
+        return False
+
+
+def ingest(src_path):
+    """
+    Adds a file to the store and returns (sha256, blob_path).
+
+    Cheapest first: already stored (nothing written), hard link, reflink,
+    then a plain copy. Copies land under a per-thread temporary name and are
+    published with an atomic rename, so concurrent uploads of the same
+    content (threads or processes) are safe; whichever rename lands last
+    leaves identical bytes.
+    """
+    digest = hash_file(src_path)
+    dest = blob_path(digest)
+
+    if os.path.exists(dest):
+        logging.info(f"Blob {digest[:12]} already stored, skipping write")
+        return digest, dest
+
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+    try:
+        os.link(src_path, dest)
+        return digest, dest
+    except FileExistsError:
+        return digest, dest  # stored concurrently by another upload
+    except OSError:
+        pass  # cross-device or unsupported
+
+    tmp_path = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        if not _reflink(src_path, tmp_path):
+            shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, dest)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if not os.path.exists(dest):
+            raise
+        # Lost a race to an upload of the same content: its blob is identical
+    return digest, dest
@@ -0,0 +1,499 @@
+import os
+import re
+import html
+import time
+import logging
+import functools
+import threading
+import multiprocessing
+from difflib import SequenceMatcher
+from concurrent.futures import ProcessPoolExecutor
+
+from modules import loans, pdf_viewer
+
+# -------------------------------------------------
+# Source-text diff of two agreements, aligned by section
+# -------------------------------------------------
+# 1. Split each document into sections at clause / article headings,
+#    keeping the pages each section spans (text comes from the page store).
+# 2. Align the two section lists on their titles, so renumbered or
+#    inserted clauses still line up.
+# 3. Word-diff each changed pair with Myers' linear-space algorithm,
+#    in worker processes (started with the server, see `start_pool`)
+#    when there is enough text to be worth it.
+# 4. Render only the sections that changed.
+
+# Numbered clauses: "12. CHANGES TO THE LENDERS", "12.3 Conditions of assignment", "2A. ..."
+NUMBERED_HEADING_RE = re.compile(r"^(\d{1,2}[A-Z]?(?:\.\d{1,2}[A-Z]?){0,2})(\.?)(?:\s+(.*))?$")
+# Named divisions: "ARTICLE IV - COVENANTS", "Section 5.02. Mandatory Prepayments", "SCHEDULE 3"
+NAMED_HEADING_RE = re.compile(
+    r"^(ARTICLE|Article|SECTION|Section|CLAUSE|Clause|SCHEDULE|Schedule|PART|Part)\s+"
+    r"([0-9IVXLC]+(?:\.\d+)*[A-Z]?)\b[.:\s–—-]*(.*)$"
+)
+# Running headers / footers that would otherwise show up as edits
+PAGE_NUMBER_RE = re.compile(r"^(page\s+)?\d+(\s+of\s+\d+)?$", re.IGNORECASE)
+# Contents entries: "Governing law ............ 97"
+TOC_LEADER_RE = re.compile(r"(\.{4,}|…+)\s*\d+$")
+# Titles end without punctuation ("etc." aside); a trailing ";" / "," / ":" / "." is a sentence
+TERMINAL_PUNCT_RE = re.compile(r"(?<!etc)[.;:,]$")
+# Numbers that open ordinary lines: "2 Business Days before ...", "30 September 2007"
+NOT_A_TITLE_RE = re.compile(
+    r"^(Business Days?|January|February|March|April|May|June|July|August|September|October|November|December)\b"
+)
+TOKEN_RE = re.compile(r"\S+")
+
+MAX_TITLE_CHARS = 80          # longer "titles" are body text that happens to start with a number
+MAX_TITLE_WORDS = 10
+TOC_MIN_ENTRIES = 3           # contents entries on a page before the whole page is skipped
+MIN_SIMILARITY = 0.3          # below this (quick_ratio) a section counts as rewritten, no word diff
+MAX_EDIT_COST = 5000          # Myers D budget per bisection before giving up on that span
+PARALLEL_MIN_TOKENS = 50000   # total tokens of changed sections before using worker processes
+CONTEXT_WORDS = 12            # unchanged words kept around each edit
+PREVIEW_WORDS = 60            # words shown for added / removed sections
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+# -------------------------------------------------
+# Sectioning
+# -------------------------------------------------
+# PDF text puts a clause number and its title on separate lines about as
+# often as on one ("10.2" / "Market Disruption"), so a bare number takes
+# the following line as its title. Cross-references that happen to start
+# a line ("Clause 21.2 ( Other obligations ) insofar as ...") fail the
+# title check, and contents pages are dropped before they can open dozens
+# of empty sections.
+
+def _is_title(text):
+    """Heading-shaped: short, capitalised, no trailing punctuation."""
+    return (
+        0 < len(text) <= MAX_TITLE_CHARS
+        and len(text.split()) <= MAX_TITLE_WORDS
+        and text[0].isupper()
+        and not TERMINAL_PUNCT_RE.search(text)
+        and not NOT_A_TITLE_RE.match(text)
+    )
+
+
+def _heading_start(line):
+    """(number, title, bare) if the line opens like a heading; bare lines may take the next line as title."""
+    if len(line) > MAX_TITLE_CHARS + 20:
+        return None
+    match = NUMBERED_HEADING_RE.match(line)
+    if match:
+        number, dot, title = match.groups()
+        # "1." / "10.2" alone is a clause number, "30" alone is a page number or a date
+        return number, title or "", not title and bool(dot or "." in number)
+    match = NAMED_HEADING_RE.match(line)
+    if match:
+        kind, number, title = match.groups()
+        # A lone "Clause 26" is a cross-reference wrapped onto its own line
+        return f"{kind.title()} {number}", title.strip(), not title and kind.upper() != "CLAUSE"
+    return None
+
+
+def _contents_entries(lines):
+    """Lines of a page that look like contents entries: dotted leaders, or a page number after a title."""
+    count = 0
+    for i, line in enumerate(lines):
+        if TOC_LEADER_RE.search(line):
+            count += 1
+        elif 0 < i < len(lines) - 1 and PAGE_NUMBER_RE.match(line):
+            # Entries wrap, so the line before the number is only the title's tail
+            previous = lines[i - 1]
+            if not (TERMINAL_PUNCT_RE.search(previous) or NOT_A_TITLE_RE.match(previous) or PAGE_NUMBER_RE.match(previous)):
+                count += 1
+    return count
+
+
+def _page_headings(lines):
+    """
+    [(line, heading)] for one page's lines, heading being (number, title)
+    or None. A heading split over two lines comes back joined.
+    """
+    headings = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        start = _heading_start(line)
+        heading = None
+        if start:
+            number, title, bare = start
+            following = lines[i + 1] if i + 1 < len(lines) else ""
+            if bare and following and _is_title(following) and not _heading_start(following):
+                title = following
+                line = f"{line} {following}"
+                i += 1
+            if _is_title(title):
+                heading = number, title
+            elif bare and not title and not number[0].isdigit() and not TERMINAL_PUNCT_RE.search(line):
+                # "SCHEDULE 3" on its own, but not a sentence ending in "... Section 4.02."
+                heading = number, title
+        i += 1
+        # A stray contents entry: "Governing law ..... 97", or a page number on the
+        # next line (a number on the page's last line is the footer)
+        if TOC_LEADER_RE.search(line) or (heading and i < len(lines) - 1 and PAGE_NUMBER_RE.match(lines[i])):
+            heading = None
+        headings.append((line, heading))
+    return headings
+
+
+def split_sections(pages):
+    """
+    pages: iterable of (page_number, text).
+    Returns [{"number", "title", "key", "first_page", "last_page", "text"}],
+    with any text before the first heading as a "Preamble" section.
+    Contents pages are skipped.
+    """
+    sections = []
+    current = {"number": "", "title": "Preamble", "first_page": 1, "last_page": 1, "lines": []}
+
+    for page_num, text in pages:
+        lines = [line for line in (" ".join(raw.split()) for raw in text.splitlines()) if line]
+        if _contents_entries(lines) >= TOC_MIN_ENTRIES:
+            continue
+        for line, heading in _page_headings(lines):
+            if heading:
+                if current["lines"] or current["number"]:
+                    sections.append(current)
+                number, title = heading
+                current = {"number": number, "title": title, "first_page": page_num, "last_page": page_num, "lines": []}
+            elif not PAGE_NUMBER_RE.match(line):
+                current["lines"].append(line)
+                current["last_page"] = page_num
+    if current["lines"] or current["number"]:
+        sections.append(current)
+
+    for section in sections:
+        section["text"] = " ".join(section.pop("lines"))
+        # Titles are more stable than numbers across amendments
+        section["key"] = " ".join(TOKEN_RE.findall(section["title"].lower())) or section["number"]
+    return sections
+
+
+@functools.lru_cache(maxsize=16)
+def document_sections(pdf_path):
+    """Sections of a stored PDF (paths are content-addressed, so cacheable)."""
+    try:
+        pdf_viewer.preprocess_document(pdf_path)
+    except Exception:
+        logging.exception(f"Page store preprocessing failed for {pdf_path}")
+    pages = ((page_num, text) for page_num, _, text in loans.iter_pdf_page_texts(pdf_path))
+    return split_sections(pages)
+
+
+def align_sections(sections_a, sections_b):
+    """
+    Pairs sections of A and B in document order: [(a or None, b or None)].
+    Titles are matched as a sequence; unmatched runs are paired positionally.
+    """
+    keys_a = [s["key"] for s in sections_a]
+    keys_b = [s["key"] for s in sections_b]
+    pairs = []
+    matcher = SequenceMatcher(None, keys_a, keys_b, autojunk=False)
+    for tag, a0, a1, b0, b1 in matcher.get_opcodes():
+        if tag == "equal":
+            pairs.extend(zip(sections_a[a0:a1], sections_b[b0:b1]))
+            continue
+        run_a, run_b = sections_a[a0:a1], sections_b[b0:b1]
+        common = min(len(run_a), len(run_b)) if tag == "replace" else 0
+        pairs.extend(zip(run_a[:common], run_b[:common]))
+        pairs.extend((a, None) for a in run_a[common:])
+        pairs.extend((None, b) for b in run_b[common:])
+    return pairs
+
+# -------------------------------------------------
+# Myers diff (linear space, middle-snake bisection)
+# -------------------------------------------------
+
+def _append(ops, tag, n):
+    if n <= 0:
+        return
+    if ops and ops[-1][0] == tag:
+        ops[-1] = (tag, ops[-1][1] + n)
+    else:
+        ops.append((tag, n))
+
+
+def _bisect(a, b, max_cost, ops):
+    """Finds the middle snake and recurses on both halves."""
+    n, m = len(a), len(b)
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    size = 2 * max_d + 2
+    vf = [-1] * size
+    vb = [-1] * size
+    vf[offset + 1] = 0
+    vb[offset + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    kf_start = kf_end = kb_start = kb_end = 0
+
+    for d in range(min(max_d, max_cost)):
+        # Forward paths
+        for k in range(-d + kf_start, d + 1 - kf_end, 2):
+            k_off = offset + k
+            if k == -d or (k != d and vf[k_off - 1] < vf[k_off + 1]):
+                x = vf[k_off + 1]
+            else:
+                x = vf[k_off - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            vf[k_off] = x
+            if x > n:
+                kf_end += 2
+            elif y > m:
+                kf_start += 2
+            elif front:
+                kb_off = offset + delta - k
+                if 0 <= kb_off < size and vb[kb_off] != -1 and x >= n - vb[kb_off]:
+                    _split(a, b, x, y, max_cost, ops)
+                    return
+
+        # Backward paths (measured from the end of both sequences)
+        for k in range(-d + kb_start, d + 1 - kb_end, 2):
+            k_off = offset + k
+            if k == -d or (k != d and vb[k_off - 1] < vb[k_off + 1]):
+                x = vb[k_off + 1]
+            else:
+                x = vb[k_off - 1] + 1
+            y = x - k
+            while x < n and y < m and a[n - x - 1] == b[m - y - 1]:
+                x += 1
+                y += 1
+            vb[k_off] = x
+            if x > n:
+                kb_end += 2
+            elif y > m:
+                kb_start += 2
+            elif not front:
+                kf_off = offset + delta - k
+                if 0 <= kf_off < size and vf[kf_off] != -1:
+                    xf = vf[kf_off]
+                    yf = xf - (kf_off - offset)
+                    if xf >= n - x:
+                        _split(a, b, xf, yf, max_cost, ops)
+                        return
+
+    # No common subsequence (or over budget): replace wholesale
+    _append(ops, "-", n)
+    _append(ops, "+", m)
+
+
+def _split(a, b, x, y, max_cost, ops):
+    _diff(a[:x], b[:y], max_cost, ops)
+    _diff(a[x:], b[y:], max_cost, ops)
+
+
+def _diff(a, b, max_cost, ops):
+    # Common prefix / suffix never reach the O(ND) search
+    prefix = 0
+    limit = min(len(a), len(b))
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and a[-suffix - 1] == b[-suffix - 1]:
+        suffix += 1
+
+    _append(ops, "=", prefix)
+    a_mid = a[prefix:len(a) - suffix]
+    b_mid = b[prefix:len(b) - suffix]
+    if not a_mid or not b_mid:
+        _append(ops, "-", len(a_mid))
+        _append(ops, "+", len(b_mid))
+    else:
+        _bisect(a_mid, b_mid, max_cost, ops)
+    _append(ops, "=", suffix)
+
+
+def myers_diff(a, b, max_cost=MAX_EDIT_COST):
+    """
+    Shortest edit script between two sequences as run lengths:
+    [("=" | "-" | "+", count)], in order.
+    """
+    ops = []
+    _diff(list(a), list(b), max_cost, ops)
+    return ops
+
+
+def _diff_section(job):
+    """Worker: (index, tokens_a, tokens_b) -> (index, ops or None if rewritten)."""
+    index, tokens_a, tokens_b = job
+    if SequenceMatcher(None, tokens_a, tokens_b, autojunk=False).quick_ratio() < MIN_SIMILARITY:
+        return index, None
+    return index, myers_diff(tokens_a, tokens_b)
+
+
+def start_pool(max_workers=None):
+    """
+    Worker processes for large diffs. Started once by the server lifespan;
+    without it every diff runs in the calling thread. Workers come from a
+    forkserver rather than a fork of the running, threaded server; the
+    server imports this module once so each worker does not have to.
+    """
+    global _POOL
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+    else:
+        context = multiprocessing.get_context("spawn")
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1, mp_context=context)
+            _POOL.submit(int)  # boot the forkserver and workers now, not on the first diff
+        return _POOL
+
+
+def shutdown_pool():
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+# -------------------------------------------------
+# Document diff
+# -------------------------------------------------
+
+def diff_documents(pdf_a, pdf_b):
+    """Section diff of two stored PDFs, see `diff_sections`."""
+    return diff_sections(document_sections(pdf_a), document_sections(pdf_b))
+
+
+def diff_sections(sections_a, sections_b):
+    """
+    Returns (changes, stats). Each change:
+    {"status": "changed" | "rewritten" | "added" | "removed",
+     "a": section or None, "b": section or None,
+     "tokens_a", "tokens_b", "ops"}
+    """
+    started = time.perf_counter()
+    pairs = align_sections(sections_a, sections_b)
+
+    # Intern words as ints: cheaper comparisons and pickling for the workers
+    vocab = {}
+    changes = []
+    jobs = []
+    for a, b in pairs:
+        if a and b and a["text"] == b["text"]:
+            continue
+        tokens_a = TOKEN_RE.findall(a["text"]) if a else []
+        tokens_b = TOKEN_RE.findall(b["text"]) if b else []
+        status = "changed" if a and b else ("removed" if a else "added")
+        changes.append({"status": status, "a": a, "b": b, "tokens_a": tokens_a, "tokens_b": tokens_b, "ops": None})
+        if status == "changed":
+            jobs.append((
+                len(changes) - 1,
+                [vocab.setdefault(t, len(vocab)) for t in tokens_a],
+                [vocab.setdefault(t, len(vocab)) for t in tokens_b],
+            ))
+
+    # Largest sections first so one long clause does not finish last
+    jobs.sort(key=lambda job: len(job[1]) + len(job[2]), reverse=True)
+    total_tokens = sum(len(job[1]) + len(job[2]) for job in jobs)
+    pool = _POOL
+    if pool is not None and len(jobs) > 1 and total_tokens >= PARALLEL_MIN_TOKENS:
+        results = pool.map(_diff_section, jobs, chunksize=max(1, len(jobs) // 32))
+    else:
+        results = map(_diff_section, jobs)
+
+    for index, ops in results:
+        if ops is None:
+            changes[index]["status"] = "rewritten"
+        else:
+            changes[index]["ops"] = ops
+
+    stats = {
+        "sections": len(pairs),
+        "changed": len(changes),
+        "tokens": total_tokens,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    return changes, stats
+
+# -------------------------------------------------
+# Rendering
+# -------------------------------------------------
+
+def _words(tokens):
+    return html.escape(" ".join(tokens))
+
+
+def _preview(tokens):
+    more = " …" if len(tokens) > PREVIEW_WORDS else ""
+    return _words(tokens[:PREVIEW_WORDS]) + more
+
+
+def _pages(section):
+    if section["first_page"] == section["last_page"]:
+        return f"p.{section['first_page']}"
+    return f"pp.{section['first_page']}–{section['last_page']}"
+
+
+def _render_ops(tokens_a, tokens_b, ops):
+    parts = []
+    i = j = 0
+    for index, (tag, n) in enumerate(ops):
+        if tag == "=":
+            run = tokens_a[i:i + n]
+            head = run[:CONTEXT_WORDS] if index > 0 else []
+            tail = run[-CONTEXT_WORDS:] if index < len(ops) - 1 else []
+            if len(run) > len(head) + len(tail):
+                parts.append(" ".join(p for p in (_words(head), "<span class='cd-gap'>…</span>", _words(tail)) if p))
+            else:
+                parts.append(_words(run))
+            i += n
+            j += n
+        elif tag == "-":
+            parts.append(f"<del>{_words(tokens_a[i:i + n])}</del>")
+            i += n
+        else:
+            parts.append(f"<ins>{_words(tokens_b[j:j + n])}</ins>")
+            j += n
+    return " ".join(parts)
+
+
+def render_changes_html(changes, name_a, name_b):
+    """HTML for the changed sections only, with page references on both sides."""
+    style = """
+    <style>
+    .cd-wrap { background: white !important; color: #333 !important; padding: 10px; border-radius: 4px; font-size: 13px; }
+    .cd-section { border: 1px solid #eee; border-radius: 4px; margin-bottom: 10px; }
+    .cd-head { background: #f8f9fa; padding: 6px 10px; font-weight: bold; color: #333 !important; }
+    .cd-pages { float: right; font-weight: normal; color: #666 !important; }
+    .cd-body { padding: 8px 10px; line-height: 1.5; white-space: pre-wrap; word-break: break-word; color: #333 !important; }
+    .cd-body del { background: #ffebe9; color: #24292e !important; }
+    .cd-body ins { background: #e6ffec; color: #24292e !important; text-decoration: none; }
+    .cd-gap { color: #999 !important; }
+    </style>
+    """
+    if not changes:
+        return style + "<div class='cd-wrap'>No textual differences found.</div>"
+
+    blocks = []
+    for change in changes:
+        a, b = change["a"], change["b"]
+        section = b or a
+        title = html.escape(f"{section['number']} {section['title']}".strip())
+        pages = " · ".join(
+            f"{html.escape(name)} {_pages(s)}" for name, s in ((name_a, a), (name_b, b)) if s
+        )
+
+        if change["status"] == "changed":
+            body = _render_ops(change["tokens_a"], change["tokens_b"], change["ops"])
+        elif change["status"] == "rewritten":
+            body = f"<del>{_preview(change['tokens_a'])}</del><br><ins>{_preview(change['tokens_b'])}</ins>"
+        elif change["status"] == "added":
+            body = f"<ins>{_preview(change['tokens_b'])}</ins>"
+        else:
+            body = f"<del>{_preview(change['tokens_a'])}</del>"
+
+        blocks.append(
+            f"<div class='cd-section'><div class='cd-head'>{title} "
+            f"<span class='cd-pages'>{change['status']} · {pages}</span></div>"
+            f"<div class='cd-body'>{body}</div></div>"
+        )
+    return style + "<div class='cd-wrap'>" + "".join(blocks) + "</div>"
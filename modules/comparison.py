@@ -1,5 +1,5 @@
 import gradio as gr
-from modules import data
+from modules import data, scheduling, clausediff
 import difflib
 import json
 
@@ -70,6 +70,34 @@ def compare_loans(file_a, file_b):
     return report, final_html
 
 
+def compare_source_text(file_a, file_b):
+    """
+    Clause-level diff of the two agreements' own text (not the extracted
+    JSON), aligned by section. Returns (summary markdown, HTML of changed sections).
+    """
+    if not file_a or not file_b:
+        return "Please select two files to compare.", None
+
+    entry_a = data.get_entry_by_filename(file_a)
+    entry_b = data.get_entry_by_filename(file_b)
+
+    if not entry_a or not entry_b:
+        return "Error loading file data.", None
+
+    changes, stats = clausediff.diff_documents(entry_a["filepath"], entry_b["filepath"])
+
+    counts = {}
+    for change in changes:
+        counts[change["status"]] = counts.get(change["status"], 0) + 1
+    summary = (
+        f"**{stats['changed']}** of {stats['sections']} sections differ "
+        f"({counts.get('changed', 0)} edited, {counts.get('rewritten', 0)} rewritten, "
+        f"{counts.get('added', 0)} added, {counts.get('removed', 0)} removed) · "
+        f"{stats['tokens']:,} words diffed in {stats['seconds']}s"
+    )
+    return summary, clausediff.render_changes_html(changes, "A", "B")
+
+
 def create_tab():
     with gr.Column():
         gr.Markdown("### ⚖️ Loan Agreement Comparison")
@@ -92,6 +120,11 @@ def create_tab():
         gr.Markdown("#### Detailed JSON Diff")
         diff_view = gr.HTML(label="Side-by-Side Comparison")
 
+        gr.Markdown("#### Source Text Diff (by section)")
+        text_diff_btn = gr.Button("Compare Source Text", size="sm")
+        text_diff_summary = gr.Markdown()
+        text_diff_view = gr.HTML(label="Changed Sections")
+
         # --- Logic ---
         
         def update_choices():
@@ -99,15 +132,36 @@ def create_tab():
             return gr.Dropdown(choices=opts), gr.Dropdown(choices=opts)
             
         refresh_options_btn.click(
-            fn=update_choices, 
+            **scheduling.INTERACTIVE.bind(update_choices),
             inputs=[], 
-            outputs=[dropdown_a, dropdown_b]
+            outputs=[dropdown_a, dropdown_b],
+            api_name="refresh_documents",
         )
+
+        # Keep choices in sync with loans registered by other workers / replicas
+        seen_version = gr.State(-1)
+        sync_timer = gr.Timer(data.SYNC_INTERVAL)
+
+        def sync_choices(version):
+            data.refresh()
+            if data.DB_VERSION == version:
+                return gr.skip(), gr.skip(), version
+            return (*update_choices(), data.DB_VERSION)
+
+        sync_timer.tick(**scheduling.INTERACTIVE.bind(sync_choices), inputs=[seen_version], outputs=[dropdown_a, dropdown_b, seen_version])
         
         compare_btn.click(
-            fn=compare_loans,
+            **scheduling.CPU.bind(compare_loans),
+            inputs=[dropdown_a, dropdown_b],
+            outputs=[comparison_report, diff_view],
+            api_name="compare",
+        )
+
+        text_diff_btn.click(
+            **scheduling.CPU.bind(compare_source_text),
             inputs=[dropdown_a, dropdown_b],
-            outputs=[comparison_report, diff_view]
+            outputs=[text_diff_summary, text_diff_view],
+            api_name="compare_source_text",
         )
         
         # Auto-refresh choices on load (doesn't always work perfectly in Gradio modular builds, manual refresh button provided)
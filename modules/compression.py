@@ -0,0 +1,157 @@
+import os
+import json
+import base64
+import logging
+import threading
+
+# Optional: without zstandard payloads are stored as plain JSON
+try:
+    import zstandard as zstd
+except ImportError:  # pragma: no cover - optional dependency
+    zstd = None
+
+# -------------------------------------------------
+# Shared-dictionary compression for stored JSON payloads
+# -------------------------------------------------
+# `full_json` payloads repeat the same LMA boilerplate across the book, so a
+# zstd dictionary trained on the stored corpus compresses each record far
+# better than compressing it alone. Packed format (a JSON-safe string):
+#     "<dict_id>:<base64 zstd frame of compact JSON>"
+# dict_id 0 means "no dictionary". Dictionaries are kept by id in a
+# directory next to the database and never overwritten, so any record
+# written by any process stays decodable.
+
+COMPRESSION_LEVEL = 9
+DICT_SIZE = 64 * 1024
+MIN_TRAINING_SAMPLES = 16
+
+_DICT_DIR = None
+_CURRENT = 0            # dictionary id used for new payloads
+_DICTS = {}             # dict_id -> ZstdCompressionDict
+_COMPRESSORS = {}       # dict_id -> ZstdCompressor (not thread-safe: use under _LOCK)
+_DECOMPRESSORS = {}
+_LOCK = threading.RLock()
+
+
+def available():
+    return zstd is not None
+
+
+def dumps_compact(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _dict_file(dict_id):
+    return os.path.join(_DICT_DIR, f"{dict_id}.zdict")
+
+
+def configure(dict_dir):
+    """
+    Points the codec at a dictionary directory and makes the newest
+    dictionary in it current.
+    """
+    global _DICT_DIR, _CURRENT
+    with _LOCK:
+        _DICT_DIR = dict_dir
+        _DICTS.clear()
+        _COMPRESSORS.clear()
+        _DECOMPRESSORS.clear()
+        _CURRENT = 0
+        if not zstd or not os.path.isdir(dict_dir):
+            return
+        files = [f for f in os.listdir(dict_dir) if f.endswith(".zdict")]
+        if files:
+            newest = max(files, key=lambda f: os.path.getmtime(os.path.join(dict_dir, f)))
+            _CURRENT = int(os.path.splitext(newest)[0])
+
+
+def current_dict_id():
+    return _CURRENT
+
+
+def _dictionary(dict_id):
+    d = _DICTS.get(dict_id)
+    if d is None:
+        with open(_dict_file(dict_id), "rb") as f:
+            d = _DICTS[dict_id] = zstd.ZstdCompressionDict(f.read())
+    return d
+
+
+def _compressor(dict_id):
+    c = _COMPRESSORS.get(dict_id)
+    if c is None:
+        if dict_id:
+            c = zstd.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=_dictionary(dict_id))
+        else:
+            c = zstd.ZstdCompressor(level=COMPRESSION_LEVEL)
+        _COMPRESSORS[dict_id] = c
+    return c
+
+
+def _decompressor(dict_id):
+    d = _DECOMPRESSORS.get(dict_id)
+    if d is None:
+        d = _DECOMPRESSORS[dict_id] = (
+            zstd.ZstdDecompressor(dict_data=_dictionary(dict_id)) if dict_id else zstd.ZstdDecompressor()
+        )
+    return d
+
+# -------------------------------------------------
+# Encode / decode
+# -------------------------------------------------
+
+def encode(obj):
+    """Packs a JSON-serializable object with the current dictionary."""
+    raw = dumps_compact(obj)
+    with _LOCK:
+        dict_id = _CURRENT
+        frame = _compressor(dict_id).compress(raw)
+    return f"{dict_id}:{base64.b64encode(frame).decode('ascii')}"
+
+
+def decode(packed):
+    """Inverse of `encode`."""
+    if not zstd:
+        raise RuntimeError("Stored payload is zstd-compressed: pip install zstandard")
+    dict_id, _, payload = packed.partition(":")
+    frame = base64.b64decode(payload)
+    with _LOCK:
+        raw = _decompressor(int(dict_id)).decompress(frame)
+    return json.loads(raw)
+
+# -------------------------------------------------
+# Training
+# -------------------------------------------------
+
+def train(samples):
+    """
+    Trains a dictionary on `samples` (JSON-serializable objects), stores it
+    and makes it current. Returns its id, or None if there is too little
+    data (the current dictionary is then kept).
+    """
+    global _CURRENT
+    if not zstd or len(samples) < MIN_TRAINING_SAMPLES:
+        return None
+
+    raw = [dumps_compact(s) for s in samples]
+    # zstd wants roughly 10x more sample data than dictionary size
+    dict_size = min(DICT_SIZE, max(4096, sum(len(r) for r in raw) // 10))
+    try:
+        d = zstd.train_dictionary(dict_size, raw, level=COMPRESSION_LEVEL)
+    except zstd.ZstdError:
+        logging.warning(f"zstd dictionary training failed on {len(raw)} samples", exc_info=True)
+        return None
+
+    dict_id = d.dict_id()
+    with _LOCK:
+        os.makedirs(_DICT_DIR, exist_ok=True)
+        path = _dict_file(dict_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(d.as_bytes())
+        os.replace(tmp_path, path)
+        _DICTS[dict_id] = d
+        _CURRENT = dict_id
+
+    logging.info(f"Trained zstd dictionary {dict_id} ({dict_size} bytes) on {len(raw)} payloads")
+    return dict_id
@@ -1,10 +1,72 @@
 import json
 import os
 import logging
+import threading
+from modules import state, blobs, compression
 
 # File to persist data
 DB_FILE = "loan_database.json"
 
+# Feed is compacted (snapshot already holds everything) past this size
+FEED_COMPACT_BYTES = 8 * 1024 * 1024
+
+# Seconds between change-feed checks made by UI timers
+SYNC_INTERVAL = 5
+
+def _feed_path():
+    return os.path.splitext(DB_FILE)[0] + ".changes.jsonl"
+
+def _lock_path():
+    return DB_FILE + ".lock"
+
+def _dict_dir():
+    return os.path.splitext(DB_FILE)[0] + ".zdicts"
+
+# -------------------------------------------------
+# Compressed full_json
+# -------------------------------------------------
+# Entries keep `full_json` packed (see modules/compression.py) in memory and
+# on disk; reading entry["full_json"] decodes it on every access.
+
+PACKED_KEY = "full_json_z"
+
+class LoanEntry(dict):
+    """Store entry whose full_json is decoded on access."""
+
+    def __missing__(self, key):
+        if key == "full_json" and PACKED_KEY in self:
+            return compression.decode(dict.__getitem__(self, PACKED_KEY))
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def unpacked(self):
+        """Plain dict with full_json decoded."""
+        entry = {k: v for k, v in self.items() if k != PACKED_KEY}
+        if PACKED_KEY in self:
+            entry["full_json"] = self["full_json"]
+        return entry
+
+    def __reduce__(self):
+        # Worker processes (reports) get a plain dict, no codec needed
+        return (dict, (self.unpacked(),))
+
+def _pack(entry, repack=False):
+    """
+    LoanEntry for a stored or new entry. Plain full_json is compressed when
+    zstandard is installed; `repack` re-encodes with the current dictionary.
+    """
+    entry = LoanEntry(entry)
+    if repack and PACKED_KEY in entry:
+        entry["full_json"] = entry["full_json"]
+    if "full_json" in entry and compression.available():
+        entry[PACKED_KEY] = compression.encode(dict.pop(entry, "full_json"))
+    return entry
+
 def load_database():
     """Lengths the database from disk if exists."""
     if os.path.exists(DB_FILE):
@@ -16,12 +78,181 @@ def load_database():
     return []
 
 def save_database():
-    """Saves the database to disk."""
-    with open(DB_FILE, "w") as f:
-        json.dump(LOAN_DATABASE, f, indent=2)
+    """
+    Saves the database to disk (atomically, readers never see a partial file).
+    Writers only call this through `_compact`: the snapshot plus the change
+    feed is the store, so the feed must be truncated at the same time.
+    """
+    tmp_path = f"{DB_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(LOAN_DATABASE, f, separators=(",", ":"))
+    os.replace(tmp_path, DB_FILE)
+
+# -------------------------------------------------
+# In-memory state + incremental caches
+# -------------------------------------------------
+
+LOAN_DATABASE = []
+DB_VERSION = 0          # last change-feed version applied by this process
+
+_INDEX = {}             # filename -> position in LOAN_DATABASE
+_BY_HASH = {}           # sha256 of the PDF -> set of filenames
+_ROWS = []              # cached table rows, parallel to LOAN_DATABASE
+_SEARCH_TEXT = []       # lower-cased searchable text per row
+_FEED = None
+_LISTENERS = []
+_MUTEX = threading.RLock()
+
+def _make_row(entry):
+    return [
+        entry["filename"],
+        entry["borrower"],
+        entry["lender"],
+        entry["amount"],
+        entry["interest"],
+        entry["maturity"],
+        "📄 View PDF",
+        "🔍 View JSON"
+    ]
+
+def _apply(entry):
+    """Upserts one entry into the list and every cache. Returns the stored entry."""
+    entry = _pack(entry)
+    entry["filepath"] = blobs.normalize_path(entry.get("filepath"))
+    row = _make_row(entry)
+    text = "\n".join(str(v) for v in row[:6]).lower()
+
+    idx = _INDEX.get(entry["filename"])
+    if idx is not None:
+        old_hash = LOAN_DATABASE[idx].get("sha256")
+        if old_hash:
+            _BY_HASH.get(old_hash, set()).discard(entry["filename"])
+    if entry.get("sha256"):
+        _BY_HASH.setdefault(entry["sha256"], set()).add(entry["filename"])
+
+    if idx is not None:
+        LOAN_DATABASE[idx] = entry
+        _ROWS[idx] = row
+        _SEARCH_TEXT[idx] = text
+    else:
+        _INDEX[entry["filename"]] = len(LOAN_DATABASE)
+        LOAN_DATABASE.append(entry)
+        _ROWS.append(row)
+        _SEARCH_TEXT.append(text)
+    return entry
+
+def set_entries(entries):
+    """Replaces the whole in-memory database and rebuilds the caches."""
+    with _MUTEX:
+        LOAN_DATABASE.clear()
+        _INDEX.clear()
+        _BY_HASH.clear()
+        _ROWS.clear()
+        _SEARCH_TEXT.clear()
+        for entry in entries:
+            _apply(entry)
+
+def subscribe(callback):
+    """
+    Registers callback(entry) for every loan added or updated, in this
+    process or another one. entry is None after a full reload.
+    """
+    _LISTENERS.append(callback)
+
+def _notify(entry):
+    for callback in list(_LISTENERS):
+        try:
+            callback(entry)
+        except Exception:
+            logging.exception("Loan store listener failed")
+
+def open_database(db_file=None):
+    """(Re)loads the snapshot plus its change feed."""
+    global DB_FILE, _FEED
+    with _MUTEX:
+        if db_file:
+            DB_FILE = db_file
+        compression.configure(_dict_dir())
+        _FEED = state.ChangeFeed(_feed_path())
+        with state.FileLock(_lock_path()):
+            _replay()
+    _notify(None)
+
+def _migrate_legacy_files():
+    """
+    Moves loans registered before the blob store (plain saved_pdfs/ paths,
+    no sha256) into it, so dedupe and hash lookups see them. The legacy
+    file is hard-linked, not moved. Runs with the first write rather than
+    on open, so reading a store never rewrites it; the migrated entries go
+    to the change feed like any other update. Caller holds _MUTEX and the
+    store's FileLock. Returns the migrated entries.
+    """
+    global DB_VERSION
+    migrated = []
+    for entry in list(LOAN_DATABASE):
+        path = entry.get("filepath")
+        if entry.get("sha256") and blobs.digest_from_path(path):
+            continue
+        if not path or not os.path.exists(path):
+            logging.warning(f"Cannot migrate {entry['filename']} to the blob store: {path} not found")
+            continue
+        digest, blob = blobs.ingest(path)
+        migrated.append(_apply({**entry, "filepath": blob, "sha256": digest}))
+        DB_VERSION = _FEED.append(migrated[-1])
+
+    if migrated:
+        logging.info(f"Migrated {len(migrated)} legacy loans to the blob store")
+    return migrated
+
+def _replay():
+    """
+    Loads the snapshot and applies every change-feed record written since
+    it. Caller holds _MUTEX and the store's FileLock.
+    """
+    global DB_VERSION
+    set_entries(load_database())
+    _FEED.rewind()
+    _, records = _FEED.poll()
+    for record in records:
+        _apply(record["entry"])
+    DB_VERSION = _FEED.version
+
+def _compact():
+    """
+    Folds the feed into the snapshot: writes every entry, then truncates
+    the feed. Caller holds _MUTEX and the store's FileLock.
+    """
+    save_database()
+    _FEED.compact()
+
+def _poll_feed():
+    """Applies new feed records. Caller holds _MUTEX. Returns (reset, entries)."""
+    global DB_VERSION
+    reset, records = _FEED.poll()
+    if reset:
+        return True, []
+    for record in records:
+        _apply(record["entry"])
+    DB_VERSION = _FEED.version
+    return False, [r["entry"] for r in records]
+
+def refresh():
+    """
+    Picks up loans registered by other processes. Costs one stat() when
+    nothing changed. Returns True if the in-memory state changed.
+    """
+    with _MUTEX:
+        reset, entries = _poll_feed()
+    if reset:
+        logging.info("Loan change feed was compacted elsewhere, reloading snapshot")
+        open_database()
+        return True
+    for entry in entries:
+        _notify(entry)
+    return bool(entries)
 
 # Initialize in-memory storage from disk
-LOAN_DATABASE = load_database()
+open_database()
 
 def add_loan(filename, filepath, json_data):
     """
@@ -64,7 +295,8 @@ def add_loan(filename, filepath, json_data):
 
     entry = {
         "filename": filename,
-        "filepath": filepath,
+        "filepath": blobs.normalize_path(filepath),
+        "sha256": blobs.digest_for(filepath),
         "borrower": borrower,
         "lender": lender,
         "amount": amount,
@@ -73,54 +305,154 @@ def add_loan(filename, filepath, json_data):
         "full_json": json_data
     }
     
-    # Check for duplicates (by filename) and update if exists, or append
-    existing_idx = next((i for i, x in enumerate(LOAN_DATABASE) if x["filename"] == filename), None)
-    if existing_idx is not None:
-        LOAN_DATABASE[existing_idx] = entry
-    else:
-        LOAN_DATABASE.append(entry)
-        
-    save_database()
+    # Upsert by filename under the cross-process lock: catch up with other
+    # writers first so their loans are not overwritten by our snapshot
+    global DB_VERSION
+    with _MUTEX:
+        with state.FileLock(_lock_path()):
+            reset, applied = _poll_feed()
+            if reset:
+                _replay()
+            applied += _migrate_legacy_files()
+
+            # Only the feed record is written; the snapshot is rewritten
+            # when the feed is compacted (or the store repacked)
+            entry["filename"] = _unique_filename(filename, entry["sha256"])
+            entry = _apply(entry)
+            DB_VERSION = _FEED.append(entry)
+            if _maybe_train_dictionary() or _FEED.size > FEED_COMPACT_BYTES:
+                _compact()
+
+    if reset:
+        _notify(None)
+    for other in applied:
+        _notify(other)
+    _notify(entry)
     return entry
 
+def _maybe_train_dictionary():
+    """
+    Trains the shared zstd dictionary once the book is large enough (retried
+    each time the book doubles until it succeeds) and repacks every entry
+    with it. Caller holds the store's FileLock. Returns True if it repacked
+    (the caller then compacts, so the snapshot holds the repacked entries).
+    """
+    n = len(LOAN_DATABASE)
+    if not compression.available() or n < compression.MIN_TRAINING_SAMPLES or n & (n - 1):
+        return False
+    compression.configure(_dict_dir())  # another process may have trained one
+    if compression.current_dict_id():
+        return False
+    if not compression.train([e["full_json"] for e in LOAN_DATABASE]):
+        return False
+    for i, entry in enumerate(LOAN_DATABASE):
+        LOAN_DATABASE[i] = _pack(entry, repack=True)
+    return True
+
+def recompress(retrain=False):
+    """
+    Re-encodes every stored full_json with the current dictionary (after
+    training a new one if `retrain`) and saves. Returns the dictionary id.
+    """
+    if not compression.available():
+        return None
+    with _MUTEX:
+        with state.FileLock(_lock_path()):
+            reset, _ = _poll_feed()
+            if reset:
+                _replay()
+            _migrate_legacy_files()
+            if retrain:
+                compression.train([e["full_json"] for e in LOAN_DATABASE])
+            for i, entry in enumerate(LOAN_DATABASE):
+                LOAN_DATABASE[i] = _pack(entry, repack=True)
+            _compact()
+    return compression.current_dict_id()
+
+def _unique_filename(filename, sha256):
+    """
+    Same filename + same content updates the existing loan; a different
+    agreement uploaded under a taken filename gets a hash suffix instead
+    of overwriting it. Caller holds _MUTEX.
+    """
+    idx = _INDEX.get(filename)
+    if idx is None or not sha256:
+        return filename
+
+    existing = LOAN_DATABASE[idx]
+    existing_hash = existing.get("sha256") or blobs.digest_for(existing["filepath"])
+    if existing_hash in (None, sha256):
+        return filename
+
+    stem, ext = os.path.splitext(filename)
+    return f"{stem} [{sha256[:8]}]{ext}"
+
 def get_dataframe_data(query=None):
     """
     Returns data formatted for the Gradio Dataframe.
     Columns: [Filename, Borrower, Lender, Amount, Interest, Maturity, Actions...]
     Supports filtering by query string.
     """
-    rows = []
-    for entry in LOAN_DATABASE:
-        # Filter logic
-        if query:
-            q = query.lower()
-            # Search across all visible fields
-            values = [
-                entry["filename"], 
-                entry["borrower"], 
-                entry["lender"], 
-                entry["amount"], 
-                entry["interest"], 
-                entry["maturity"]
-            ]
-            if not any(q in str(v).lower() for v in values):
-                continue
-
-        rows.append([
-            entry["filename"],
-            entry["borrower"],
-            entry["lender"],
-            entry["amount"],
-            entry["interest"],
-            entry["maturity"],
-            "📄 View PDF",   
-            "🔍 View JSON"   
-        ])
-    return rows
+    refresh()
+    with _MUTEX:
+        if not query:
+            return list(_ROWS)
+        # Search across all visible fields
+        q = query.lower()
+        return [row for row, text in zip(_ROWS, _SEARCH_TEXT) if q in text]
 
 def get_file_options():
     """Returns a list of filenames for dropdowns."""
-    return [x["filename"] for x in LOAN_DATABASE]
+    refresh()
+    with _MUTEX:
+        return [row[0] for row in _ROWS]
+
+def get_filenames_by_hash(sha256):
+    """Every loan registered for the PDF with this content hash."""
+    refresh()
+    with _MUTEX:
+        return sorted(_BY_HASH.get(sha256, ()))
 
 def get_entry_by_filename(filename):
-    return next((x for x in LOAN_DATABASE if x["filename"] == filename), None)
+    refresh()
+    with _MUTEX:
+        idx = _INDEX.get(filename)
+        return LOAN_DATABASE[idx] if idx is not None else None
+
+def get_versioned_entry(filename):
+    """
+    (DB_VERSION, entry or None), read together: the entry is exactly the
+    one stored at that version.
+    """
+    refresh()
+    with _MUTEX:
+        idx = _INDEX.get(filename)
+        return DB_VERSION, (LOAN_DATABASE[idx] if idx is not None else None)
+
+def query_loans(query=None, borrower=None, lender=None, offset=0, limit=50):
+    """
+    One page of matching entries, in registration order: (total, entries).
+    `query` matches any visible field, `borrower` / `lender` only their own.
+    """
+    refresh()
+    q = (query or "").lower()
+    borrower = (borrower or "").lower()
+    lender = (lender or "").lower()
+    with _MUTEX:
+        matches = [
+            entry for entry, text in zip(LOAN_DATABASE, _SEARCH_TEXT)
+            if q in text
+            and borrower in str(entry["borrower"]).lower()
+            and lender in str(entry["lender"]).lower()
+        ]
+    return len(matches), matches[offset:offset + limit]
+
+def iter_loans():
+    """
+    Every entry as of the call, without holding the lock while the caller
+    consumes them (entries are replaced on update, never mutated).
+    """
+    refresh()
+    with _MUTEX:
+        snapshot = list(LOAN_DATABASE)
+    yield from snapshot
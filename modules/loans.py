@@ -2,16 +2,25 @@ import gradio as gr
 import os
 import json
 import re
+import fitz  # PyMuPDF
 from pypdf import PdfReader
 from openai import OpenAI
 from dotenv import load_dotenv
-import shutil, logging
+import logging, time
+from modules import scheduling, blobs, pagestore, pdf_viewer, relevance
 load_dotenv()
 
 # --- Configuration ---
 # (Ideally this should be an env var, but keeping it here as per previous user edits)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Only this many characters of the document are sent to the LLM
+# (the most relevant pages when the document is longer, see modules/relevance.py)
+PROMPT_CHAR_LIMIT = 12000
+
+# Minimum seconds between two progressive UI updates while streaming
+STREAM_UPDATE_INTERVAL = 0.5
+
 # Remove-Item -Recurse -Force modules\__pycache__
 # Remove-Item -Recurse -Force __pycache__
 
@@ -19,8 +28,13 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 def extract_text_from_pdf(pdf_path):
     """
-    Extracts text from a PDF file using pypdf.
+    Extracts text from a PDF file using pypdf (or from its page store
+    if the same document was already registered).
     """
+    store = pagestore.open_page_store(pdf_path)
+    if store:
+        return "\n".join(text for _, text in store.iter_page_texts()).strip()
+
     try:
         reader = PdfReader(pdf_path)
         text = ""
@@ -30,10 +44,25 @@ def extract_text_from_pdf(pdf_path):
     except Exception as e:
         return f"Error reading PDF: {str(e)}"
 
-def analyze_loan_agreement(text_chunk):
+def iter_pdf_page_texts(pdf_path):
     """
-    Reads a loan agreement like a human analyst and extracts all
-    material, decision-relevant information into dynamic JSON.
+    Yields (page_number, page_count, text) one page at a time so callers
+    can stop reading once they have enough text.
+    """
+    store = pagestore.open_page_store(pdf_path)
+    if store:
+        for page_num, text in store.iter_page_texts():
+            yield page_num, store.page_count, text
+        return
+
+    reader = PdfReader(pdf_path)
+    page_count = len(reader.pages)
+    for i, page in enumerate(reader.pages):
+        yield i + 1, page_count, page.extract_text() or ""
+
+def build_extraction_prompt(text_chunk):
+    """
+    Builds the schema-free extraction prompt for a document prefix.
     """
     # LLM Prompt (Schema-Free)
     prompt = """
@@ -110,7 +139,61 @@ OUTPUT
 --------------------------------
 Return ONE SINGLE JSON object.
 """
-    prompt = prompt.replace("{DOCUMENT_TEXT}", text_chunk[:12000])
+    return prompt.replace("{DOCUMENT_TEXT}", text_chunk[:PROMPT_CHAR_LIMIT])
+
+def read_document_pages(pdf_path):
+    """
+    [(page_number, text)] for every page, from the page store when the
+    document is already registered. Previews are read with PyMuPDF (far
+    faster than pypdf on long filings) and nothing is written for them:
+    the page store is created by `save_pdf_handler`.
+    """
+    store = pagestore.open_page_store(pdf_path)
+    if store:
+        return list(store.iter_page_texts())
+
+    doc = fitz.open(pdf_path)
+    try:
+        return [(page.number + 1, page.get_text()) for page in doc]
+    finally:
+        doc.close()
+
+def build_document_excerpt(pages):
+    """
+    The text sent to the LLM: the pages most likely to hold core loan
+    terms, within PROMPT_CHAR_LIMIT, in document order.
+    Returns (excerpt, selected page numbers).
+    """
+    selected = relevance.select_pages(pages, PROMPT_CHAR_LIMIT)
+    return relevance.format_excerpt(selected), [num for num, _ in selected]
+
+def regex_fallback(text_chunk):
+    """
+    Heuristic extraction of a few critical terms. Instant, so it is also
+    used as the first preview while the LLM is still working.
+    """
+    fallback_data = {}
+    borrower_match = re.search(r"(Borrower|Borrowers)\s*[:\-]?\s*(.+)", text_chunk, re.IGNORECASE)
+    if borrower_match:
+        fallback_data["borrower"] = borrower_match.group(2).strip()
+
+    amount_match = re.search(r"(USD|EUR|GBP|\$)\s?([0-9,]{4,})", text_chunk)
+    if amount_match:
+        fallback_data["loan_amount"] = amount_match.group(2).replace(",", "")
+        fallback_data["currency"] = "USD" if "$" in amount_match.group(1) else amount_match.group(1)
+
+    law_match = re.search(r"governed by the laws? of ([A-Za-z\s]+)", text_chunk, re.IGNORECASE)
+    if law_match:
+        fallback_data["governing_law"] = law_match.group(1).strip()
+
+    return fallback_data
+
+def analyze_loan_agreement(text_chunk):
+    """
+    Reads a loan agreement like a human analyst and extracts all
+    material, decision-relevant information into dynamic JSON.
+    """
+    prompt = build_extraction_prompt(text_chunk)
     # LLM Path (Primary)
     if OPENAI_API_KEY:
         try:
@@ -124,24 +207,92 @@ Return ONE SINGLE JSON object.
             extracted_json = response.choices[0].message.content
             return json.loads(extracted_json), "✅ Analysis complete (LLM – schema-free)."
         except Exception as e:
-            logging.info({}, f"❌ LLM Error: {e}")
+            logging.exception("LLM extraction failed, using regex fallback")
 
     # Regex Fallback (Heuristic)
-    fallback_data = {}
-    borrower_match = re.search(r"(Borrower|Borrowers)\s*[:\-]?\s*(.+)", text_chunk, re.IGNORECASE)
-    if borrower_match:
-        fallback_data["borrower"] = borrower_match.group(2).strip()
+    return regex_fallback(text_chunk), "⚠️ Limited analysis (regex fallback, schema-free)."
 
-    amount_match = re.search(r"(USD|EUR|GBP|\$)\s?([0-9,]{4,})", text_chunk)
-    if amount_match:
-        fallback_data["loan_amount"] = amount_match.group(2).replace(",", "")
-        fallback_data["currency"] = "USD" if "$" in amount_match.group(1) else amount_match.group(1)
+def parse_partial_json(buffer):
+    """
+    Best-effort parse of a JSON object that is still being streamed.
+    Closes any open string / brackets, dropping the trailing incomplete
+    member if needed. Returns None if nothing usable can be recovered.
+    """
+    stack = []
+    in_string = False
+    escape = False
+    cut_points = []  # (index, closers) where the buffer can be cut cleanly
 
-    law_match = re.search(r"governed by the laws? of ([A-Za-z\s]+)", text_chunk, re.IGNORECASE)
-    if law_match:
-        fallback_data["governing_law"] = law_match.group(1).strip()
+    for i, ch in enumerate(buffer):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            cut_points.append((i + 1, "".join(reversed(stack))))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+        elif ch == ",":
+            cut_points.append((i, "".join(reversed(stack))))
 
-    return fallback_data, "⚠️ Limited analysis (regex fallback, schema-free)."
+    candidates = [buffer + ('"' if in_string else "") + "".join(reversed(stack))]
+    candidates += [buffer[:idx] + closers for idx, closers in reversed(cut_points[-3:])]
+
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+def analyze_loan_agreement_stream(text_chunk):
+    """
+    Streaming variant of `analyze_loan_agreement`.
+    Yields (partial_json, status) while the LLM output arrives and ends
+    with the complete result (or the regex fallback on failure).
+    """
+    if OPENAI_API_KEY:
+        try:
+            client = OpenAI(api_key=OPENAI_API_KEY)
+            stream = client.chat.completions.create(
+                model="gpt-4-turbo",
+                messages=[{"role": "user", "content": build_extraction_prompt(text_chunk)}],
+                response_format={"type": "json_object"},
+                temperature=0,
+                stream=True,
+            )
+
+            buffer = ""
+            last_update = 0.0
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                buffer += chunk.choices[0].delta.content or ""
+
+                now = time.monotonic()
+                if now - last_update >= STREAM_UPDATE_INTERVAL:
+                    partial = parse_partial_json(buffer)
+                    if partial:
+                        last_update = now
+                        yield partial, f"⏳ Receiving LLM analysis... {len(buffer)} characters so far."
+
+            yield json.loads(buffer), "✅ Analysis complete (LLM – schema-free)."
+            return
+        except Exception as e:
+            logging.exception("LLM extraction failed, using regex fallback")
+
+    yield regex_fallback(text_chunk), "⚠️ Limited analysis (regex fallback, schema-free)."
 
 def extract_metadata_handler(file_obj):
     """
@@ -150,38 +301,82 @@ def extract_metadata_handler(file_obj):
     if file_obj is None:
         return "No file uploaded.", None
 
-    pdf_text = extract_text_from_pdf(file_obj.name)
-    if "Error reading PDF" in pdf_text:
-        return f"❌ {pdf_text}", None
+    try:
+        pages = read_document_pages(file_obj.name)
+    except Exception as e:
+        return f"❌ Error reading PDF: {str(e)}", None
 
-    extracted_data, status_note = analyze_loan_agreement(pdf_text)
-    status_msg = f"{status_note} Processed {len(pdf_text)} characters."
+    excerpt, selected = build_document_excerpt(pages)
+    extracted_data, status_note = analyze_loan_agreement(excerpt)
+    if status_note.startswith("⚠️"):
+        extracted_data = regex_fallback("\n".join(text for _, text in pages))
+    status_msg = f"{status_note} Processed {len(excerpt)} characters from {len(selected)}/{len(pages)} pages."
     return status_msg, extracted_data
 
+def extract_metadata_stream(file_obj):
+    """
+    Generator version of `extract_metadata_handler` for Gradio streaming.
+    Sends only the most relevant pages to the LLM, shows the regex
+    preview immediately, then updates the JSON as the LLM output arrives.
+    """
+    if file_obj is None:
+        yield "No file uploaded.", None
+        return
+
+    start = time.monotonic()
+    try:
+        pages = read_document_pages(file_obj.name)
+    except Exception as e:
+        yield f"❌ Error reading PDF: {str(e)}", None
+        return
+
+    excerpt, selected = build_document_excerpt(pages)
+    preview = regex_fallback(excerpt)
+    yield (
+        f"🔎 Read {len(pages)} pages in {time.monotonic() - start:.1f}s, sending the "
+        f"{len(selected)} most relevant (~{relevance.estimate_tokens(excerpt)} tokens) to the LLM. "
+        "Showing quick preview while it analyses the document...",
+        preview or None,
+    )
+
+    for extracted_data, status_note in analyze_loan_agreement_stream(excerpt):
+        final = status_note
+        yield status_note, extracted_data
+
+    # Regex fallback should see the whole document, like the blocking path
+    if final.startswith("⚠️") and len(selected) < len(pages):
+        extracted_data = regex_fallback("\n".join(text for _, text in pages))
+
+    yield (
+        f"{final} Processed {len(excerpt)} characters from {len(selected)}/{len(pages)} pages "
+        f"in {time.monotonic() - start:.1f}s.",
+        extracted_data,
+    )
+
 def save_pdf_handler(file_obj):
     """
-    Saves the uploaded file to a 'saved_pdfs' directory.
-    Returns the path to the saved file.
+    Stores the uploaded file in the content-addressed blob store
+    (saved_pdfs/blobs/) and writes its page store (one-time text / layout
+    preprocessing). Returns the path to the stored file.
     """
     if file_obj is None:
         return None
-    
-    # Create directory if not exists
-    save_dir = "saved_pdfs"
-    os.makedirs(save_dir, exist_ok=True)
-    
-    # Get original filename
-    filename = os.path.basename(file_obj.name)
-    destination = os.path.join(save_dir, filename)
-    
-    # Copy file
+
+    # Hard link (or reflink / copy) keyed by SHA-256: identical uploads are
+    # stored once and same-named agreements never overwrite each other
     try:
-        shutil.copy(file_obj.name, destination)
-        return destination
+        digest, destination = blobs.ingest(file_obj.name)
+        logging.info(f"Stored {os.path.basename(file_obj.name)} as blob {digest[:12]}")
     except Exception as e:
         print(f"Error saving file: {e}")
         return None
 
+    try:
+        pdf_viewer.preprocess_document(destination)
+    except Exception:
+        logging.exception("Page store preprocessing failed")
+    return destination
+
 def on_file_upload_change(file_obj):
     """
     Event handler for file upload change.
@@ -222,7 +417,7 @@ def create_tab():
         
         # Events
         pdf_uploader.change(
-            fn=on_file_upload_change,
+            **scheduling.INTERACTIVE.bind(on_file_upload_change),
             inputs=[pdf_uploader],
             outputs=[process_btn, status_output, json_output]
         )
@@ -0,0 +1,223 @@
+import os
+import mmap
+import struct
+import logging
+import functools
+import threading
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+
+from modules import blobs
+
+# -------------------------------------------------
+# Memory-mapped page text & layout store
+# -------------------------------------------------
+# Written once per document at registration, next to its blob:
+#     saved_pdfs/blobs/<h0:2>/<h2:4>/<sha256>.pages
+# Readers mmap the file and slice any page without reopening the PDF.
+#
+# Layout (little-endian):
+#   header      <4sHHI     magic, format version, reserved, page_count
+#   page table  <QQff      block offset, block length, page width, page height   (x page_count)
+#   page block  <III       n_spans, n_lines, text_len
+#               <IIIffff   text_start, text_len, line_index, x0, y0, x1, y1       (x n_spans)
+#               bytes      UTF-8 span texts, back to back                          (text_len)
+
+MAGIC = b"LIQP"
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct("<4sHHI")
+PAGE_ENTRY = struct.Struct("<QQff")
+BLOCK_HEADER = struct.Struct("<III")
+SPAN = struct.Struct("<IIIffff")
+
+# Open stores are shared across requests, most recently used last. Each holds
+# an mmap (and its file descriptor), so the cache is bounded.
+MAX_OPEN_STORES = int(os.getenv("MAX_OPEN_PAGE_STORES", "128"))
+_OPEN_STORES = OrderedDict()
+_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1024)
+def _hash_file_cached(path, size, mtime_ns):
+    return blobs.hash_file(path)
+
+
+def store_path_for(pdf_path):
+    """
+    Path of the page store for a PDF (keyed by content hash, so it never
+    goes stale). Hashes of non-blob paths are memoized per file size /
+    mtime in a bounded, thread-safe cache.
+    """
+    pdf_path = blobs.normalize_path(pdf_path)
+    digest = blobs.digest_from_path(pdf_path)
+    if not digest:
+        try:
+            stat = os.stat(pdf_path)
+        except (OSError, TypeError):
+            return None
+        digest = _hash_file_cached(os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    return blobs.blob_path(digest, ext=".pages")
+
+# -------------------------------------------------
+# Writing
+# -------------------------------------------------
+
+def write_page_store(out_path, pages):
+    """
+    pages: iterable of (width, height, spans, lines) where spans / lines
+    have the shape returned by `pdf_viewer.extract_text_structure`.
+    """
+    blocks = []
+    for width, height, spans, lines in pages:
+        line_of_span = {}
+        for line_idx, line in enumerate(lines):
+            for span_id in line["span_ids"]:
+                line_of_span[span_id] = line_idx
+
+        text = bytearray()
+        span_records = []
+        for span in spans:
+            encoded = span["text"].encode("utf-8")
+            x0, y0, x1, y1 = span["bbox"]
+            span_records.append(SPAN.pack(
+                len(text), len(encoded), line_of_span.get(span["id"], 0), x0, y0, x1, y1,
+            ))
+            text += encoded
+
+        block = BLOCK_HEADER.pack(len(spans), len(lines), len(text)) + b"".join(span_records) + bytes(text)
+        blocks.append((width, height, block))
+
+    offset = HEADER.size + PAGE_ENTRY.size * len(blocks)
+    table = []
+    for width, height, block in blocks:
+        table.append(PAGE_ENTRY.pack(offset, len(block), width, height))
+        offset += len(block)
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(blocks)))
+        f.writelines(table)
+        f.writelines(block for _, _, block in blocks)
+    os.replace(tmp_path, out_path)
+
+# -------------------------------------------------
+# Reading
+# -------------------------------------------------
+
+class PageStore:
+    """Read-only, memory-mapped view of one document's page store."""
+
+    def __init__(self, path):
+        self.path = path
+        self._map()
+
+        magic, version, _, self.page_count = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported page store {path}")
+
+    def _map(self):
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buf = memoryview(self._mmap)
+        self._closed = False
+
+    def close(self):
+        """
+        Unmaps the file. A reader still holding page views keeps the mapping
+        alive until it lets go; a later read on a closed store maps it again.
+        """
+        self._closed = True
+        self._buf.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # page views still exported: unmapped with the last of them
+
+    def _entry(self, page_num):
+        if not 1 <= page_num <= self.page_count:
+            raise IndexError(f"Page {page_num} out of range (1-{self.page_count})")
+        if self._closed:
+            self._map()  # evicted from the shared cache while still in use
+        return PAGE_ENTRY.unpack_from(self._buf, HEADER.size + PAGE_ENTRY.size * (page_num - 1))
+
+    def page_size(self, page_num):
+        _, _, width, height = self._entry(page_num)
+        return width, height
+
+    def page_block(self, page_num):
+        """Zero-copy memoryview of a page's raw block."""
+        offset, length, _, _ = self._entry(page_num)
+        return self._buf[offset:offset + length]
+
+    def _page_parts(self, page_num):
+        block = self.page_block(page_num)
+        n_spans, n_lines, text_len = BLOCK_HEADER.unpack_from(block, 0)
+        spans_end = BLOCK_HEADER.size + SPAN.size * n_spans
+        return (
+            SPAN.iter_unpack(block[BLOCK_HEADER.size:spans_end]),
+            n_lines,
+            block[spans_end:spans_end + text_len],
+        )
+
+    def page_structure(self, page_num):
+        """
+        (spans, lines) for a page, same shape as
+        `pdf_viewer.extract_text_structure` (span IDs included).
+        """
+        records, n_lines, text = self._page_parts(page_num)
+        spans = []
+        lines = [{"span_ids": [], "rects": [], "text": ""} for _ in range(n_lines)]
+
+        for span_id, (start, length, line_idx, x0, y0, x1, y1) in enumerate(records):
+            rect = fitz.Rect(x0, y0, x1, y1)
+            spans.append({
+                "id": span_id,
+                "text": str(text[start:start + length], "utf-8"),
+                "bbox": rect,
+            })
+            lines[line_idx]["span_ids"].append(span_id)
+            lines[line_idx]["rects"].append(rect)
+
+        for line in lines:
+            line["text"] = " ".join(spans[i]["text"] for i in line["span_ids"])
+        return spans, lines
+
+    def page_text(self, page_num):
+        """Plain page text: one line per text line."""
+        records, n_lines, text = self._page_parts(page_num)
+        lines = [[] for _ in range(n_lines)]
+        for start, length, line_idx, *_ in records:
+            lines[line_idx].append(str(text[start:start + length], "utf-8"))
+        return "\n".join(" ".join(parts) for parts in lines)
+
+    def iter_page_texts(self):
+        for page_num in range(1, self.page_count + 1):
+            yield page_num, self.page_text(page_num)
+
+
+def open_page_store(pdf_path):
+    """
+    Shared PageStore for a PDF, or None if it was never preprocessed.
+    Keeps at most MAX_OPEN_STORES mapped, closing the least recently used.
+    """
+    path = store_path_for(pdf_path)
+    if not path or not os.path.exists(path):
+        return None
+    with _LOCK:
+        store = _OPEN_STORES.get(path)
+        if store is not None:
+            _OPEN_STORES.move_to_end(path)
+            return store
+        try:
+            store = _OPEN_STORES[path] = PageStore(path)
+        except (OSError, ValueError):
+            logging.exception(f"Could not open page store {path}")
+            return None
+        while len(_OPEN_STORES) > MAX_OPEN_STORES:
+            _, evicted = _OPEN_STORES.popitem(last=False)
+            evicted.close()
+        return store
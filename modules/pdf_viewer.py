@@ -1,313 +1,652 @@
-import gradio as gr
-import os
-import json
-import logging
-import fitz  # PyMuPDF
-from PIL import Image
-from openai import OpenAI
-import re
-
-# -------------------------------------------------
-# Logging
-# -------------------------------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-)
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-DEF_START_RE = re.compile(r'^"\w+')
-ENUM_RE = re.compile(r'^\([a-zA-Z0-9]+\)')
-
-# -------------------------------------------------
-# PDF Utilities
-# -------------------------------------------------
-
-def extract_text_structure(page):
-    spans = []
-    lines = []
-
-    blocks = page.get_text("dict")["blocks"]
-    for block in blocks:
-        if "lines" not in block:
-            continue
-
-        for line in block["lines"]:
-            line_span_ids = []
-            line_rects = []
-
-            for span in line["spans"]:
-                text = span["text"].strip()
-                if not text:
-                    continue
-
-                span_id = len(spans)
-                spans.append({
-                    "id": span_id,
-                    "text": text,
-                    "bbox": fitz.Rect(span["bbox"])
-                })
-
-                line_span_ids.append(span_id)
-                line_rects.append(fitz.Rect(span["bbox"]))
-
-            if line_span_ids:
-                lines.append({
-                    "span_ids": line_span_ids,
-                    "rects": line_rects,
-                    "text": " ".join(spans[i]["text"] for i in line_span_ids)
-                })
-
-    logging.info(f"Extracted {len(spans)} spans across {len(lines)} lines")
-    return spans, lines
-
-
-def render_pdf_page_as_image(pdf_path, page_num, page_highlights=None):
-    logging.info(
-        f"Rendering page {page_num} | Highlights: {bool(page_highlights)}"
-    )
-
-    doc = fitz.open(pdf_path)
-    page = doc.load_page(page_num - 1)
-
-    # ❗ Never reuse annotations across renders
-    for annot in page.annots() or []:
-        if annot.type[0] == fitz.PDF_ANNOT_HIGHLIGHT:
-            page.delete_annot(annot)
-
-    if page_highlights:
-        spans, lines = extract_text_structure(page)
-        used_lines = set()
-        MAX_LINES = 6
-
-        for span_id in page_highlights:
-            for i, line in enumerate(lines):
-                if span_id in line["span_ids"] and i not in used_lines:
-                    rects = []
-                    lines_used = 0
-
-                    for j in range(i, len(lines)):
-                        text = lines[j]["text"].strip()
-
-                        if j > i and text.startswith('"'):
-                            break
-                        if j > i and ENUM_RE.match(text):
-                            break
-                        if lines_used >= MAX_LINES:
-                            break
-
-                        rects.extend(lines[j]["rects"])
-                        lines_used += 1
-
-                        if "." in text:
-                            break
-
-                    for r in rects:
-                        page.add_highlight_annot(r)
-
-                    used_lines.add(i)
-                    break
-
-    pix = page.get_pixmap(dpi=150)
-    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-    return img
-
-
-def get_page_count(pdf_path):
-    return fitz.open(pdf_path).page_count
-
-# -------------------------------------------------
-# AI Analysis (PROMPT UNCHANGED)
-# -------------------------------------------------
-
-def analyze_specific_page(pdf_path, page_num):
-    logging.info(f"Analyzing page {page_num}")
-
-    doc = fitz.open(pdf_path)
-    page = doc.load_page(page_num - 1)
-
-    spans, _ = extract_text_structure(page)
-
-    if not spans:
-        return "No readable text.", None, [], [], []
-
-    span_dump = "\n".join(
-        f"[{s['id']}] {s['text']}" for s in spans
-    )
-
-    prompt = f"""
-You are an expert loan documentation analyst.
-
-You are analyzing EXACTLY ONE PAGE of a loan agreement.
-
-Below is the page broken into ORDERED TEXT SPANS.
-Each span has a UNIQUE numeric ID.
-Span IDs are ONLY for internal alignment and MUST NEVER appear in the summary text.
-
-========================
-PAGE TEXT SPANS
-========================
-{span_dump}
-
-========================
-YOUR TASK
-========================
-
-Return a VALID JSON object ONLY.
-
-Required format:
-{{
-  "summary_paragraph": string,
-  "highlight_span_ids": array of integers,
-  "risk_types": array of strings,
-  "clauses": array of strings
-}}
-
-========================
-RULES — READ CAREFULLY
-========================
-
-1. SUMMARY PARAGRAPH
-- Write ONE coherent paragraph (5–7 sentences).
-- The FIRST sentence is a high-level introduction to the page.
-- EACH remaining sentence MUST correspond to EXACTLY ONE highlighted span.
-- The summary MUST read naturally, like a professional voice-over.
-- ❗ DO NOT mention span numbers, IDs, brackets, or references of any kind.
-- ❗ Do NOT say things like “Span 12”, “[3]”, or “this section”.
-- The listener should NOT know span IDs exist.
-
-2. HIGHLIGHT SPANS
-- Short page → select 1–3 spans
-- Dense page → select 4–6 spans
-- highlight_span_ids MUST contain ONLY integer IDs from the span list above.
-- The ORDER of span IDs MUST match the order of the corresponding sentences in the summary.
-
-3. RISK TYPES
-Choose all that apply from:
-- Legal
-- Financial
-- Operational
-- Regulatory
-
-4. CLAUSES
-- Extract clause names or defined terms EXACTLY as written.
-- Example: "Material Adverse Effect", "Interest Rate"
-- If none are present, return an empty array.
-
-========================
-STRICT OUTPUT RULES
-========================
-- Output MUST be valid JSON.
-- NO markdown.
-- NO explanations.
-- NO extra keys.
-- NO span IDs or references inside the summary text.
-
-If any rule is violated, the output is invalid.
-"""
-
-
-    response = client.chat.completions.create(
-        model="gpt-4-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3,
-    )
-
-    data = json.loads(response.choices[0].message.content)
-
-    speech = client.audio.speech.create(
-        model="tts-1",
-        voice="nova",
-        input=data["summary_paragraph"],
-    )
-
-    os.makedirs("assets", exist_ok=True)
-    audio_path = f"assets/page_{page_num}.mp3"
-    speech.stream_to_file(audio_path)
-
-    return (
-        data["summary_paragraph"],
-        audio_path,
-        data["highlight_span_ids"],
-        data.get("risk_types", []),
-        data.get("clauses", []),
-    )
-
-# -------------------------------------------------
-# UI
-# -------------------------------------------------
-
-def create_tab():
-    with gr.Row():
-        with gr.Column(scale=2):
-            gr.Markdown("### 📄 Document Viewer")
-            pdf_image = gr.Image(height=800)
-
-            current_pdf_path = gr.State(None)
-            highlights_by_page = gr.State({})
-
-            with gr.Row():
-                page_slider = gr.Slider(1, 1, step=1, label="Go to Page")
-                analyze_btn = gr.Button("✨ Analyze Page", variant="primary")
-
-        with gr.Column(scale=1):
-            gr.Markdown("### 🤖 AI Loan Assistant")
-            risk_md = gr.Markdown("")
-            clause_md = gr.Markdown("")
-            summary_md = gr.Markdown("")
-            audio_player = gr.Audio(autoplay=True)
-
-    def on_page_change(pdf_path, page, highlight_map):
-        page_highlights = highlight_map.get(page, [])
-        return render_pdf_page_as_image(pdf_path, page, page_highlights)
-
-    page_slider.change(
-        fn=on_page_change,
-        inputs=[current_pdf_path, page_slider, highlights_by_page],
-        outputs=pdf_image,
-    )
-
-    def on_analyze(pdf_path, page, highlight_map):
-        summary, audio, span_ids, risks, clauses = analyze_specific_page(
-            pdf_path, page
-        )
-
-        highlight_map = dict(highlight_map)
-        highlight_map[page] = span_ids
-
-        img = render_pdf_page_as_image(pdf_path, page, span_ids)
-
-        return (
-            img,
-            highlight_map,
-            f"⚠️ **Risk Types:** {' | '.join(risks)}",
-            f"📌 **Clauses:** {', '.join(clauses)}",
-            summary,
-            audio,
-        )
-
-    analyze_btn.click(
-        fn=on_analyze,
-        inputs=[current_pdf_path, page_slider, highlights_by_page],
-        outputs=[
-            pdf_image,
-            highlights_by_page,
-            risk_md,
-            clause_md,
-            summary_md,
-            audio_player,
-        ],
-    )
-
-    def update_pdf_state(path):
-        page_count = get_page_count(path)
-        img = render_pdf_page_as_image(path, 1)
-        return img, path, gr.Slider(1, page_count, value=1, step=1)
-
-    return {
-        "pdf_viewer": pdf_image,
-        "current_pdf_path": current_pdf_path,
-        "page_slider": page_slider,
-        "update_fn": update_pdf_state,
-    }
+import gradio as gr
+import os
+import io
+import json
+import hashlib
+import html
+import logging
+import threading
+import urllib.parse
+from functools import lru_cache
+import fitz  # PyMuPDF
+from PIL import Image
+from openai import OpenAI
+import re
+from modules import scheduling, pagestore
+
+# -------------------------------------------------
+# Logging
+# -------------------------------------------------
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+DEF_START_RE = re.compile(r'^"\w+')
+ENUM_RE = re.compile(r'^\([a-zA-Z0-9]+\)')
+
+# Encoded page images are cached here, keyed by document + render settings
+PAGE_CACHE_DIR = "page_cache"
+PAGE_IMAGE_FORMAT = os.getenv("PAGE_IMAGE_FORMAT", "webp")  # "webp" or "jpeg"
+PAGE_IMAGE_QUALITY = 80
+VIEWPORT_HEIGHT = 800   # px, matches the viewer's gr.Image height
+PREVIEW_HEIGHT = 320    # px, quick low-res frame shown while the full one renders
+
+# Least recently used images are evicted (by mtime, refreshed on every hit)
+# once the cache grows past this size, down to PAGE_CACHE_PRUNE_TO of it
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_MB", "512")) * 1024 * 1024
+PAGE_CACHE_PRUNE_TO = 0.8
+
+# app.py serves PAGE_CACHE_DIR as static files under this route (browser-
+# cacheable, no copy). URLs carry only the cache key, never a server path.
+PAGE_ROUTE = "/page-images"
+HIGHLIGHT_STYLE = "background: rgba(255, 221, 0, 0.38); mix-blend-mode: multiply; border-radius: 2px;"
+
+# -------------------------------------------------
+# PDF Utilities
+# -------------------------------------------------
+
+def extract_text_structure(page):
+    spans = []
+    lines = []
+
+    blocks = page.get_text("dict")["blocks"]
+    for block in blocks:
+        if "lines" not in block:
+            continue
+
+        for line in block["lines"]:
+            line_span_ids = []
+            line_rects = []
+
+            for span in line["spans"]:
+                text = span["text"].strip()
+                if not text:
+                    continue
+
+                span_id = len(spans)
+                spans.append({
+                    "id": span_id,
+                    "text": text,
+                    "bbox": fitz.Rect(span["bbox"])
+                })
+
+                line_span_ids.append(span_id)
+                line_rects.append(fitz.Rect(span["bbox"]))
+
+            if line_span_ids:
+                lines.append({
+                    "span_ids": line_span_ids,
+                    "rects": line_rects,
+                    "text": " ".join(spans[i]["text"] for i in line_span_ids)
+                })
+
+    logging.info(f"Extracted {len(spans)} spans across {len(lines)} lines")
+    return spans, lines
+
+
+def preprocess_document(pdf_path):
+    """
+    One-time step at registration: writes the document's page texts,
+    spans and bboxes to its memory-mapped page store.
+    """
+    out_path = pagestore.store_path_for(pdf_path)
+    if not out_path or os.path.exists(out_path):
+        return out_path
+
+    doc = fitz.open(pdf_path)
+    try:
+        pagestore.write_page_store(
+            out_path,
+            ((page.rect.width, page.rect.height, *extract_text_structure(page)) for page in doc),
+        )
+    finally:
+        doc.close()
+    logging.info(f"Page store written: {out_path}")
+    return out_path
+
+
+def get_page_structure(pdf_path, page_num):
+    """
+    (spans, lines) for a page, sliced from the page store when the
+    document was preprocessed, otherwise parsed from the PDF.
+    """
+    store = pagestore.open_page_store(pdf_path)
+    if store:
+        return store.page_structure(page_num)
+
+    doc = fitz.open(pdf_path)
+    try:
+        return extract_text_structure(doc.load_page(page_num - 1))
+    finally:
+        doc.close()
+
+
+def resolve_highlight_rects(page, page_highlights, structure=None):
+    """
+    Expands highlighted span IDs to the rectangles of the sentence or
+    definition they start (at most MAX_LINES lines each).
+    `structure` (spans, lines) skips re-parsing `page`.
+    """
+    spans, lines = structure or extract_text_structure(page)
+    used_lines = set()
+    MAX_LINES = 6
+    highlight_rects = []
+
+    for span_id in page_highlights:
+        for i, line in enumerate(lines):
+            if span_id in line["span_ids"] and i not in used_lines:
+                rects = []
+                lines_used = 0
+
+                for j in range(i, len(lines)):
+                    text = lines[j]["text"].strip()
+
+                    if j > i and text.startswith('"'):
+                        break
+                    if j > i and ENUM_RE.match(text):
+                        break
+                    if lines_used >= MAX_LINES:
+                        break
+
+                    rects.extend(lines[j]["rects"])
+                    lines_used += 1
+
+                    if "." in text:
+                        break
+
+                highlight_rects.extend(rects)
+                used_lines.add(i)
+                break
+
+    return highlight_rects
+
+
+def render_pdf_page_as_image(pdf_path, page_num, page_highlights=None, dpi=150):
+    logging.info(
+        f"Rendering page {page_num} | Highlights: {bool(page_highlights)}"
+    )
+
+    doc = fitz.open(pdf_path)
+    page = doc.load_page(page_num - 1)
+
+    # ❗ Never reuse annotations across renders
+    for annot in page.annots() or []:
+        if annot.type[0] == fitz.PDF_ANNOT_HIGHLIGHT:
+            page.delete_annot(annot)
+
+    if page_highlights:
+        for r in resolve_highlight_rects(page, page_highlights):
+            page.add_highlight_annot(r)
+
+    pix = page.get_pixmap(dpi=dpi)
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    return img
+
+
+def viewport_dpi(page, target_height):
+    """
+    DPI at which the page fills `target_height` pixels.
+    """
+    return max(36, round(72 * target_height / page.rect.height))
+
+
+def encode_pixmap(pix, fmt=PAGE_IMAGE_FORMAT, quality=PAGE_IMAGE_QUALITY):
+    """
+    Compresses a pixmap straight from its sample buffer.
+    JPEG is encoded by MuPDF itself; WebP goes through a PIL image that
+    wraps `samples_mv` without copying the pixels.
+    """
+    if fmt in ("jpeg", "jpg"):
+        return pix.tobytes("jpeg", jpg_quality=quality)
+
+    img = Image.frombuffer(
+        "RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1
+    )
+    buf = io.BytesIO()
+    img.save(buf, format="WEBP", quality=quality, method=4)
+    return buf.getvalue()
+
+
+def _cache_path(pdf_path, page_num, page_highlights, dpi, fmt, quality):
+    stat = os.stat(pdf_path)
+    key = json.dumps([
+        os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns, page_num,
+        sorted(page_highlights or []), dpi, fmt, quality,
+    ])
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    ext = "jpg" if fmt in ("jpeg", "jpg") else fmt
+    return os.path.join(PAGE_CACHE_DIR, digest[:2], f"{digest}.{ext}")
+
+
+def _write_atomic(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+# -------------------------------------------------
+# Page cache size cap (LRU by mtime)
+# -------------------------------------------------
+
+_CACHE_LOCK = threading.Lock()
+_cache_bytes = None     # running estimate, rescanned whenever it passes the cap
+
+
+def _cache_hit(path):
+    """True if `path` is cached; marks it as recently used."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _cache_files():
+    for root, _, names in os.walk(PAGE_CACHE_DIR):
+        for name in names:
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:  # evicted by another worker
+                continue
+            yield path, st.st_size, st.st_mtime
+
+
+def _record_cache_write(nbytes):
+    """
+    Accounts for a newly cached image and evicts the least recently used
+    ones once the cache passes PAGE_CACHE_MAX_BYTES. Other workers share
+    the directory, so the real size is rescanned before evicting.
+    """
+    global _cache_bytes
+    with _CACHE_LOCK:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _cache_files())
+        else:
+            _cache_bytes += nbytes
+        if _cache_bytes <= PAGE_CACHE_MAX_BYTES:
+            return
+
+        files = sorted(_cache_files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        target = PAGE_CACHE_MAX_BYTES * PAGE_CACHE_PRUNE_TO
+        evicted = 0
+        for path, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        _cache_bytes = total
+    if evicted:
+        logging.info(f"Page cache: evicted {evicted} images, {total / 2**20:.0f} MB left")
+
+
+def _load_clean_page(doc, page_num, page_highlights):
+    page = doc.load_page(page_num - 1)
+
+    # ❗ Never reuse annotations across renders
+    for annot in page.annots() or []:
+        if annot.type[0] == fitz.PDF_ANNOT_HIGHLIGHT:
+            page.delete_annot(annot)
+
+    if page_highlights:
+        for r in resolve_highlight_rects(page, page_highlights):
+            page.add_highlight_annot(r)
+    return page
+
+
+def render_page_file(
+    pdf_path,
+    page_num,
+    page_highlights=None,
+    target_height=VIEWPORT_HEIGHT,
+    fmt=PAGE_IMAGE_FORMAT,
+    quality=PAGE_IMAGE_QUALITY,
+    use_cache=True,
+):
+    """
+    Renders a page at a viewport-appropriate resolution and returns the
+    path of the compressed (WebP/JPEG) image. Gradio serves the file as
+    is, so there is no full RGB frame to re-encode to PNG per slider move.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        dpi = viewport_dpi(doc.load_page(page_num - 1), target_height)
+        path = _cache_path(pdf_path, page_num, page_highlights, dpi, fmt, quality)
+        if use_cache and _cache_hit(path):
+            return path
+
+        logging.info(
+            f"Rendering page {page_num} @ {dpi} dpi ({fmt}) | Highlights: {bool(page_highlights)}"
+        )
+        page = _load_clean_page(doc, page_num, page_highlights)
+        payload = encode_pixmap(page.get_pixmap(dpi=dpi), fmt, quality)
+        _write_atomic(path, payload)
+        _record_cache_write(len(payload))
+        return path
+    finally:
+        doc.close()
+
+
+def iter_progressive_render(pdf_path, page_num, page_highlights=None):
+    """
+    Yields a low-res frame first, then the full viewport render.
+    Skips the preview when the full frame is already cached.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        dpi = viewport_dpi(doc.load_page(page_num - 1), VIEWPORT_HEIGHT)
+    finally:
+        doc.close()
+
+    full_path = _cache_path(
+        pdf_path, page_num, page_highlights, dpi, PAGE_IMAGE_FORMAT, PAGE_IMAGE_QUALITY
+    )
+    if not os.path.exists(full_path):
+        yield render_page_file(pdf_path, page_num, page_highlights, target_height=PREVIEW_HEIGHT)
+    yield render_page_file(pdf_path, page_num, page_highlights)
+
+
+@lru_cache(maxsize=512)
+def _highlight_boxes_cached(pdf_path, mtime_ns, page_num, span_ids):
+    store = pagestore.open_page_store(pdf_path)
+    if store:
+        width, height = store.page_size(page_num)
+        rects = resolve_highlight_rects(None, list(span_ids), store.page_structure(page_num))
+        return tuple(
+            (r.x0 / width, r.y0 / height, r.x1 / width, r.y1 / height) for r in rects
+        )
+
+    doc = fitz.open(pdf_path)
+    try:
+        page = doc.load_page(page_num - 1)
+        width, height = page.rect.width, page.rect.height
+        return tuple(
+            (r.x0 / width, r.y0 / height, r.x1 / width, r.y1 / height)
+            for r in resolve_highlight_rects(page, list(span_ids))
+        )
+    finally:
+        doc.close()
+
+
+def get_highlight_boxes(pdf_path, page_num, page_highlights):
+    """
+    Highlight rectangles as fractions of the page size, so the overlay is
+    independent of the resolution the base image was rendered at.
+    Only reads the text layer; the page is never rasterized here.
+    """
+    if not page_highlights:
+        return ()
+    mtime_ns = os.stat(pdf_path).st_mtime_ns
+    return _highlight_boxes_cached(pdf_path, mtime_ns, page_num, tuple(page_highlights))
+
+
+def build_page_html(image_path, boxes=(), height=VIEWPORT_HEIGHT):
+    """
+    Base page image with highlight boxes drawn as an HTML overlay layer.
+    The browser caches the image, so changing highlights only resends
+    this small snippet.
+    """
+    key = os.path.relpath(image_path, PAGE_CACHE_DIR).replace(os.sep, "/")
+    src = f"{PAGE_ROUTE}/{urllib.parse.quote(key)}"
+    overlay = "".join(
+        f"<div style='position:absolute; left:{x0 * 100:.3f}%; top:{y0 * 100:.3f}%; "
+        f"width:{(x1 - x0) * 100:.3f}%; height:{(y1 - y0) * 100:.3f}%; {HIGHLIGHT_STYLE}'></div>"
+        for x0, y0, x1, y1 in boxes
+    )
+    return (
+        "<div style='position:relative; display:inline-block; line-height:0;'>"
+        f"<img src='{html.escape(src, quote=True)}' style='display:block; height:{height}px; width:auto;' alt='PDF page'>"
+        f"{overlay}</div>"
+    )
+
+
+def render_page_view(pdf_path, page_num, page_highlights=None, show_highlights=True):
+    """
+    Viewer HTML for a page: cached un-annotated base image + overlay.
+    """
+    boxes = get_highlight_boxes(pdf_path, page_num, page_highlights) if show_highlights else ()
+    return build_page_html(render_page_file(pdf_path, page_num), boxes)
+
+
+def iter_progressive_page_view(pdf_path, page_num, page_highlights=None, show_highlights=True):
+    """
+    Progressive version of `render_page_view` (low-res frame first).
+    """
+    boxes = get_highlight_boxes(pdf_path, page_num, page_highlights) if show_highlights else ()
+    for image_path in iter_progressive_render(pdf_path, page_num):
+        yield build_page_html(image_path, boxes)
+
+
+def get_page_count(pdf_path):
+    store = pagestore.open_page_store(pdf_path)
+    if store:
+        return store.page_count
+    return fitz.open(pdf_path).page_count
+
+# -------------------------------------------------
+# AI Analysis (PROMPT UNCHANGED)
+# -------------------------------------------------
+
+def analyze_specific_page(pdf_path, page_num):
+    logging.info(f"Analyzing page {page_num}")
+
+    spans, _ = get_page_structure(pdf_path, page_num)
+
+    if not spans:
+        return "No readable text.", None, [], [], []
+
+    span_dump = "\n".join(
+        f"[{s['id']}] {s['text']}" for s in spans
+    )
+
+    prompt = f"""
+You are an expert loan documentation analyst.
+
+You are analyzing EXACTLY ONE PAGE of a loan agreement.
+
+Below is the page broken into ORDERED TEXT SPANS.
+Each span has a UNIQUE numeric ID.
+Span IDs are ONLY for internal alignment and MUST NEVER appear in the summary text.
+
+========================
+PAGE TEXT SPANS
+========================
+{span_dump}
+
+========================
+YOUR TASK
+========================
+
+Return a VALID JSON object ONLY.
+
+Required format:
+{{
+  "summary_paragraph": string,
+  "highlight_span_ids": array of integers,
+  "risk_types": array of strings,
+  "clauses": array of strings
+}}
+
+========================
+RULES — READ CAREFULLY
+========================
+
+1. SUMMARY PARAGRAPH
+- Write ONE coherent paragraph (5–7 sentences).
+- The FIRST sentence is a high-level introduction to the page.
+- EACH remaining sentence MUST correspond to EXACTLY ONE highlighted span.
+- The summary MUST read naturally, like a professional voice-over.
+- ❗ DO NOT mention span numbers, IDs, brackets, or references of any kind.
+- ❗ Do NOT say things like “Span 12”, “[3]”, or “this section”.
+- The listener should NOT know span IDs exist.
+
+2. HIGHLIGHT SPANS
+- Short page → select 1–3 spans
+- Dense page → select 4–6 spans
+- highlight_span_ids MUST contain ONLY integer IDs from the span list above.
+- The ORDER of span IDs MUST match the order of the corresponding sentences in the summary.
+
+3. RISK TYPES
+Choose all that apply from:
+- Legal
+- Financial
+- Operational
+- Regulatory
+
+4. CLAUSES
+- Extract clause names or defined terms EXACTLY as written.
+- Example: "Material Adverse Effect", "Interest Rate"
+- If none are present, return an empty array.
+
+========================
+STRICT OUTPUT RULES
+========================
+- Output MUST be valid JSON.
+- NO markdown.
+- NO explanations.
+- NO extra keys.
+- NO span IDs or references inside the summary text.
+
+If any rule is violated, the output is invalid.
+"""
+
+
+    response = client.chat.completions.create(
+        model="gpt-4-turbo",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3,
+    )
+
+    data = json.loads(response.choices[0].message.content)
+
+    speech = client.audio.speech.create(
+        model="tts-1",
+        voice="nova",
+        input=data["summary_paragraph"],
+    )
+
+    os.makedirs("assets", exist_ok=True)
+    audio_path = f"assets/page_{page_num}.mp3"
+    speech.stream_to_file(audio_path)
+
+    return (
+        data["summary_paragraph"],
+        audio_path,
+        data["highlight_span_ids"],
+        data.get("risk_types", []),
+        data.get("clauses", []),
+    )
+
+# -------------------------------------------------
+# UI
+# -------------------------------------------------
+
+def create_tab():
+    with gr.Row():
+        with gr.Column(scale=2):
+            gr.Markdown("### 📄 Document Viewer")
+            pdf_image = gr.HTML(min_height=VIEWPORT_HEIGHT)
+
+            current_pdf_path = gr.State(None)
+            highlights_by_page = gr.State({})
+
+            with gr.Row():
+                page_slider = gr.Slider(1, 1, step=1, label="Go to Page")
+                analyze_btn = gr.Button("✨ Analyze Page", variant="primary")
+            show_highlights = gr.Checkbox(value=True, label="Show highlights")
+
+        with gr.Column(scale=1):
+            gr.Markdown("### 🤖 AI Loan Assistant")
+            risk_md = gr.Markdown("")
+            clause_md = gr.Markdown("")
+            summary_md = gr.Markdown("")
+            audio_player = gr.Audio(autoplay=True)
+
+    def on_page_change(pdf_path, page, highlight_map, show):
+        if not pdf_path:
+            return
+        page_highlights = highlight_map.get(page, [])
+        yield from iter_progressive_page_view(pdf_path, page, page_highlights, show)
+
+    page_slider.change(
+        **scheduling.RENDER.bind(on_page_change),
+        inputs=[current_pdf_path, page_slider, highlights_by_page, show_highlights],
+        outputs=pdf_image,
+        api_name="go_to_page",
+    )
+
+    def on_toggle_highlights(pdf_path, page, highlight_map, show):
+        if not pdf_path:
+            return gr.skip()
+        return render_page_view(pdf_path, page, highlight_map.get(page, []), show)
+
+    show_highlights.change(
+        **scheduling.INTERACTIVE.bind(on_toggle_highlights),
+        inputs=[current_pdf_path, page_slider, highlights_by_page, show_highlights],
+        outputs=pdf_image,
+    )
+
+    def on_analyze(pdf_path, page, highlight_map, show):
+        summary, audio, span_ids, risks, clauses = analyze_specific_page(
+            pdf_path, page
+        )
+
+        highlight_map = dict(highlight_map)
+        highlight_map[page] = span_ids
+
+        img = render_page_view(pdf_path, page, span_ids, show)
+
+        return (
+            img,
+            highlight_map,
+            f"⚠️ **Risk Types:** {' | '.join(risks)}",
+            f"📌 **Clauses:** {', '.join(clauses)}",
+            summary,
+            audio,
+        )
+
+    analyze_btn.click(
+        **scheduling.LLM.bind(on_analyze),
+        inputs=[current_pdf_path, page_slider, highlights_by_page, show_highlights],
+        outputs=[
+            pdf_image,
+            highlights_by_page,
+            risk_md,
+            clause_md,
+            summary_md,
+            audio_player,
+        ],
+        api_name="analyze_page",
+    )
+
+    def update_pdf_state(path):
+        page_count = get_page_count(path)
+        img = render_page_view(path, 1)
+        return img, path, gr.Slider(1, page_count, value=1, step=1)
+
+    def open_pdf_at(path, page, span_ids):
+        """Opens `path` on `page` with `span_ids` highlighted (search hits)."""
+        page_count = get_page_count(path)
+        highlight_map = {page: span_ids}
+        img = render_page_view(path, page, span_ids)
+        return img, path, gr.Slider(1, page_count, value=page, step=1), highlight_map
+
+    return {
+        "pdf_viewer": pdf_image,
+        "current_pdf_path": current_pdf_path,
+        "page_slider": page_slider,
+        "highlights_by_page": highlights_by_page,
+        "update_fn": update_pdf_state,
+        "open_fn": open_pdf_at,
+    }
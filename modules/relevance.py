@@ -0,0 +1,220 @@
+import re
+import math
+from collections import Counter
+
+# -------------------------------------------------
+# Local page relevance for LLM extraction
+# -------------------------------------------------
+# Long filings (10-Ks with an agreement buried in an exhibit, 300-page
+# facility agreements) waste most of a blind prefix on pages that hold no
+# loan terms. Each page is scored per `core_loan_terms` field with
+#   - keyword / regex features (e.g. "Event of Default", "USD 50,000,000")
+#   - TF-IDF cosine between the page and the field's vocabulary
+# The opening pages (cover, parties, first definitions) are always sent:
+# that is where most core terms are stated. The rest of the budget goes
+# to the pages that hold the governing law and maturity, then greedily to
+# field coverage. Pages are sent in document order; contents pages, which
+# name every field in their headings but state no terms, never are.
+
+CHARS_PER_TOKEN = 4
+LEAD_PAGES = 4             # opening pages always sent (contents pages skipped)...
+LEAD_SHARE = 0.7           # ...within this share of the budget
+ANCHOR_FIELDS = ("governing_law", "maturity_or_termination_date")
+ANCHOR_PAGES = 2           # best pages per anchor field...
+ANCHOR_MIN_SCORE = 0.5     # ...that score at least this for it
+REGEX_CAP = 3              # regex hits per field beyond this add nothing
+MIN_PAGE_COST = 500        # chars: keeps near-empty pages from looking free
+MIN_GAIN = 0.05            # pages adding less field coverage than this are not worth sending
+CONTENTS_MIN_ENTRIES = 5   # page numbers at line ends before a page can be a table of contents
+CONTENTS_MIN_ASCENDING = 0.8
+PAGE_HEADER = "[Page {}]\n"
+
+_AMOUNT = r"(?:USD|EUR|GBP|US\$|\$|£|€)\s?\d{1,3}(?:[,.]\d{3})+"
+
+# field -> (regex features, TF-IDF vocabulary). Every regex alternative
+# contains a vocabulary token, so pages without one skip the regex scan.
+FIELD_FEATURES = {
+    "borrower": (r"\bborrowers?\b|\bobligors?\b", "borrower borrowers obligor obligors company"),
+    "administrative_agent": (r"\b(?:administrative|facility|security)\s+agent\b", "agent administrative facility"),
+    "lenders": (r"\b(?:original\s+)?lenders?\b|\barrangers?\b", "lender lenders arranger arrangers original bank"),
+    "facility_type": (r"\b(?:term|revolving)(?:\s+loan)?\s+facilit(?:y|ies)\b", "facility facilities term revolving tranche commitment"),
+    "loan_amount": (_AMOUNT + r"|\baggregate\s+(?:amount|commitments?)\b", "amount aggregate commitment commitments principal usd eur gbp us $ £ €"),
+    "currency": (_AMOUNT + r"|\b(?:dollars|euros?|sterling)\b|\bbase\s+currency\b", "currency dollars euro euros sterling usd eur gbp us $ £ €"),
+    "interest_type": (r"\b(?:floating|fixed)\s+rate\b|\binterest\s+periods?\b", "interest rate floating fixed period"),
+    "benchmark_rate": (r"\b(?:SOFR|LIBOR|EURIBOR|SONIA|ESTR)\b|\b(?:base|prime)\s+rate\b", "sofr libor euribor sonia estr base prime benchmark screen reference"),
+    "margin": (r"\bmargin\b|\d+(?:\.\d+)?\s*(?:per\s+cent|%|bps|basis\s+points)", "margin per cent bps basis points applicable %"),
+    "fees": (r"\b(?:commitment|arrangement|upfront|agency|ticking|utilisation)\s+fees?\b", "fee fees commitment arrangement agency upfront"),
+    "maturity_or_termination_date": (r"\b(?:termination|maturity|final\s+repayment)\s+date\b", "termination maturity date final"),
+    "repayment_and_prepayment": (r"\b(?:re|pre)pay(?:ment|s)?\b|\bcancellation\b", "repay repays repayment prepay prepays prepayment cancellation mandatory voluntary"),
+    "security_or_collateral": (r"\b(?:security|collateral|pledges?|mortgages?|charges?)\b", "security collateral pledge pledges charge charges mortgage mortgages"),
+    "guarantees": (r"\bguarant(?:ee|ees|or|ors|y)\b", "guarantee guarantees guarantor guarantors guaranty indemnity"),
+    "financial_covenants": (r"\b(?:leverage|interest\s+cover|gearing|net\s+worth|EBITDA|debt\s+service)\b", "financial covenants leverage ebitda ratio cover gearing worth service"),
+    "non_financial_covenants": (r"\b(?:negative\s+pledge|disposals?|mergers?|undertakings?)\b", "undertaking undertakings negative pledge disposal disposals merger mergers covenant"),
+    "events_of_default": (r"\bevents?\s+of\s+default\b|\bacceleration\b", "default event acceleration insolvency cross"),
+    "conditions_precedent": (r"\bconditions?\s+precedent\b", "conditions precedent utilisation documentary"),
+    "governing_law": (r"\bgoverned\s+by\b|\bgoverning\s+law\b", "governing law governed laws"),
+    "jurisdiction": (r"\bjurisdiction\b|\bcourts?\s+of\b", "jurisdiction court courts submit exclusive"),
+    "assignment_and_transferability": (r"\b(?:assignments?|transfers?)\s+by\b|\bchanges\s+to\s+the\s+lenders\b|\btransfer\s+certificate\b", "assignment assignments transfer transfers assign changes certificate"),
+}
+
+TOKEN_RE = re.compile(r"[a-z]+|[$£€%]")
+# A contents entry's page number: "Governing law ....... 97", or on its own line
+CONTENTS_NUMBER_RE = re.compile(r"(?:^|\.{3,}|…)\s*(\d{1,3})$")
+
+_FIELD_RES = {field: re.compile(pattern, re.IGNORECASE) for field, (pattern, _) in FIELD_FEATURES.items()}
+_FIELD_TERMS = {field: vocabulary.split() for field, (_, vocabulary) in FIELD_FEATURES.items()}
+
+# -------------------------------------------------
+# Scoring
+# -------------------------------------------------
+
+def score_pages(pages):
+    """
+    pages: [(page_number, text)]. Returns one {field: score in [0, 1]}
+    per page: half regex evidence, half TF-IDF cosine relative to the
+    best page for that field.
+    """
+    counts = [Counter(TOKEN_RE.findall(text.lower())) for _, text in pages]
+    n = len(pages)
+    df = Counter()
+    for c in counts:
+        df.update(c.keys())
+    idf = {term: math.log((n + 1) / (d + 1)) + 1 for term, d in df.items()}
+
+    # Page vector norms (sublinear tf * idf)
+    norms = []
+    for c in counts:
+        norms.append(math.sqrt(sum(((1 + math.log(tf)) * idf[t]) ** 2 for t, tf in c.items())) or 1.0)
+
+    cosine = {}
+    for field, terms in _FIELD_TERMS.items():
+        q_weights = {t: idf.get(t, math.log(n + 1) + 1) for t in terms}
+        q_norm = math.sqrt(sum(w * w for w in q_weights.values())) or 1.0
+        cosine[field] = [
+            sum((1 + math.log(c[t])) * idf[t] * w for t, w in q_weights.items() if t in c) / (norm * q_norm)
+            for c, norm in zip(counts, norms)
+        ]
+
+    scores = []
+    best = {field: max(values) or 1.0 for field, values in cosine.items()}
+    for i, (_, text) in enumerate(pages):
+        page_scores = {}
+        for field, pattern in _FIELD_RES.items():
+            hits = 0
+            if any(t in counts[i] for t in _FIELD_TERMS[field]):
+                for _ in pattern.finditer(text):
+                    hits += 1
+                    if hits >= REGEX_CAP:
+                        break
+            page_scores[field] = 0.5 * hits / REGEX_CAP + 0.5 * cosine[field][i] / best[field]
+        scores.append(page_scores)
+    return scores
+
+# -------------------------------------------------
+# Selection
+# -------------------------------------------------
+
+def _cost(page_num, text):
+    return len(PAGE_HEADER.format(page_num)) + len(text) + 1
+
+
+def _truncate(page_num, text, budget):
+    """The start of a page cut to fit `budget` (at a line or word break when there is one)."""
+    room = int(budget) - _cost(page_num, "")
+    if len(text) <= room:
+        return text
+    cut = text[:max(room, 0)]
+    brk = max(cut.rfind("\n"), cut.rfind(" "))
+    return cut[:brk] if brk > room // 2 else cut
+
+
+def is_contents_page(text):
+    """Table of contents: enough lines end in a page number, and the numbers mostly go up."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    numbers = [int(m.group(1)) for m in map(CONTENTS_NUMBER_RE.search, lines) if m]
+    if len(numbers) < max(CONTENTS_MIN_ENTRIES, 0.1 * len(lines)):
+        return False
+    ascending = sum(a <= b for a, b in zip(numbers, numbers[1:]))
+    return ascending >= CONTENTS_MIN_ASCENDING * (len(numbers) - 1)
+
+
+def select_pages(pages, char_budget):
+    """
+    Most informative pages that fit in `char_budget` characters, in
+    document order: the opening pages, the governing law and maturity
+    pages, then the best field coverage per character.
+    Documents that already fit are returned whole; a page too long for
+    what is left of its budget is cut short rather than dropped.
+    """
+    pages = [(num, text) for num, text in pages if text.strip()]
+    if sum(_cost(num, text) for num, text in pages) <= char_budget:
+        return pages
+
+    scores = score_pages(pages)
+    contents = {i for i, (_, text) in enumerate(pages) if is_contents_page(text)}
+    chosen = set()
+    cut_short = {}
+    covered = dict.fromkeys(FIELD_FEATURES, 0.0)
+    budget = char_budget
+
+    def take(i, within=None):
+        nonlocal budget
+        num, text = pages[i]
+        if within is not None and _cost(num, text) > within:
+            text = cut_short[i] = _truncate(num, text, within)
+        chosen.add(i)
+        budget -= _cost(num, text)
+        for field, value in scores[i].items():
+            covered[field] = max(covered[field], value)
+
+    lead_budget = char_budget * LEAD_SHARE
+    for i in [i for i in range(len(pages)) if i not in contents][:LEAD_PAGES]:
+        cost = _cost(*pages[i])
+        if cost > lead_budget:
+            # The opening matters most: send what fits of it, and nothing after
+            if not chosen or lead_budget >= MIN_PAGE_COST:
+                take(i, within=lead_budget)
+            break
+        lead_budget -= cost
+        take(i)
+
+    candidates = [i for i in range(len(pages)) if i not in contents]
+    for field in ANCHOR_FIELDS:
+        ranked = sorted((i for i in candidates if i not in chosen), key=lambda i: scores[i][field], reverse=True)
+        for i in ranked[:ANCHOR_PAGES]:
+            if scores[i][field] >= ANCHOR_MIN_SCORE and _cost(*pages[i]) <= budget:
+                take(i)
+
+    # Greedy: best marginal field coverage per character, among pages that add enough
+    while True:
+        best_i, best_key = None, None
+        for i in candidates:
+            cost = _cost(*pages[i])
+            if i in chosen or cost > budget:
+                continue
+            gain = sum(max(0.0, v - covered[f]) for f, v in scores[i].items())
+            if gain < MIN_GAIN:
+                continue
+            weight = max(cost, MIN_PAGE_COST)
+            key = (gain / weight, sum(scores[i].values()) / weight)
+            if best_key is None or key > best_key:
+                best_i, best_key = i, key
+        if best_i is None:
+            break
+        take(best_i)
+
+    if not chosen and pages:
+        # Nothing fits whole (e.g. a single huge page): the start of the best page
+        best_i = max(candidates or range(len(pages)), key=lambda i: sum(scores[i].values()))
+        take(best_i, within=char_budget)
+
+    return [(pages[i][0], cut_short.get(i, pages[i][1])) for i in sorted(chosen)]
+
+
+def format_excerpt(pages):
+    """Selected pages joined with page markers (gaps stay visible to the LLM)."""
+    return "\n".join(PAGE_HEADER.format(num) + text for num, text in pages)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
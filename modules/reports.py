@@ -0,0 +1,393 @@
+import os
+import io
+import json
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from pptx import Presentation
+from pptx.util import Inches, Pt
+
+# -------------------------------------------------
+# Configuration
+# -------------------------------------------------
+
+REPORTS_DIR = "reports"
+LOAN_DECKS_DIR = os.path.join(REPORTS_DIR, "loans")
+PORTFOLIO_DECK = os.path.join(REPORTS_DIR, "portfolio.pptx")
+MANIFEST_FILE = os.path.join(REPORTS_DIR, "manifest.json")
+
+# Optional corporate .pptx template (its layouts are reused for every slide)
+TEMPLATE_FILE = os.getenv("REPORT_TEMPLATE")
+
+# Bump when the slide layout or deck naming changes so every deck is
+# regenerated once
+REPORT_FORMAT_VERSION = 2
+
+ROWS_PER_SUMMARY_SLIDE = 12
+
+KEY_TERMS = [
+    ("Lender", "lender"),
+    ("Amount", "amount"),
+    ("Interest", "interest"),
+    ("Maturity", "maturity"),
+]
+
+CORE_TERMS = [
+    ("Facility Type", "facility_type"),
+    ("Governing Law", "governing_law"),
+    ("Security", "security_or_collateral"),
+    ("Financial Covenants", "financial_covenants"),
+]
+
+# Layout indices of the default python-pptx template
+TITLE_LAYOUT = 0
+TITLE_ONLY_LAYOUT = 5
+BULLETS_LAYOUT = 1
+
+# -------------------------------------------------
+# Helpers
+# -------------------------------------------------
+
+def _load_template_bytes():
+    if TEMPLATE_FILE and os.path.exists(TEMPLATE_FILE):
+        with open(TEMPLATE_FILE, "rb") as f:
+            return f.read()
+    return None
+
+
+def _new_presentation(template_bytes):
+    """
+    New deck from the in-memory template (no disk read per deck).
+    """
+    if template_bytes:
+        return Presentation(io.BytesIO(template_bytes))
+    return Presentation()
+
+
+def _as_text(value, limit=300):
+    if value is None:
+        return "N/A"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    s = str(value)
+    return s[:limit] + "..." if len(s) > limit else s
+
+
+def _deck_name(filename):
+    """
+    Filesystem-safe deck name. The hash suffix keeps filenames that
+    sanitize to the same stem ("a b.pdf" / "a_b.pdf") apart.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in stem)
+    suffix = hashlib.sha256(filename.encode("utf-8")).hexdigest()[:8]
+    return f"{safe}-{suffix}.pptx"
+
+
+def template_digest(template_bytes):
+    """Content hash of the template, so editing it in place regenerates decks."""
+    return hashlib.sha256(template_bytes).hexdigest() if template_bytes else None
+
+
+def loan_fingerprint(entry, template=None):
+    """
+    Hash of everything that ends up on a loan's slides.
+    `template` is the template's `template_digest`.
+    """
+    # Stored entries keep full_json packed, and the packed bytes change whenever
+    # the store is repacked with a new dictionary: hash the decoded loan instead
+    fields = entry.unpacked() if hasattr(entry, "unpacked") else entry
+    payload = {
+        "version": REPORT_FORMAT_VERSION,
+        "template": template,
+        "entry": {k: v for k, v in fields.items() if k != "filepath"},
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def load_manifest():
+    if os.path.exists(MANIFEST_FILE):
+        try:
+            with open(MANIFEST_FILE, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {"loans": {}, "portfolio": None}
+
+
+def save_manifest(manifest):
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    tmp_path = f"{MANIFEST_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+
+def _save_atomic(prs, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    prs.save(tmp_path)
+    os.replace(tmp_path, path)
+
+# -------------------------------------------------
+# Slide Builders
+# -------------------------------------------------
+
+def _add_table(slide, rows, left, top, width, col_widths=None, font_size=12):
+    table = slide.shapes.add_table(
+        len(rows), len(rows[0]), left, top, width, Inches(0.4) * len(rows)
+    ).table
+
+    if col_widths:
+        for i, w in enumerate(col_widths):
+            table.columns[i].width = w
+
+    for r, row in enumerate(rows):
+        for c, value in enumerate(row):
+            cell = table.cell(r, c)
+            cell.text = _as_text(value, limit=120)
+            for paragraph in cell.text_frame.paragraphs:
+                paragraph.font.size = Pt(font_size)
+    return table
+
+
+def add_loan_slides(prs, entry):
+    """
+    Appends the deal summary slides for one loan:
+    1. Key terms table  2. Executive highlights.
+    """
+    full_json = entry.get("full_json") or {}
+    core = full_json.get("core_loan_terms", full_json) if isinstance(full_json, dict) else {}
+    highlights = full_json.get("human_readable_highlights", {}) if isinstance(full_json, dict) else {}
+
+    # --- Key terms ---
+    slide = prs.slides.add_slide(prs.slide_layouts[TITLE_ONLY_LAYOUT])
+    slide.shapes.title.text = f"{entry.get('borrower', 'Unknown')}"
+
+    rows = [["Term", "Value"], ["Document", entry.get("filename", "")]]
+    rows += [[label, entry.get(key, "N/A")] for label, key in KEY_TERMS]
+    rows += [[label, core.get(key)] for label, key in CORE_TERMS]
+    _add_table(
+        slide, rows, Inches(0.5), Inches(1.5), Inches(9),
+        col_widths=[Inches(2.5), Inches(6.5)],
+    )
+
+    # --- Highlights ---
+    slide = prs.slides.add_slide(prs.slide_layouts[BULLETS_LAYOUT])
+    slide.shapes.title.text = "Deal Highlights"
+    body = slide.placeholders[1].text_frame
+    body.clear()
+
+    items = highlights.items() if isinstance(highlights, dict) else enumerate(highlights or [])
+    first = True
+    for key, value in items:
+        paragraph = body.paragraphs[0] if first else body.add_paragraph()
+        first = False
+        label = str(key).replace("_", " ").title() if isinstance(key, str) else ""
+        paragraph.text = f"{label}: {_as_text(value)}" if label else _as_text(value)
+        paragraph.font.size = Pt(14)
+
+    if first:
+        body.paragraphs[0].text = "No highlights extracted."
+
+
+def add_portfolio_summary(prs, entries):
+    """
+    Title slide plus a paginated roll-up table of every loan.
+    """
+    slide = prs.slides.add_slide(prs.slide_layouts[TITLE_LAYOUT])
+    slide.shapes.title.text = "Loan Portfolio Summary"
+    slide.placeholders[1].text = f"{len(entries)} loan agreements"
+
+    header = ["Borrower"] + [label for label, _ in KEY_TERMS]
+    for start in range(0, len(entries), ROWS_PER_SUMMARY_SLIDE):
+        chunk = entries[start:start + ROWS_PER_SUMMARY_SLIDE]
+        slide = prs.slides.add_slide(prs.slide_layouts[TITLE_ONLY_LAYOUT])
+        slide.shapes.title.text = (
+            f"Portfolio Overview ({start + 1}–{start + len(chunk)} of {len(entries)})"
+        )
+        rows = [header] + [
+            [e.get("borrower", "Unknown")] + [e.get(key, "N/A") for _, key in KEY_TERMS]
+            for e in chunk
+        ]
+        _add_table(slide, rows, Inches(0.3), Inches(1.3), Inches(9.4), font_size=10)
+
+# -------------------------------------------------
+# Worker Processes
+# -------------------------------------------------
+
+# Per-worker template, loaded once by the pool initializer
+_WORKER_TEMPLATE = None
+
+# Deck workers come from a forkserver, not a fork of the (threaded) server,
+# which could copy locks held mid-operation by its other threads. They do
+# not follow later chdirs, so they are always handed absolute paths.
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def _init_worker(template_bytes):
+    global _WORKER_TEMPLATE
+    _WORKER_TEMPLATE = template_bytes
+
+
+def _render_loan_deck(entry, out_path):
+    prs = _new_presentation(_WORKER_TEMPLATE)
+    add_loan_slides(prs, entry)
+    _save_atomic(prs, out_path)
+    return out_path
+
+
+def _render_portfolio_deck(entries, out_path):
+    prs = _new_presentation(_WORKER_TEMPLATE)
+    add_portfolio_summary(prs, entries)
+    for entry in entries:
+        add_loan_slides(prs, entry)
+    _save_atomic(prs, out_path)
+    return out_path
+
+# -------------------------------------------------
+# Public API
+# -------------------------------------------------
+
+def _plan_loan_decks(entries, manifest, template, force):
+    """(todo, skipped): decks to (re)write as (entry, out_path, fingerprint)."""
+    previous = manifest.get("loans", {})
+    todo = []
+    skipped = []
+    for entry in entries:
+        fingerprint = loan_fingerprint(entry, template)
+        out_path = os.path.join(LOAN_DECKS_DIR, _deck_name(entry["filename"]))
+        known = previous.get(entry["filename"])
+        if (
+            not force and known and known["fingerprint"] == fingerprint
+            and known["path"] == out_path and os.path.exists(out_path)
+        ):
+            skipped.append(entry["filename"])
+            continue
+        todo.append((entry, out_path, fingerprint))
+    return todo, skipped
+
+
+def _portfolio_digest(entries, template):
+    return hashlib.sha256(
+        "".join(loan_fingerprint(e, template) for e in entries).encode("utf-8")
+    ).hexdigest()
+
+
+def _generate(entries, force=False, max_workers=None, loans=True, portfolio=True):
+    """
+    Writes the per-loan decks and / or the portfolio roll-up in one pool of
+    worker processes. The roll-up is submitted first (it is the longest
+    task) and renders alongside the loan decks instead of after them.
+    Returns ({"generated": [...], "skipped": [...]}, portfolio path or None).
+    """
+    manifest = load_manifest()
+    previous = manifest.setdefault("loans", {})
+    template_bytes = _load_template_bytes()
+    template = template_digest(template_bytes)
+
+    todo, skipped = _plan_loan_decks(entries, manifest, template, force) if loans else ([], [])
+
+    digest = _portfolio_digest(entries, template) if portfolio else None
+    portfolio_todo = portfolio and (
+        force or manifest.get("portfolio") != digest or not os.path.exists(PORTFOLIO_DECK)
+    )
+    if portfolio and not portfolio_todo:
+        logging.info("Portfolio deck unchanged, reusing previous file")
+
+    generated = []
+    portfolio_path = PORTFOLIO_DECK if portfolio and not portfolio_todo else None
+    tasks = len(todo) + bool(portfolio_todo)
+    if tasks:
+        workers = max_workers or min(tasks, os.cpu_count() or 1)
+        logging.info(
+            f"Generating {len(todo)} loan decks{' + portfolio' if portfolio_todo else ''} "
+            f"with {workers} workers ({len(skipped)} unchanged)"
+        )
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=_MP_CONTEXT,
+            initializer=_init_worker,
+            initargs=(template_bytes,),
+        ) as pool:
+            portfolio_future = (
+                pool.submit(_render_portfolio_deck, list(entries), os.path.abspath(PORTFOLIO_DECK)) if portfolio_todo else None
+            )
+            futures = {
+                pool.submit(_render_loan_deck, entry, os.path.abspath(out_path)): (entry, out_path, fingerprint)
+                for entry, out_path, fingerprint in todo
+            }
+            for future, (entry, out_path, fingerprint) in futures.items():
+                try:
+                    future.result()
+                except Exception:
+                    logging.exception(f"Deck generation failed for {entry['filename']}")
+                    continue
+                known = previous.get(entry["filename"])
+                if known and known["path"] != out_path and os.path.exists(known["path"]):
+                    os.remove(known["path"])  # deck written under an older naming scheme
+                previous[entry["filename"]] = {"fingerprint": fingerprint, "path": out_path}
+                generated.append(entry["filename"])
+
+            if portfolio_future:
+                try:
+                    portfolio_future.result()
+                    portfolio_path = PORTFOLIO_DECK
+                    manifest["portfolio"] = digest
+                except Exception:
+                    logging.exception("Portfolio deck generation failed")
+
+    if loans:
+        # Forget loans that are no longer in the store
+        current = {e["filename"] for e in entries}
+        manifest["loans"] = {k: v for k, v in previous.items() if k in current}
+    save_manifest(manifest)
+
+    return {"generated": generated, "skipped": skipped}, portfolio_path
+
+
+def generate_loan_decks(entries, force=False, max_workers=None):
+    """
+    Writes one deck per loan into reports/loans/, in parallel worker
+    processes. Loans whose fingerprint matches the last run are skipped
+    unless `force` is set.
+    Returns {"generated": [...], "skipped": [...]} (filenames).
+    """
+    result, _ = _generate(entries, force=force, max_workers=max_workers, portfolio=False)
+    return result
+
+
+def generate_portfolio_deck(entries, force=False):
+    """
+    Writes the roll-up deck (summary tables + slides for every loan) in a
+    worker process. Skipped when no loan changed since the previous
+    roll-up. Returns the deck path, or None if rendering failed.
+    """
+    _, portfolio = _generate(entries, force=force, max_workers=1, loans=False)
+    return portfolio
+
+
+def generate_reports(entries, force=False, max_workers=None):
+    """
+    Per-loan decks + portfolio roll-up. Returns (status, deck_paths).
+    """
+    if not entries:
+        return "No loans registered yet.", []
+
+    result, portfolio = _generate(entries, force=force, max_workers=max_workers)
+
+    loan_paths = [
+        os.path.join(LOAN_DECKS_DIR, _deck_name(e["filename"])) for e in entries
+    ]
+    status = (
+        f"✅ {len(result['generated'])} loan decks generated, "
+        f"{len(result['skipped'])} unchanged. Portfolio deck: {portfolio or 'failed'}"
+    )
+    decks = [portfolio] if portfolio else []
+    return status, decks + [p for p in loan_paths if os.path.exists(p)]
@@ -0,0 +1,160 @@
+import os
+import time
+import inspect
+import threading
+import functools
+from collections import deque
+
+# -------------------------------------------------
+# Priority lanes for Gradio events
+# -------------------------------------------------
+# Every event is assigned to a lane. Gradio gives each lane its own
+# concurrency group (concurrency_id), so a handful of minute-long LLM jobs
+# can only ever hold their own lane's slots and threads, never the ones
+# used by table searches or page turns.
+#
+# Heavy lanes admit `limit + queue_slots` requests from Gradio and run at
+# most `limit` of them; the rest wait on the lane's semaphore where their
+# wait time can be measured. Anything beyond that stays in Gradio's own
+# queue (with the usual queue position shown in the UI).
+
+SAMPLE_WINDOW = 500  # latency samples kept per lane for percentiles
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[k], 4)
+
+
+class Lane:
+    def __init__(self, name, limit=None, queue_slots=0):
+        self.name = name
+        self.limit = limit
+        self.queue_slots = queue_slots
+        self._sem = threading.BoundedSemaphore(limit) if limit else None
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.errors = 0
+        self.wait_times = deque(maxlen=SAMPLE_WINDOW)
+        self.run_times = deque(maxlen=SAMPLE_WINDOW)
+
+    # --- slot accounting ---
+
+    def _acquire(self):
+        queued_at = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+        if self._sem:
+            self._sem.acquire()
+        started_at = time.perf_counter()
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+            self.wait_times.append(started_at - queued_at)
+        return started_at
+
+    def _release(self, started_at, failed):
+        with self._lock:
+            self.running -= 1
+            self.completed += 1
+            if failed:
+                self.errors += 1
+            self.run_times.append(time.perf_counter() - started_at)
+        if self._sem:
+            self._sem.release()
+
+    # --- wrapping ---
+
+    def wrap(self, fn):
+        """
+        Runs `fn` inside a lane slot. Generator handlers (streaming) keep
+        their slot until they are exhausted.
+        """
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                started_at = self._acquire()
+                failed = False
+                try:
+                    yield from fn(*args, **kwargs)
+                except BaseException:
+                    failed = True
+                    raise
+                finally:
+                    self._release(started_at, failed)
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started_at = self._acquire()
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                self._release(started_at, failed)
+        return wrapper
+
+    def bind(self, fn):
+        """
+        Keyword arguments for a Gradio event listener:
+            btn.click(**scheduling.LLM.bind(handler), inputs=..., outputs=...)
+        """
+        return {
+            "fn": self.wrap(fn),
+            "concurrency_id": self.name,
+            "concurrency_limit": self.limit + self.queue_slots if self.limit else None,
+        }
+
+    def snapshot(self):
+        with self._lock:
+            wait_times = list(self.wait_times)
+            run_times = list(self.run_times)
+            return {
+                "limit": self.limit,
+                "queue_slots": self.queue_slots,
+                "running": self.running,
+                "queue_depth": self.waiting,
+                "completed": self.completed,
+                "errors": self.errors,
+                "wait_p50_s": _percentile(wait_times, 50),
+                "wait_p95_s": _percentile(wait_times, 95),
+                "run_p50_s": _percentile(run_times, 50),
+                "run_p95_s": _percentile(run_times, 95),
+            }
+
+
+# Fast lane: searches, table clicks, overlay toggles, timers (unbounded)
+INTERACTIVE = Lane("interactive")
+# Page views: slider turns and opening a document at a page. Bounded (it
+# renders), but apart from the heavy CPU jobs so those never stall a page turn
+RENDER = Lane("render", limit=int(os.getenv("RENDER_CONCURRENCY", 4)), queue_slots=4)
+# Heavy CPU-bound work: registration, comparisons, clause search
+CPU = Lane("cpu", limit=int(os.getenv("CPU_CONCURRENCY", 4)), queue_slots=4)
+# OpenAI chat / TTS: extraction, page analysis
+LLM = Lane("llm", limit=int(os.getenv("LLM_CONCURRENCY", 2)), queue_slots=6)
+# Whole-portfolio jobs: PowerPoint generation
+BATCH = Lane("batch", limit=1, queue_slots=1)
+
+LANES = [INTERACTIVE, RENDER, CPU, LLM, BATCH]
+
+
+def get_metrics():
+    """Queue depth, running jobs and wait / run time percentiles per lane."""
+    return {lane.name: lane.snapshot() for lane in LANES}
+
+
+def max_threads():
+    """
+    Thread pool size for app.launch(): enough for every bounded lane to be
+    full while the interactive lane still has threads of its own.
+    """
+    bounded = sum(l.limit + l.queue_slots for l in LANES if l.limit)
+    return bounded + 32
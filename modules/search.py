@@ -0,0 +1,254 @@
+import os
+import re
+import math
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+
+from modules import data, pdf_viewer, pagestore
+
+# -------------------------------------------------
+# BM25 clause search over every page of every stored agreement
+# -------------------------------------------------
+# Page text comes from each document's memory-mapped page store (the same
+# PyMuPDF span extraction the viewer uses), so a hit's span IDs can be
+# highlighted as-is. Only the inverted index lives in memory:
+# term -> {(filename, page): tf}, plus each page's length and term list.
+# Page text (spans for the returned hits, phrase checks) is sliced from
+# the page store at query time.
+
+INDEX_FORMAT_VERSION = 1
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+PHRASE_BOOST = 2.0        # multiplier when the exact phrase is on the page
+PHRASE_CANDIDATES = 5     # top BM25 pages per requested hit checked for the phrase
+MAX_HIGHLIGHT_SPANS = 6
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "with", "any", "all",
+}
+
+# In-memory index
+_POSTINGS = {}          # term -> {(filename, page): tf}
+_PAGES = {}             # (filename, page) -> (length in tokens, distinct terms)
+_DOCS = {}              # filename -> {"pdf_path", "fingerprint", "pages": [page numbers]}
+_TOTAL_LENGTH = 0
+_LOCK = threading.RLock()
+_LOADED = False
+
+# Registrations are indexed off the request thread
+_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def _fingerprint(pdf_path):
+    stat = os.stat(pdf_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}-{INDEX_FORMAT_VERSION}"
+
+# -------------------------------------------------
+# Building
+# -------------------------------------------------
+
+def iter_document_pages(pdf_path):
+    """
+    Yields (page_number, text) from the document's page store (written
+    here if missing), falling back to parsing the PDF.
+    """
+    pdf_viewer.preprocess_document(pdf_path)
+    store = pagestore.open_page_store(pdf_path)
+    if store:
+        yield from store.iter_page_texts()
+        return
+
+    doc = fitz.open(pdf_path)
+    try:
+        for page in doc:
+            _, lines = pdf_viewer.extract_text_structure(page)
+            yield page.number + 1, "\n".join(line["text"] for line in lines)
+    finally:
+        doc.close()
+
+
+def _remove_document(filename):
+    global _TOTAL_LENGTH
+    doc = _DOCS.pop(filename, None)
+    if not doc:
+        return
+    for page in doc["pages"]:
+        key = (filename, page)
+        length, terms = _PAGES.pop(key)
+        _TOTAL_LENGTH -= length
+        for term in terms:
+            postings = _POSTINGS.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del _POSTINGS[term]
+
+
+def _add_document(filename, pdf_path, fingerprint, pages):
+    global _TOTAL_LENGTH
+    _remove_document(filename)
+
+    page_numbers = []
+    for page_num, text in pages:
+        key = (filename, page_num)
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+
+        for term, tf in counts.items():
+            _POSTINGS.setdefault(term, {})[key] = tf
+        _PAGES[key] = (len(tokens), tuple(counts))
+        _TOTAL_LENGTH += len(tokens)
+        page_numbers.append(page_num)
+
+    _DOCS[filename] = {
+        "pdf_path": pdf_path,
+        "fingerprint": fingerprint,
+        "pages": page_numbers,
+    }
+
+
+def index_document(filename, pdf_path):
+    """
+    Adds (or refreshes) one document. Cheap when the document is already
+    indexed for the current file.
+    """
+    if not pdf_path or not os.path.exists(pdf_path):
+        logging.warning(f"Search index: PDF not found for {filename}: {pdf_path}")
+        return
+    fingerprint = _fingerprint(pdf_path)
+    with _LOCK:
+        known = _DOCS.get(filename)
+        if known and known["pdf_path"] == pdf_path and known["fingerprint"] == fingerprint:
+            return
+    pages = list(iter_document_pages(pdf_path))
+    with _LOCK:
+        _add_document(filename, pdf_path, fingerprint, pages)
+
+
+def ensure_index():
+    """
+    Indexes every stored loan not indexed yet (first query after startup).
+    """
+    global _LOADED
+    with _LOCK:
+        if _LOADED:
+            return
+        for entry in list(data.LOAN_DATABASE):
+            try:
+                index_document(entry["filename"], entry["filepath"])
+            except Exception:
+                logging.exception(f"Search index failed for {entry['filename']}")
+        _LOADED = True
+
+
+def _on_loan_changed(entry):
+    """Store listener: index new / updated loans in the background."""
+    global _LOADED
+    if entry is None:
+        with _LOCK:
+            _LOADED = False
+        return
+    _EXECUTOR.submit(index_document, entry["filename"], entry["filepath"])
+
+data.subscribe(_on_loan_changed)
+
+# -------------------------------------------------
+# Querying
+# -------------------------------------------------
+
+def _matching_span_ids(spans, terms):
+    """Spans containing the most query terms, in page order."""
+    scored = []
+    for i, span in enumerate(spans):
+        span_terms = set(tokenize(span["text"]))
+        hits = sum(1 for t in terms if t in span_terms)
+        if hits:
+            scored.append((hits, i))
+    scored.sort(key=lambda x: (-x[0], x[1]))
+    return sorted(i for _, i in scored[:MAX_HIGHLIGHT_SPANS])
+
+
+def _phrase_text(spans):
+    """Page text as space-separated tokens, for exact phrase matching."""
+    return " ".join(TOKEN_RE.findall(" ".join(s["text"] for s in spans).lower()))
+
+
+def _snippet(spans, span_ids, limit=180):
+    if not span_ids:
+        return ""
+    first = span_ids[0]
+    text = " ".join(s["text"] for s in spans[max(0, first - 1): first + 3])
+    return text[:limit] + "..." if len(text) > limit else text
+
+
+def search(query, limit=20):
+    """
+    BM25-ranked pages for `query`. Returns hits:
+    {"filename", "pdf_path", "page", "score", "snippet", "span_ids", "bboxes"}
+    """
+    terms = list(dict.fromkeys(tokenize(query or "")))
+    if not terms:
+        return []
+
+    data.refresh()
+    ensure_index()
+
+    with _LOCK:
+        n_pages = len(_PAGES)
+        if not n_pages:
+            return []
+        avg_len = _TOTAL_LENGTH / n_pages
+
+        scores = Counter()
+        for term in terms:
+            postings = _POSTINGS.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_pages - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, tf in postings.items():
+                length = _PAGES[key][0]
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len)
+                scores[key] += idf * tf * (BM25_K1 + 1) / norm
+
+        # Multi-word queries re-rank a wider BM25 shortlist by exact phrase
+        phrase = " ".join(TOKEN_RE.findall(query.lower())) if len(terms) > 1 else ""
+        ranked = [
+            (filename, _DOCS[filename]["pdf_path"], page, score)
+            for (filename, page), score in scores.most_common(limit * PHRASE_CANDIDATES if phrase else limit)
+        ]
+
+    structures = {}
+    if phrase:
+        boosted = []
+        for filename, pdf_path, page, score in ranked:
+            spans, _ = structures[(pdf_path, page)] = pdf_viewer.get_page_structure(pdf_path, page)
+            if phrase in _phrase_text(spans):
+                score *= PHRASE_BOOST
+            boosted.append((filename, pdf_path, page, score))
+        ranked = sorted(boosted, key=lambda hit: -hit[3])[:limit]
+
+    hits = []
+    for filename, pdf_path, page, score in ranked:
+        spans, _ = structures.get((pdf_path, page)) or pdf_viewer.get_page_structure(pdf_path, page)
+        span_ids = _matching_span_ids(spans, terms)
+        hits.append({
+            "filename": filename,
+            "pdf_path": pdf_path,
+            "page": page,
+            "score": round(score, 3),
+            "snippet": _snippet(spans, span_ids),
+            "span_ids": span_ids,
+            "bboxes": [list(spans[i]["bbox"]) for i in span_ids],
+        })
+    return hits
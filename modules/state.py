@@ -0,0 +1,144 @@
+import os
+import json
+
+# Cross-process file locking (POSIX flock, Windows msvcrt fallback)
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+# -------------------------------------------------
+# Shared state primitives for the loan store
+# -------------------------------------------------
+# Every process (Gradio worker, Cloud Run replica on a shared volume) keeps
+# its own in-memory copy of the database. Writers serialize through an
+# exclusive file lock and append each change to an append-only feed; other
+# processes tail the feed and apply only the new records. The snapshot is
+# only rewritten when the feed is compacted, so state = snapshot + feed.
+
+class FileLock:
+    """
+    Exclusive inter-process lock held on `path` for the duration of a
+    `with` block. Not re-entrant: do not nest on the same path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class ChangeFeed:
+    """
+    Append-only JSON-lines log of store changes with a monotonically
+    increasing version counter.
+
+    Record format: {"version": int, "op": "upsert" | "compact", "entry": {...}}
+    Compaction atomically replaces the file with a single "compact" marker;
+    readers notice the new inode and reload the snapshot once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.inode = None
+        self.version = 0
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_ino, st.st_size
+        except FileNotFoundError:
+            return None, 0
+
+    @property
+    def size(self):
+        return self._stat()[1]
+
+    def rewind(self):
+        """
+        Makes the next `poll` return every record still in the feed (the
+        caller just loaded the snapshot, which predates them).
+        """
+        self.inode = None
+        self.offset = 0
+        self.version = 0
+
+    def poll(self):
+        """
+        Returns (reset, records). `reset` means the feed was compacted or
+        replaced and the caller must reload its snapshot.
+        Only complete lines are consumed, so a concurrent append is safe.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return False, []
+
+        # fstat the open file: a compaction between stat() and open() must
+        # not make us read the new file at the old offset
+        with f:
+            st = os.fstat(f.fileno())
+            inode, size = st.st_ino, st.st_size
+            if (self.inode is not None and inode != self.inode) or size < self.offset:
+                return True, []
+            if size == self.offset:
+                return False, []
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+
+        complete = chunk[: chunk.rfind(b"\n") + 1]
+        self.inode = inode
+        self.offset += len(complete)
+
+        records = []
+        for line in complete.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            self.version = record["version"]
+            if record.get("op") == "upsert":
+                records.append(record)
+        return False, records
+
+    def append(self, entry):
+        """
+        Appends an upsert. The caller must hold the store's FileLock and
+        have polled first, so `self.version` is the latest version.
+        """
+        self.version += 1
+        line = json.dumps({"version": self.version, "op": "upsert", "entry": entry}) + "\n"
+        with open(self.path, "ab") as f:
+            f.write(line.encode("utf-8"))
+        self.inode, self.offset = self._stat()
+        return self.version
+
+    def compact(self):
+        """
+        Drops all records (the snapshot now holds them), keeping the version.
+        The caller must hold the store's FileLock.
+        """
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write((json.dumps({"version": self.version, "op": "compact"}) + "\n").encode("utf-8"))
+        os.replace(tmp_path, self.path)
+        self.inode, self.offset = self._stat()
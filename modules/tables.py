@@ -1,23 +1,40 @@
 import gradio as gr
-from modules import data
+from modules import data, reports, scheduling, search
 
 # Helper to truncate text
 def truncate_text(text, limit=30):
     s = str(text)
     return s[:limit] + "..." if len(s) > limit else s
 
+# Truncated rows by filename, with the row they were built from: reused only
+# while that row is unchanged, so a rebuild racing an update cannot leave a
+# stale row behind. Change notifications drop rows that are gone.
+_TRUNCATED_ROWS = {}
+
+def _invalidate_row(entry):
+    if entry is None:
+        _TRUNCATED_ROWS.clear()
+    else:
+        _TRUNCATED_ROWS.pop(entry["filename"], None)
+
+data.subscribe(_invalidate_row)
+
 def get_truncated_data(query=None):
     raw_data = data.get_dataframe_data(query)
     processed_rows = []
     for row in raw_data:
-        # row structure: [Filename, Borrower, Lender, Amount, Interest, Maturity, Action1, Action2]
-        # Preserve Filename (index 0) for lookup, truncate others
-        new_row = []
-        for i, item in enumerate(row):
-            if i == 0:
-                new_row.append(item)
-            else:
-                new_row.append(truncate_text(item))
+        source = tuple(row)
+        source_row, new_row = _TRUNCATED_ROWS.get(row[0], (None, None))
+        if source_row != source:
+            # row structure: [Filename, Borrower, Lender, Amount, Interest, Maturity, Action1, Action2]
+            # Preserve Filename (index 0) for lookup, truncate others
+            new_row = []
+            for i, item in enumerate(row):
+                if i == 0:
+                    new_row.append(item)
+                else:
+                    new_row.append(truncate_text(item))
+            _TRUNCATED_ROWS[row[0]] = (source, new_row)
         processed_rows.append(new_row)
     return processed_rows
 
@@ -44,22 +61,81 @@ def create_tab():
             row_count=10
         )
         
+        # Full-text clause search (BM25 over every page of every agreement)
+        gr.Markdown("### 🔎 Clause Search")
+        with gr.Row():
+            clause_query = gr.Textbox(
+                label="Search agreement text",
+                placeholder='e.g. "Material Adverse Effect", cross default threshold...',
+            )
+            clause_btn = gr.Button("Search Clauses")
+        clause_results = gr.Dataframe(
+            headers=["Document", "Page", "Score", "Match"],
+            datatype=["str", "number", "number", "str"],
+            interactive=False,
+        )
+        clause_hits = gr.State([])
+
         # Area to show JSON insights if selected
         gr.Markdown("### 🔍 Selected Loan Insights")
         json_view = gr.JSON(label="Loan Data")
 
+        # Executive decks (only loans changed since the last run are rebuilt)
+        gr.Markdown("### 📑 Executive Reports")
+        with gr.Row():
+            report_btn = gr.Button("📊 Generate PowerPoint Reports", variant="primary")
+            force_report = gr.Checkbox(label="Regenerate all", value=False)
+        report_status = gr.Markdown("")
+        report_files = gr.File(label="Decks", file_count="multiple", interactive=False)
+
+        # Picks up loans registered by other workers / replicas
+        seen_version = gr.State(data.DB_VERSION)
+        sync_timer = gr.Timer(data.SYNC_INTERVAL)
+
         # --- Logic ---
         
         def refresh_data(query):
             return get_truncated_data(query)
         
         # Refresh on button click or search change
-        refresh_btn.click(fn=refresh_data, inputs=[search_box], outputs=[loan_table])
-        search_box.change(fn=refresh_data, inputs=[search_box], outputs=[loan_table])
+        refresh_btn.click(**scheduling.INTERACTIVE.bind(refresh_data), inputs=[search_box], outputs=[loan_table])
+        search_box.change(**scheduling.INTERACTIVE.bind(refresh_data), inputs=[search_box], outputs=[loan_table], api_name="table_search")
+
+        def sync_table(version, query):
+            data.refresh()
+            if data.DB_VERSION == version:
+                return gr.skip(), version
+            return get_truncated_data(query), data.DB_VERSION
+
+        sync_timer.tick(**scheduling.INTERACTIVE.bind(sync_table), inputs=[seen_version, search_box], outputs=[loan_table, seen_version])
+
+        def run_clause_search(query):
+            hits = search.search(query)
+            rows = [[h["filename"], h["page"], h["score"], h["snippet"]] for h in hits]
+            return rows, hits
+
+        clause_btn.click(
+            **scheduling.CPU.bind(run_clause_search),
+            inputs=[clause_query],
+            outputs=[clause_results, clause_hits],
+            api_name="clause_search",
+        )
+        clause_query.submit(
+            **scheduling.CPU.bind(run_clause_search),
+            inputs=[clause_query],
+            outputs=[clause_results, clause_hits],
+        )
+
+        def build_reports(force):
+            return reports.generate_reports(list(data.iter_loans()), force=force)
+
+        report_btn.click(**scheduling.BATCH.bind(build_reports), inputs=[force_report], outputs=[report_status, report_files])
         
         return {
             "loan_table": loan_table,
             "json_view": json_view,
             "refresh_btn": refresh_btn,
-            "search_box": search_box
+            "search_box": search_box,
+            "clause_results": clause_results,
+            "clause_hits": clause_hits,
         }
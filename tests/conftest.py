@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# Run from anywhere: `modules` / `benchmarks` are imported from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# modules.pdf_viewer builds its OpenAI client at import time; no request is
+# ever made with this key
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# modules.data opens ./loan_database.json at import time (and its first
+# write migrates it into ./saved_pdfs/blobs/): keep test runs out of the
+# repository's store
+os.chdir(tempfile.mkdtemp(prefix="loaniq-tests-"))
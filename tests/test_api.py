@@ -0,0 +1,53 @@
+import io
+import json
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from modules import api, data
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    previous = os.path.abspath(data.DB_FILE)
+    monkeypatch.chdir(tmp_path)
+    data.open_database(str(tmp_path / "loan_database.json"))
+    app = FastAPI()
+    app.include_router(api.router)
+    yield TestClient(app)
+    data.open_database(previous)
+
+
+def _add(filename, lenders, borrower="Acme plc"):
+    data.add_loan(filename, filename, {"core_loan_terms": {"borrower": borrower, "lenders": lenders}})
+
+
+def test_parquet_matches_ndjson(client):
+    pq = pytest.importorskip("pyarrow.parquet")
+    _add("a.pdf", ["Bank A", "Bank B"])
+    _add("b.pdf", "Bank C")
+
+    ndjson = [json.loads(line) for line in client.get("/api/export.ndjson").text.splitlines()]
+    table = pq.read_table(io.BytesIO(client.get("/api/export.parquet").content)).to_pylist()
+
+    assert [r["filename"] for r in table] == ["a.pdf", "b.pdf"]
+    assert json.loads(table[0]["lender"]) == ndjson[0]["lender"] == ["Bank A", "Bank B"]
+    assert table[1]["lender"] == ndjson[1]["lender"] == "Bank C"
+    assert json.loads(table[0]["full_json"]) == ndjson[0]["full_json"]
+
+
+def test_etag_revalidation(client):
+    _add("a.pdf", "Bank A")
+    first = client.get("/api/loans/a.pdf")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    assert client.get("/api/loans/a.pdf", headers={"If-None-Match": etag}).status_code == 304
+
+    _add("a.pdf", "Bank Z")
+    second = client.get("/api/loans/a.pdf", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.json()["lender"] == "Bank Z"
+    assert second.headers["etag"] != etag
@@ -0,0 +1,54 @@
+import os
+import threading
+
+from modules import blobs
+
+
+def test_concurrent_copies_of_the_same_upload_all_succeed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("upload.pdf", "wb") as f:
+        f.write(b"%PDF-1.4 " + os.urandom(1 << 20))
+
+    # Copy fallback, as when saved_pdfs/ is on another device than the upload
+    def no_link(src, dst):
+        raise OSError("cross-device link")
+    monkeypatch.setattr(blobs.os, "link", no_link)
+
+    monkeypatch.setattr(blobs, "_reflink", lambda src, dest: False)
+
+    # Line the uploads up: all hashed before any looks for the blob, all
+    # copied before any publishes its copy
+    threads_n = 8
+    hashed, copied = threading.Barrier(threads_n, timeout=5), threading.Barrier(threads_n, timeout=5)
+    hash_file, copyfile = blobs.hash_file, blobs.shutil.copyfile
+
+    def hash_then_wait(path):
+        digest = hash_file(path)
+        hashed.wait()
+        return digest
+
+    def copy_then_wait(src, dst):
+        copyfile(src, dst)
+        copied.wait()
+    monkeypatch.setattr(blobs, "hash_file", hash_then_wait)
+    monkeypatch.setattr(blobs.shutil, "copyfile", copy_then_wait)
+
+    results, errors = [], []
+
+    def upload():
+        try:
+            results.append(blobs.ingest("upload.pdf"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=upload) for _ in range(threads_n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    (digest, dest), = set(results)
+    with open(dest, "rb") as f, open("upload.pdf", "rb") as g:
+        assert f.read() == g.read()
+    assert os.listdir(os.path.dirname(dest)) == [os.path.basename(dest)]
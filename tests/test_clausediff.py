@@ -0,0 +1,165 @@
+import random
+
+from modules import clausediff
+
+
+CONTENTS = """CONTENTS
+Clause
+Page
+SECTION 1 INTERPRETATION
+1
+1. DEFINITIONS AND INTERPRETATION
+1
+2.
+The Facility ........................................ 4
+12. GOVERNING LAW
+9
+"""
+
+BODY = """IT IS AGREED as follows:
+SECTION 1
+INTERPRETATION
+1.
+DEFINITIONS AND INTERPRETATION
+1.1
+Definitions
+"Business Day" means a day on which banks are open in London, being at least
+2 Business Days before the Quotation Day.
+Subject to Clause 21.2 ( Other obligations ) and
+Clause 21.2 ( Other obligations ) insofar as it relates to a breach of a Major Undertaking,
+30 September 2007
+1.2 Construction
+Unless a contrary indication appears, references to the Agent include its successors.
+2
+"""
+
+BODY_2 = """18.8 Disruption to payment systems etc.
+If the Agent determines that a Disruption Event has occurred it may consult the Company.
+SCHEDULE 1
+The Original Parties
+Part I
+Clause 26
+( Confidentiality ) shall apply.
+"""
+
+
+def _headings(sections):
+    return [(s["number"], s["title"]) for s in sections]
+
+
+def test_headings_split_over_two_lines_and_references_ignored():
+    sections = clausediff.split_sections([(1, CONTENTS), (2, BODY), (3, BODY_2)])
+
+    assert _headings(sections) == [
+        ("", "Preamble"),
+        ("Section 1", "INTERPRETATION"),
+        ("1", "DEFINITIONS AND INTERPRETATION"),
+        ("1.1", "Definitions"),
+        ("1.2", "Construction"),
+        ("18.8", "Disruption to payment systems etc."),
+        ("Schedule 1", "The Original Parties"),
+        ("Part I", ""),
+    ]
+    # The contents page is dropped, body lines stay in their sections
+    preamble, definitions = sections[0], sections[3]
+    assert preamble["text"] == "IT IS AGREED as follows:"
+    assert "2 Business Days before the Quotation Day." in definitions["text"]
+    assert "30 September 2007" in definitions["text"]
+    assert definitions["first_page"] == definitions["last_page"] == 2
+    assert sections[-1]["text"] == "Clause 26 ( Confidentiality ) shall apply."
+    assert sections[3]["key"] == "definitions" and sections[-1]["key"] == "Part I"
+
+
+def test_page_numbers_after_a_heading_mark_a_stray_contents_entry():
+    sections = clausediff.split_sections([(1, "Recitals\n14.1 Non-payment\n21\nThe Borrower pays.\n3")])
+    assert _headings(sections) == [("", "Preamble")]
+
+
+def _section(title, text, number=""):
+    return {"number": number, "title": title, "key": title.lower(), "text": text}
+
+
+def test_align_sections_matches_titles_across_renumbering():
+    a = [_section("Definitions", "a"), _section("Fees", "The Borrower pays a fee of 1%."), _section("Governing law", "c")]
+    b = [
+        _section("Definitions", "a"),
+        _section("Sanctions", "x"),
+        _section("Fees", "The Borrower pays a fee of 2%."),
+        _section("Governing law", "c"),
+    ]
+
+    pairs = clausediff.align_sections(a, b)
+    assert [(x and x["title"], y and y["title"]) for x, y in pairs] == [
+        ("Definitions", "Definitions"),
+        (None, "Sanctions"),
+        ("Fees", "Fees"),
+        ("Governing law", "Governing law"),
+    ]
+
+    changes, stats = clausediff.diff_sections(a, b)
+    assert [(c["status"], (c["a"] or c["b"])["title"]) for c in changes] == [("added", "Sanctions"), ("changed", "Fees")]
+    assert changes[1]["ops"] == [("=", 6), ("-", 1), ("+", 1)]
+    assert stats["sections"] == 4 and stats["changed"] == 2
+
+
+def _apply(ops, a, b):
+    """Rebuilds b from a and the ops, checking every "=" run really matches."""
+    out, i, j = [], 0, 0
+    for tag, n in ops:
+        if tag == "=":
+            assert a[i:i + n] == b[j:j + n]
+            out.extend(a[i:i + n])
+            i, j = i + n, j + n
+        elif tag == "-":
+            i += n
+        else:
+            out.extend(b[j:j + n])
+            j += n
+    assert i == len(a) and j == len(b)
+    return out
+
+
+def _lcs(a, b):
+    row = [0] * (len(b) + 1)
+    for x in a:
+        prev = 0
+        for j, y in enumerate(b):
+            prev, row[j + 1] = row[j + 1], prev + 1 if x == y else max(row[j + 1], row[j])
+    return row[-1]
+
+
+def test_myers_diff_is_a_shortest_edit_script():
+    rng = random.Random(7)
+    for _ in range(200):
+        a = [rng.randrange(4) for _ in range(rng.randrange(30))]
+        b = [rng.randrange(4) for _ in range(rng.randrange(30))]
+        ops = clausediff.myers_diff(a, b)
+
+        assert _apply(ops, a, b) == b
+        kept = sum(n for tag, n in ops if tag == "=")
+        assert kept == _lcs(a, b)
+
+
+def test_myers_diff_edge_cases():
+    assert clausediff.myers_diff([], []) == []
+    assert clausediff.myers_diff([1, 2], []) == [("-", 2)]
+    assert clausediff.myers_diff([], [1]) == [("+", 1)]
+    assert clausediff.myers_diff([1, 2, 3], [1, 2, 3]) == [("=", 3)]
+
+
+def test_worker_pool_gives_the_same_diff(monkeypatch):
+    rng = random.Random(3)
+    words = "the borrower shall repay each loan on the termination date".split()
+    a = [_section(f"Clause {i}", " ".join(rng.choice(words) for _ in range(300))) for i in range(8)]
+    b = [_section(s["title"], s["text"].replace("loan", "advance", 3)) for s in a]
+    serial, _ = clausediff.diff_sections(a, b)
+
+    monkeypatch.setattr(clausediff, "PARALLEL_MIN_TOKENS", 0)
+    pool = clausediff.start_pool(max_workers=1)
+    try:
+        assert pool._mp_context.get_start_method() != "fork"
+        parallel, _ = clausediff.diff_sections(a, b)
+    finally:
+        clausediff.shutdown_pool()
+    assert [c["ops"] for c in parallel] == [c["ops"] for c in serial]
+    assert all(c["status"] == "changed" for c in parallel)
@@ -0,0 +1,76 @@
+import json
+import pickle
+
+import pytest
+
+from benchmarks import SEED_DB
+from modules import compression, data, reports
+
+pytest.importorskip("zstandard")
+
+
+@pytest.fixture
+def codec(tmp_path):
+    previous = compression._DICT_DIR
+    compression.configure(str(tmp_path / "dicts"))
+    yield compression
+    compression.configure(previous or str(tmp_path))
+
+
+def _payloads(n):
+    with open(SEED_DB) as f:
+        seeds = json.load(f)
+    payloads = []
+    for i in range(n):
+        full_json = json.loads(json.dumps(seeds[i % len(seeds)]["full_json"]))
+        full_json.setdefault("core_loan_terms", {})["borrower"] = f"Borrower {i}"
+        payloads.append(full_json)
+    return payloads
+
+
+def test_round_trip_without_a_dictionary(codec):
+    payload = {"core_loan_terms": {"borrower": "Acme ✓", "loan_amount": 5e6}, "lenders": ["A", "B"]}
+    packed = codec.encode(payload)
+    assert packed.startswith("0:")
+    assert codec.decode(packed) == payload
+
+
+def test_records_stay_decodable_across_dictionaries(codec, tmp_path):
+    payloads = _payloads(32)
+    before = codec.encode(payloads[0])
+
+    dict_id = codec.train(payloads)
+    assert dict_id and codec.current_dict_id() == dict_id
+    after = codec.encode(payloads[0])
+    assert after.startswith(f"{dict_id}:") and after != before
+
+    # A fresh process (configure) finds the dictionary on disk, old records still decode
+    codec.configure(str(tmp_path / "dicts"))
+    assert codec.current_dict_id() == dict_id
+    assert codec.decode(before) == codec.decode(after) == payloads[0]
+
+
+def test_too_few_samples_keep_the_current_dictionary(codec):
+    assert codec.train(_payloads(codec.MIN_TRAINING_SAMPLES - 1)) is None
+    assert codec.current_dict_id() == 0
+
+
+def test_packed_entries_decode_on_access_and_pickle_plain(codec):
+    payload = _payloads(1)[0]
+    entry = data._pack({"filename": "a.pdf", "full_json": payload})
+
+    assert "full_json" not in dict.keys(entry) and entry["full_json"] == payload
+    assert entry.get("full_json") == payload and entry.unpacked()["full_json"] == payload
+    restored = pickle.loads(pickle.dumps(entry))
+    assert type(restored) is dict and restored == entry.unpacked()
+
+
+def test_report_fingerprint_survives_a_repack(codec):
+    payloads = _payloads(32)
+    entry = data._pack({"filename": "a.pdf", "filepath": "x.pdf", "full_json": payloads[0]})
+    fingerprint = reports.loan_fingerprint(entry)
+
+    codec.train(payloads)
+    repacked = data._pack(entry, repack=True)
+    assert repacked[data.PACKED_KEY] != entry[data.PACKED_KEY]
+    assert reports.loan_fingerprint(repacked) == fingerprint == reports.loan_fingerprint(entry.unpacked())
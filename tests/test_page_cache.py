@@ -0,0 +1,75 @@
+import os
+import time
+import threading
+
+import fitz
+
+from modules import pdf_viewer
+
+
+def _make_pdf(path, pages):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1} " + "lorem ipsum " * 40, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def test_cache_is_capped_and_keeps_recently_used_pages(tmp_path, monkeypatch):
+    pdf = str(tmp_path / "doc.pdf")
+    _make_pdf(pdf, 8)
+    monkeypatch.setattr(pdf_viewer, "PAGE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(pdf_viewer, "_cache_bytes", None)
+
+    first = pdf_viewer.render_page_file(pdf, 1)
+    size = os.path.getsize(first)
+    monkeypatch.setattr(pdf_viewer, "PAGE_CACHE_MAX_BYTES", size * 3)
+
+    paths = [first]
+    for page in range(2, 9):
+        time.sleep(0.01)  # distinct mtimes
+        paths.append(pdf_viewer.render_page_file(pdf, page))
+        time.sleep(0.01)
+        assert pdf_viewer.render_page_file(pdf, 1) == first  # cache hit refreshes it
+
+    total = sum(s for _, s, _ in pdf_viewer._cache_files())
+    assert total <= pdf_viewer.PAGE_CACHE_MAX_BYTES * 1.5
+    assert os.path.exists(first)
+    assert os.path.exists(paths[-1])
+    assert not os.path.exists(paths[1])
+
+
+def test_concurrent_renders_of_the_same_page(tmp_path, monkeypatch):
+    pdf = str(tmp_path / "doc.pdf")
+    _make_pdf(pdf, 1)
+    monkeypatch.setattr(pdf_viewer, "PAGE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(pdf_viewer, "_cache_bytes", None)
+
+    # Every render has written its temporary file before any publishes it
+    renders = 6
+    written = threading.Barrier(renders, timeout=5)
+    replace = os.replace
+
+    def replace_when_all_written(src, dst):
+        written.wait()
+        replace(src, dst)
+    monkeypatch.setattr(pdf_viewer.os, "replace", replace_when_all_written)
+
+    results, errors = [], []
+
+    def render():
+        try:
+            results.append(pdf_viewer.render_page_file(pdf, 1))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=render) for _ in range(renders)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    path, = set(results)
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
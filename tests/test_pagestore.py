@@ -0,0 +1,117 @@
+import os
+
+import fitz
+import pytest
+
+from modules import blobs, loans, pagestore, pdf_viewer
+
+
+def _structure(texts, y=10.0):
+    """(spans, lines) shaped like pdf_viewer.extract_text_structure, one span per word."""
+    spans, lines = [], []
+    for line_no, line in enumerate(texts):
+        ids = []
+        for i, word in enumerate(line.split()):
+            ids.append(len(spans))
+            spans.append({"id": len(spans), "text": word, "bbox": fitz.Rect(i * 40, y * line_no, i * 40 + 30, y * line_no + 8)})
+        lines.append({"span_ids": ids, "rects": [spans[i]["bbox"] for i in ids], "text": " ".join(line.split())})
+    return spans, lines
+
+
+def test_round_trip(tmp_path):
+    pages = [
+        (612.0, 792.0, *_structure(["Facility Agreement", "between Acme plc and Bänk AG — €50m"])),
+        (595.5, 842.25, *_structure([])),
+        (612.0, 792.0, *_structure(["Governing law"])),
+    ]
+    path = str(tmp_path / "doc.pages")
+    pagestore.write_page_store(path, pages)
+
+    store = pagestore.PageStore(path)
+    try:
+        assert store.page_count == 3
+        assert store.page_size(2) == (595.5, 842.25)
+        for page_num, (_, _, spans, lines) in enumerate(pages, start=1):
+            got_spans, got_lines = store.page_structure(page_num)
+            assert [(s["id"], s["text"], tuple(s["bbox"])) for s in got_spans] == \
+                [(s["id"], s["text"], tuple(s["bbox"])) for s in spans]
+            assert [(l["span_ids"], l["text"]) for l in got_lines] == [(l["span_ids"], l["text"]) for l in lines]
+        assert store.page_text(1) == "Facility Agreement\nbetween Acme plc and Bänk AG — €50m"
+        assert store.page_text(2) == ""
+        assert list(store.iter_page_texts())[2] == (3, "Governing law")
+        with pytest.raises(IndexError):
+            store.page_size(4)
+    finally:
+        store.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "bad.pages"
+    path.write_bytes(b"NOPE" + bytes(12))
+    with pytest.raises(ValueError):
+        pagestore.PageStore(str(path))
+
+
+def _make_pdf(path):
+    doc = fitz.open()
+    for text in ("Clause 1 Definitions", "Clause 2 The Facility\nThe Lenders make available a term loan."):
+        doc.new_page().insert_text((72, 72), text, fontsize=11)
+    doc.save(path)
+    doc.close()
+
+
+def test_preprocessed_store_matches_pymupdf(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _make_pdf("upload.pdf")
+    _, blob = blobs.ingest("upload.pdf")
+
+    out_path = pdf_viewer.preprocess_document(blob)
+    assert out_path == blobs.blob_path(blobs.hash_file(blob), ext=".pages")
+    store = pagestore.open_page_store(blob)
+    assert store.page_count == 2
+
+    doc = fitz.open(blob)
+    try:
+        spans, _ = pdf_viewer.extract_text_structure(doc.load_page(1))
+    finally:
+        doc.close()
+    stored, _ = store.page_structure(2)
+    assert [s["text"] for s in stored] == [s["text"] for s in spans]
+    assert all(abs(a - b) < 1e-3 for s, t in zip(stored, spans) for a, b in zip(s["bbox"], t["bbox"]))
+
+
+def test_previews_do_not_write_a_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _make_pdf("preview.pdf")
+
+    pages = loans.read_document_pages("preview.pdf")
+    assert [num for num, _ in pages] == [1, 2]
+    assert "term loan" in pages[1][1]
+    assert not os.path.exists(pagestore.store_path_for("preview.pdf"))
+
+
+def test_open_stores_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pagestore, "MAX_OPEN_STORES", 2)
+    monkeypatch.setattr(pagestore, "_OPEN_STORES", type(pagestore._OPEN_STORES)())
+    pdfs = []
+    for digest in ("a" * 64, "b" * 64, "c" * 64):
+        pdfs.append(blobs.blob_path(digest))
+        os.makedirs(os.path.dirname(pdfs[-1]), exist_ok=True)
+        pagestore.write_page_store(pagestore.store_path_for(pdfs[-1]), [(612.0, 792.0, *_structure([digest[:4]]))])
+
+    a, b = (pagestore.open_page_store(p) for p in pdfs[:2])
+    assert pagestore.open_page_store(pdfs[0]) is a  # a is now the most recently used
+    c = pagestore.open_page_store(pdfs[2])
+
+    assert list(pagestore._OPEN_STORES.values()) == [a, c]
+    assert b._mmap.closed and not a._mmap.closed
+    held = c.page_block(1)
+    c.close()  # a reader's view keeps the mapping until it is released
+    assert bytes(held) and not c._mmap.closed
+    held.release()
+    assert c.page_text(1) == "cccc"
+    # A reader still holding the evicted store can keep using it
+    assert b.page_text(1) == "bbbb"
+    for store in (a, b, c):
+        store.close()
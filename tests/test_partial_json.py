@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from modules.loans import parse_partial_json
+
+
+@pytest.mark.parametrize("buffer, expected", [
+    ('{"borrower": "Acme', {"borrower": "Acme"}),
+    ('{"amount": 1, "lenders": ["Bank A", "Ban', {"amount": 1, "lenders": ["Bank A", "Ban"]}),
+    ('{"amount": 1,', {"amount": 1}),
+    ('{"note": "say \\"hi', {"note": 'say "hi'}),
+    ('{"a": {"b": tr', {"a": {}}),
+    ('{"a": "{[,"', {"a": "{[,"}),
+])
+def test_closes_open_strings_and_brackets(buffer, expected):
+    assert parse_partial_json(buffer) == expected
+
+
+@pytest.mark.parametrize("buffer", ["", "garbage", "[1, 2", '"just a string'])
+def test_returns_none_without_an_object(buffer):
+    assert parse_partial_json(buffer) is None
+
+
+def test_every_prefix_of_a_reply_parses_to_a_growing_subset():
+    reply = {
+        "core_loan_terms": {
+            "borrower": "Dignity PLC",
+            "lenders": ["Phoenix UK Fund Ltd", "Other Bank"],
+            "margin": {"min": 2.5, "max": None},
+            "loan_amount": 50000000,
+        },
+        "highlights": ["Bullet repayment", "Escaped \"quotes\" and \\ slashes"],
+    }
+    text = json.dumps(reply)
+    for i in range(1, len(text) + 1):
+        partial = parse_partial_json(text[:i])
+        assert partial is None or isinstance(partial, dict)
+    assert parse_partial_json(text) == reply
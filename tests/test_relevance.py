@@ -0,0 +1,73 @@
+from modules import relevance
+
+CONTENTS = "\n".join(
+    ["CONTENTS", "Clause", "Page"]
+    + [line for n, title in enumerate(["Definitions", "The Facility", "Purpose", "Repayment", "Interest", "Fees"])
+       for line in (f"{n + 1}. {title.upper()}", str(3 * n + 1))]
+    + ["38. Governing law ........................ 97", "ii"]
+)
+
+REPAYMENT_SCHEDULE = "\n".join(
+    ["Repayment Date", "Repayment Instalment"]
+    + [line for month in ("March", "June", "September", "December") for line in ("30", f"{month} 2008", "31", f"{month} 2009")]
+)
+
+
+def _filler(n, words=400):
+    return f"Page {n}. " + "The parties agree that the obligations described here continue. " * (words // 10)
+
+
+def test_contents_pages_are_recognised():
+    assert relevance.is_contents_page(CONTENTS)
+    assert not relevance.is_contents_page(REPAYMENT_SCHEDULE)
+    assert not relevance.is_contents_page(_filler(1))
+
+
+def test_opening_and_governing_law_pages_are_always_sent():
+    law = "This Agreement and any non-contractual obligations are governed by English law. Governing law."
+    pages = [(1, "FACILITY AGREEMENT dated 1 May 2020"), (2, CONTENTS), (3, "The Borrower and the Original Lenders agree.")]
+    pages += [(n, _filler(n)) for n in range(4, 60)] + [(60, law)]
+
+    selected = [num for num, _ in relevance.select_pages(pages, 12000)]
+    assert selected[:2] == [1, 3]
+    assert 2 not in selected
+    assert 60 in selected
+
+
+def test_low_gain_pages_do_not_end_the_selection(monkeypatch):
+    fields = list(relevance.FIELD_FEATURES)
+    pages = [(1, "a" * 400), (2, "b" * 400), (3, "c" * 5000)]
+    scores = [
+        dict.fromkeys(fields, 0.0),
+        {**dict.fromkeys(fields, 0.0), fields[0]: 0.04},  # best gain per char, but below MIN_GAIN
+        {**dict.fromkeys(fields, 0.0), fields[1]: 0.3},
+    ]
+    monkeypatch.setattr(relevance, "score_pages", lambda _: scores)
+    monkeypatch.setattr(relevance, "LEAD_PAGES", 1)
+    monkeypatch.setattr(relevance, "ANCHOR_FIELDS", ())
+
+    assert [num for num, _ in relevance.select_pages(pages, 5600)] == [1, 3]
+
+
+def _excerpt_len(selected):
+    return sum(relevance._cost(num, text) for num, text in selected)
+
+
+def test_a_page_larger_than_the_budget_is_cut_short():
+    huge = "The Borrower shall repay each Loan in full on the Termination Date. " * 300
+    selected = relevance.select_pages([(1, huge)], 12000)
+
+    (num, text), = selected
+    assert num == 1 and huge.startswith(text) and len(text) > 6000
+    assert _excerpt_len(selected) <= 12000
+
+
+def test_an_oversized_opening_page_is_sent_cut_short():
+    law = "This Agreement and any non-contractual obligations are governed by English law. Governing law."
+    pages = [(1, "FACILITY AGREEMENT between the Borrower and the Lenders. " * 400)]
+    pages += [(n, _filler(n)) for n in range(2, 40)] + [(40, law)]
+    selected = relevance.select_pages(pages, 12000)
+
+    assert selected[0][0] == 1 and pages[0][1].startswith(selected[0][1])
+    assert selected[-1] == (40, law)
+    assert _excerpt_len(selected) <= 12000
@@ -0,0 +1,47 @@
+import json
+import os
+
+from benchmarks import SEED_DB
+from modules import reports
+
+
+def _entries(n):
+    with open(SEED_DB) as f:
+        seeds = json.load(f)
+    entries = []
+    for i in range(n):
+        entry = dict(seeds[i % len(seeds)])
+        entry["filename"] = f"loan {i}.pdf" if i % 2 else f"loan_{i}.pdf"
+        entry["borrower"] = f"Borrower {i}"
+        entries.append(entry)
+    return entries
+
+
+def test_deck_names_do_not_collide():
+    assert reports._deck_name("a b.pdf") != reports._deck_name("a_b.pdf")
+    assert reports._deck_name("a b.pdf") == reports._deck_name("a b.pdf")
+
+
+def test_fingerprint_follows_template_content():
+    entry = _entries(1)[0]
+    a = reports.loan_fingerprint(entry, reports.template_digest(b"template v1"))
+    b = reports.loan_fingerprint(entry, reports.template_digest(b"template v2"))
+    assert a != b
+    assert a == reports.loan_fingerprint(entry, reports.template_digest(b"template v1"))
+
+
+def test_reports_are_incremental(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    entries = _entries(6)
+
+    status, paths = reports.generate_reports(entries, max_workers=2)
+    assert status.startswith("✅ 6 loan decks generated, 0 unchanged")
+    assert paths[0] == reports.PORTFOLIO_DECK
+    assert len(set(paths)) == 7 and all(os.path.exists(p) for p in paths)
+
+    status, _ = reports.generate_reports(entries, max_workers=2)
+    assert status.startswith("✅ 0 loan decks generated, 6 unchanged")
+
+    entries[2] = dict(entries[2], borrower="Renamed")
+    status, _ = reports.generate_reports(entries, max_workers=2)
+    assert status.startswith("✅ 1 loan decks generated, 5 unchanged")
@@ -0,0 +1,50 @@
+import fitz
+import pytest
+
+from modules import search
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ("_POSTINGS", "_PAGES", "_DOCS"):
+        monkeypatch.setattr(search, name, {})
+    monkeypatch.setattr(search, "_TOTAL_LENGTH", 0)
+    monkeypatch.setattr(search, "_LOADED", True)  # skip indexing the real store
+    monkeypatch.setattr(search.data, "refresh", lambda: False)
+    return search
+
+
+def _make_pdf(path, pages):
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text, fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+def test_phrase_matches_outrank_scattered_terms(index, tmp_path):
+    pdf = str(tmp_path / "agreement.pdf")
+    _make_pdf(pdf, [
+        "The default rate applies. A notice event is sent. Events are listed.",
+        "Each of the events of default set out in this clause is an event of default.",
+        "Unrelated page about interest periods.",
+    ])
+    index.index_document("agreement.pdf", pdf)
+
+    hits = index.search("events of default")
+    assert [h["page"] for h in hits][:2] == [2, 1]
+    assert hits[0]["span_ids"] and "events of default" in hits[0]["snippet"].lower()
+
+
+def test_only_lengths_and_terms_are_kept_per_page(index, tmp_path):
+    pdf = str(tmp_path / "agreement.pdf")
+    _make_pdf(pdf, ["Negative pledge and disposals.", "Governing law: England."])
+    index.index_document("agreement.pdf", pdf)
+
+    length, terms = index._PAGES[("agreement.pdf", 1)]
+    assert length == 3 and set(terms) == {"negative", "pledge", "disposals"}
+
+    index.index_document("agreement.pdf", pdf)  # unchanged file: no-op
+    index._remove_document("agreement.pdf")
+    assert index._PAGES == {} and index._POSTINGS == {} and index._TOTAL_LENGTH == 0
@@ -0,0 +1,169 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from modules import data, state
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# -------------------------------------------------
+# ChangeFeed
+# -------------------------------------------------
+
+def test_feed_delivers_only_new_complete_records(tmp_path):
+    path = str(tmp_path / "feed.jsonl")
+    writer, reader = state.ChangeFeed(path), state.ChangeFeed(path)
+
+    assert reader.poll() == (False, [])
+    writer.append({"filename": "a.pdf"})
+    writer.append({"filename": "b.pdf"})
+    reset, records = reader.poll()
+    assert not reset
+    assert [r["entry"]["filename"] for r in records] == ["a.pdf", "b.pdf"]
+    assert reader.version == 2
+
+    # A half-written line is left for the next poll
+    with open(path, "ab") as f:
+        f.write(b'{"version": 3, "op": "upsert", "entry": {"filename": "c.pdf"}')
+    assert reader.poll() == (False, [])
+    with open(path, "ab") as f:
+        f.write(b"}\n")
+    assert [r["entry"]["filename"] for r in reader.poll()[1]] == ["c.pdf"]
+
+
+def test_compaction_resets_readers_and_keeps_the_version(tmp_path):
+    path = str(tmp_path / "feed.jsonl")
+    writer, reader = state.ChangeFeed(path), state.ChangeFeed(path)
+    writer.append({"filename": "a.pdf"})
+    reader.poll()
+
+    writer.compact()
+    assert reader.poll() == (True, [])
+
+    reader.rewind()
+    assert reader.poll() == (False, [])
+    assert reader.version == 1
+
+    writer.append({"filename": "b.pdf"})
+    assert writer.version == 2
+    assert [r["entry"]["filename"] for r in reader.poll()[1]] == ["b.pdf"]
+
+# -------------------------------------------------
+# Loan store
+# -------------------------------------------------
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    previous = os.path.abspath(data.DB_FILE)
+    monkeypatch.chdir(tmp_path)
+    data.open_database(str(tmp_path / "loan_database.json"))
+    yield data
+    data.open_database(previous)
+
+
+def _terms(borrower):
+    return {"core_loan_terms": {"borrower": borrower, "loan_amount": 1000, "currency": "USD"}}
+
+
+def test_add_loan_appends_to_the_feed_without_rewriting_the_snapshot(store, tmp_path):
+    snapshot = tmp_path / "loan_database.json"
+    for i in range(3):
+        store.add_loan(f"loan-{i}.pdf", f"loan-{i}.pdf", _terms(f"Borrower {i}"))
+
+    assert not snapshot.exists()
+    feed = (tmp_path / "loan_database.changes.jsonl").read_text().splitlines()
+    assert len(feed) == 3
+
+    # A fresh process sees snapshot + feed
+    store.open_database(str(snapshot))
+    assert store.get_file_options() == ["loan-0.pdf", "loan-1.pdf", "loan-2.pdf"]
+    assert store.get_entry_by_filename("loan-1.pdf")["full_json"] == _terms("Borrower 1")
+
+
+def test_compaction_folds_the_feed_into_the_snapshot(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "FEED_COMPACT_BYTES", 0)
+    store.add_loan("loan-0.pdf", "loan-0.pdf", _terms("Borrower 0"))
+
+    with open(tmp_path / "loan_database.json") as f:
+        assert [e["filename"] for e in json.load(f)] == ["loan-0.pdf"]
+    feed = (tmp_path / "loan_database.changes.jsonl").read_text().splitlines()
+    assert [json.loads(line)["op"] for line in feed] == ["compact"]
+
+    store.open_database(str(tmp_path / "loan_database.json"))
+    assert store.get_file_options() == ["loan-0.pdf"]
+    assert store.DB_VERSION == 1
+
+
+WRITER = """
+import sys
+from modules import data
+proc = sys.argv[1]
+for i in range({writes}):
+    data.add_loan(f"p{{proc}}-{{i}}.pdf", f"p{{proc}}-{{i}}.pdf",
+                  {{"core_loan_terms": {{"borrower": f"Borrower {{proc}}-{{i}}"}}}})
+"""
+
+
+def test_concurrent_writers_lose_no_loans(tmp_path):
+    processes, writes = 3, 40
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    code = WRITER.format(writes=writes)
+    procs = [
+        subprocess.Popen([sys.executable, "-c", code, str(p)], cwd=tmp_path, env=env)
+        for p in range(processes)
+    ]
+    assert all(p.wait(timeout=120) == 0 for p in procs)
+
+    reader = subprocess.run(
+        [sys.executable, "-c", "from modules import data; import json; "
+         "print(json.dumps([(e['filename'], e['full_json']['core_loan_terms']['borrower']) "
+         "for e in data.iter_loans()]))"],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True,
+    )
+    loans = dict(json.loads(reader.stdout.splitlines()[-1]))
+    expected = {f"p{p}-{i}.pdf": f"Borrower {p}-{i}" for p in range(processes) for i in range(writes)}
+    assert loans == expected
+
+
+def test_legacy_files_are_migrated_to_the_blob_store(tmp_path, monkeypatch):
+    previous = os.path.abspath(data.DB_FILE)
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("saved_pdfs")
+    with open("saved_pdfs/legacy.pdf", "wb") as f:
+        f.write(b"%PDF-1.4 legacy agreement")
+    legacy = {
+        "filename": "legacy.pdf", "filepath": "saved_pdfs/legacy.pdf",
+        "borrower": "B", "lender": "L", "amount": "1", "interest": "N/A", "maturity": "N/A",
+        "full_json": _terms("B"),
+    }
+    with open("loan_database.json", "w") as f:
+        json.dump([legacy], f)
+    with open("loan_database.json", "rb") as f:
+        snapshot = f.read()
+
+    try:
+        # Opening (reading) the store leaves it alone
+        data.open_database(str(tmp_path / "loan_database.json"))
+        assert data.get_entry_by_filename("legacy.pdf")["filepath"] == "saved_pdfs/legacy.pdf"
+        assert not os.path.exists("saved_pdfs/blobs")
+
+        # The first write migrates, through the change feed
+        data.add_loan("new.pdf", "saved_pdfs/legacy.pdf", _terms("N"))
+        with open("loan_database.json", "rb") as f:
+            assert f.read() == snapshot
+        entry = data.get_entry_by_filename("legacy.pdf")
+        digest = data.blobs.hash_file("saved_pdfs/legacy.pdf")
+        assert entry["sha256"] == digest
+        assert entry["filepath"] == data.blobs.blob_path(digest)
+        assert os.path.exists(entry["filepath"])
+        assert data.get_filenames_by_hash(digest) == ["legacy.pdf", "new.pdf"]
+
+        # Persisted once: a fresh process sees the migrated entry
+        data.open_database(str(tmp_path / "loan_database.json"))
+        entry = data.get_entry_by_filename("legacy.pdf")
+        assert entry["sha256"] == digest and entry["full_json"] == _terms("B")
+    finally:
+        data.open_database(previous)
@@ -0,0 +1,15 @@
+from modules import data, tables
+
+
+def test_truncated_rows_follow_the_row_contents(monkeypatch):
+    rows = [["a.pdf", "Acme Holdings International Limited", "Bank", "5000000", "", "", "PDF", "JSON"]]
+    monkeypatch.setattr(data, "get_dataframe_data", lambda query=None: [list(r) for r in rows])
+    monkeypatch.setattr(tables, "_TRUNCATED_ROWS", {})
+
+    assert tables.get_truncated_data()[0][1] == "Acme Holdings International Li..."
+
+    # A rebuild that raced an update stored the old row after the update's invalidation
+    stale = tables._TRUNCATED_ROWS["a.pdf"]
+    rows[0][1] = "Acme plc"
+    tables._TRUNCATED_ROWS["a.pdf"] = stale
+    assert tables.get_truncated_data()[0][1] == "Acme plc"